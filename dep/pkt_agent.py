@@ -0,0 +1,604 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Packet agent running on tester. It reads requests from the session line by
+line and transmits raw frames through AF_PACKET socket, so frames built by
+DTS are not re-parsed by scapy on tester. It also captures frames received on
+interfaces, each capture is filtered by bpf program in kernel and frames are
+kept in agent until they are fetched. When fields are specified, only the
+fields of captured frames are kept, either counted by value or as tuples.
+Streams send loaded frames continuously at a given rate through PACKET_MMAP
+tx ring for traffic measurement without hardware packet generator.
+
+Requests:
+    ADD <base64 frame>,<base64 frame>,...   load frames
+    SEND <iface> <count> <interval>         send loaded frames and clear them
+    LOAD <iface> <base64 frame>,...         load frames to send on iface
+    SENDALL <count> <interval>              send frames loaded for each iface
+                                            at same time, reply is
+                                            TXALL <iface>:<sent>:<start>:<end>,...
+    STREAM <key> <iface> <pps> <count>      send frames loaded by key on iface
+                                            in background, pps and count 0 are
+                                            unlimited
+    STATS                                   counters of streams, reply is
+                                            STATS <key>:<sent>:<bytes>:<running>,...
+    HALT [<key> ...]                        stop streams, all if no key
+    COUNTERS <iface>                        counters of interface, reply is
+                                            COUNTERS <rx pkts> <rx bytes> <tx pkts> <tx bytes>
+    CLEAR                                   clear loaded frames and streams
+    CAPTURE <id> <iface> <count> <in|inout> <base64 filter|-> [<fields> <count|tuple>]
+                                            start capture, count 0 is unlimited,
+                                            direction is as tcpdump -Q
+    MARK <id>                               number of frames captured now
+    STOP <id>                               stop capture, frames are kept
+    FETCH <id> <start>                      frames from index start, reply is
+                                            FRAMES <next> <ts>:<base64>,...
+    SUMMARY <id> <start>                    fields of frames from index start,
+                                            reply is SUMMARY <next> <json>
+    DROP <id>                               stop capture and free frames
+    QUIT                                    exit agent
+Each request is answered by one line and then the prompt.
+"""
+
+import base64
+import collections
+import ctypes
+import errno
+import json
+import mmap
+import os
+import select
+import socket
+import struct
+import subprocess
+import sys
+import termios
+import threading
+import time
+import tty
+
+PROMPT = "agent> "
+ETH_P_ALL = 0x0003
+SO_ATTACH_FILTER = 26
+PACKET_OUTGOING = 4
+CAPTURE_RCVBUF = 16 * 1024 * 1024
+# base64 characters of frames in one FETCH reply, or json of one SUMMARY reply
+FETCH_SIZE = 256 * 1024
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+VLAN_TYPES = (0x8100, 0x88A8)
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+SOL_PACKET = 263
+PACKET_AUXDATA = 8
+PACKET_VERSION = 10
+PACKET_TX_RING = 13
+TPACKET_V2 = 1
+TP_STATUS_SEND_REQUEST = 1
+TP_STATUS_SENDING = 2
+TP_STATUS_VLAN_VALID = 0x10
+TP_STATUS_VLAN_TPID_VALID = 0x40
+# struct tpacket_auxdata received as PACKET_AUXDATA control message
+TPACKET_AUXDATA = struct.Struct("IIIHHHH")
+# frame data offset in tx ring slot of TPACKET_V2
+TPACKET2_HDRLEN = 32
+# memory of tx ring and frames queued before kicking kernel
+TX_RING_SIZE = 8 * 1024 * 1024
+TX_BATCH = 256
+
+
+def reply(msg):
+    # terminal is in raw mode, line ending is not translated
+    sys.stdout.write(msg + "\r\n" + PROMPT)
+    sys.stdout.flush()
+
+
+def send_frames(frames, iface, count, interval):
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    try:
+        sock.bind((iface, 0))
+        sent = 0
+        start = time.time()
+        for _ in range(count):
+            for frame in frames:
+                sock.send(frame)
+                sent += 1
+                if interval:
+                    time.sleep(interval)
+        return sent, start, time.time()
+    finally:
+        sock.close()
+
+
+def frame_fields(frame, fields):
+    """
+    Return tuple of field values of frame, value is None when frame has no
+    such layer or is truncated. Fields are names as below, or
+    "<offset>:<length>" for hex of raw bytes:
+        len, ether.dst, ether.src, ether.type, vlan, vlan.prio,
+        ip.src, ip.dst, ip.proto, ip.ttl, ip.chksum,
+        l4.sport, l4.dport, l4.chksum
+    """
+    values = {"len": len(frame)}
+    if len(frame) >= 12:
+        values["ether.dst"] = ":".join("%02x" % b for b in frame[0:6])
+        values["ether.src"] = ":".join("%02x" % b for b in frame[6:12])
+    offset = 12
+    eth_type = None
+    if len(frame) >= offset + 2:
+        (eth_type,) = struct.unpack_from("!H", frame, offset)
+    values["vlan"] = values["vlan.prio"] = None
+    while eth_type in VLAN_TYPES:
+        if len(frame) < offset + 6:
+            eth_type = None
+            break
+        (tci,) = struct.unpack_from("!H", frame, offset + 2)
+        # inner tag is reported for stacked vlan
+        values["vlan"] = tci & 0xFFF
+        values["vlan.prio"] = tci >> 13
+        offset += 4
+        (eth_type,) = struct.unpack_from("!H", frame, offset)
+    values["ether.type"] = eth_type
+
+    l3 = offset + 2
+    proto = l4 = None
+    if eth_type == ETH_P_IP and len(frame) >= l3 + 20:
+        values["ip.src"] = socket.inet_ntop(socket.AF_INET, frame[l3 + 12 : l3 + 16])
+        values["ip.dst"] = socket.inet_ntop(socket.AF_INET, frame[l3 + 16 : l3 + 20])
+        proto = frame[l3 + 9]
+        values["ip.ttl"] = frame[l3 + 8]
+        (values["ip.chksum"],) = struct.unpack_from("!H", frame, l3 + 10)
+        l4 = l3 + (frame[l3] & 0xF) * 4
+    elif eth_type == ETH_P_IPV6 and len(frame) >= l3 + 40:
+        values["ip.src"] = socket.inet_ntop(socket.AF_INET6, frame[l3 + 8 : l3 + 24])
+        values["ip.dst"] = socket.inet_ntop(socket.AF_INET6, frame[l3 + 24 : l3 + 40])
+        proto = frame[l3 + 6]
+        values["ip.ttl"] = frame[l3 + 7]
+        l4 = l3 + 40
+    values["ip.proto"] = proto
+    if proto in (IPPROTO_TCP, IPPROTO_UDP) and len(frame) >= l4 + 8:
+        values["l4.sport"], values["l4.dport"] = struct.unpack_from("!HH", frame, l4)
+        chksum = l4 + (16 if proto == IPPROTO_TCP else 6)
+        if len(frame) >= chksum + 2:
+            (values["l4.chksum"],) = struct.unpack_from("!H", frame, chksum)
+
+    result = []
+    for field in fields:
+        if ":" in field:
+            start, length = parse_raw_field(field)
+            raw = frame[start : start + length]
+            result.append(raw.hex() if len(raw) == length else None)
+        else:
+            result.append(values.get(field))
+    return tuple(result)
+
+
+def parse_raw_field(field):
+    """
+    Return offset and length of raw bytes field "<offset>:<length>".
+    """
+    start, length = (int(v) for v in field.split(":"))
+    if start < 0 or length <= 0:
+        raise ValueError("invalid field %s" % field)
+    return start, length
+
+
+def send_all(port_frames, count, interval):
+    """
+    Send frames of all interfaces in parallel threads, which are released
+    together by barrier. Return list of (iface, sent, start, end).
+    """
+    barrier = threading.Barrier(len(port_frames))
+    results = {}
+
+    def sender(iface, frames):
+        try:
+            barrier.wait()
+            results[iface] = send_frames(frames, iface, count, interval)
+        except Exception as e:
+            results[iface] = e
+
+    threads = [
+        threading.Thread(target=sender, args=item) for item in port_frames.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for iface, result in results.items():
+        if isinstance(result, Exception):
+            raise Exception("%s: %s" % (iface, result))
+    return [(iface,) + results[iface] for iface in port_frames]
+
+
+class Stream(object):
+
+    """
+    Send frames repeatedly on interface in background thread. Frames are
+    written into PACKET_MMAP tx ring and sent by one syscall for each batch,
+    each frame is sent by its own syscall when tx ring can't be set up.
+    """
+
+    def __init__(self, frames, iface, pps, count):
+        self.frames = frames
+        self.pps = pps
+        self.count = count
+        self.sent = 0
+        self.bytes = 0
+        self.error = None
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        self.sock.bind((iface, 0))
+        self.ring = self.setup_ring()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def setup_ring(self):
+        slot = 2048
+        while slot < TPACKET2_HDRLEN + max(len(f) for f in self.frames):
+            slot *= 2
+        block = max(slot, mmap.PAGESIZE)
+        self.slot = slot
+        self.slots = max(TX_RING_SIZE // block, 1) * (block // slot)
+        req = struct.pack("IIII", block, self.slots * slot // block, slot, self.slots)
+        try:
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+            self.sock.setsockopt(SOL_PACKET, PACKET_TX_RING, req)
+            return mmap.mmap(self.sock.fileno(), self.slots * slot)
+        except OSError:
+            return None
+
+    def batch_size(self):
+        # low rate is sent in small batches so that traffic is smooth
+        batch = TX_BATCH
+        if self.pps:
+            batch = min(batch, max(int(self.pps / 1000), 1))
+        if self.count:
+            batch = min(batch, self.count - self.sent)
+        return batch
+
+    def throttle(self, start):
+        if self.pps:
+            delay = start + self.sent / self.pps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def run(self):
+        start = time.time()
+        index = 0
+        try:
+            while self.running and (not self.count or self.sent < self.count):
+                batch = self.batch_size()
+                if self.ring is None:
+                    for _ in range(batch):
+                        frame = self.frames[index]
+                        index = (index + 1) % len(self.frames)
+                        self.sock.send(frame)
+                        self.sent += 1
+                        self.bytes += len(frame)
+                else:
+                    index = self.send_ring(index, batch)
+                self.throttle(start)
+        except Exception as e:
+            self.error = str(e)
+        self.running = False
+
+    def send_ring(self, index, batch):
+        ring = self.ring
+        queued = 0
+        size = 0
+        for _ in range(batch):
+            offset = (self.sent + queued) % self.slots * self.slot
+            (status,) = struct.unpack_from("I", ring, offset)
+            if status & (TP_STATUS_SEND_REQUEST | TP_STATUS_SENDING):
+                break
+            frame = self.frames[index]
+            index = (index + 1) % len(self.frames)
+            data = offset + TPACKET2_HDRLEN
+            ring[data : data + len(frame)] = frame
+            struct.pack_into("II", ring, offset + 4, len(frame), len(frame))
+            # status is set at last, then frame belongs to kernel
+            struct.pack_into("I", ring, offset, TP_STATUS_SEND_REQUEST)
+            queued += 1
+            size += len(frame)
+        try:
+            # blocking send returns after all queued frames are sent
+            self.sock.send(b"")
+        except OSError as e:
+            if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                raise
+        self.sent += queued
+        self.bytes += size
+        return index
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.sock.close()
+
+
+def interface_counters(iface):
+    values = []
+    for name in ("rx_packets", "rx_bytes", "tx_packets", "tx_bytes"):
+        with open("/sys/class/net/%s/statistics/%s" % (iface, name)) as f:
+            values.append(int(f.read()))
+    return values
+
+
+# compiled bpf programs by interface and expression, kept for agent lifetime
+FILTER_CACHE = {}
+
+
+def compile_filter(iface, expr):
+    """
+    Compile tcpdump filter expression into bpf instructions.
+    """
+    key = (iface, expr)
+    if key not in FILTER_CACHE:
+        out = subprocess.run(
+            ["tcpdump", "-i", iface, "-ddd", expr],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        ).stdout.decode()
+        lines = out.split()
+        FILTER_CACHE[key] = [
+            tuple(int(v) for v in lines[i : i + 4])
+            for i in range(1, 1 + int(lines[0]) * 4, 4)
+        ]
+    return FILTER_CACHE[key]
+
+
+def restore_vlan(data, ancdata):
+    """
+    Insert vlan tag stripped by hardware back into frame as tcpdump does.
+    """
+    for level, type, cmsg in ancdata:
+        if level != SOL_PACKET or type != PACKET_AUXDATA:
+            continue
+        status, _, _, _, _, tci, tpid = TPACKET_AUXDATA.unpack_from(cmsg)
+        if not (status & TP_STATUS_VLAN_VALID or tci):
+            break
+        if not status & TP_STATUS_VLAN_TPID_VALID:
+            tpid = VLAN_TYPES[0]
+        return data[:12] + struct.pack("!HH", tpid, tci) + data[12:]
+    return data
+
+
+class Capture(object):
+
+    """
+    Capture frames received on one interface in background thread.
+    """
+
+    def __init__(self, iface, count, expr, fields=None, mode="count", inbound=True):
+        for field in fields or []:
+            if ":" in field:
+                parse_raw_field(field)
+        # socket receives nothing before bound, so that no frame is queued
+        # before filter is attached
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, CAPTURE_RCVBUF)
+        # vlan tag stripped by hardware is received as auxdata
+        self.sock.setsockopt(SOL_PACKET, PACKET_AUXDATA, 1)
+        if expr:
+            program = compile_filter(iface, expr)
+            insns = ctypes.create_string_buffer(
+                b"".join(struct.pack("HBBI", *insn) for insn in program)
+            )
+            fprog = struct.pack("HL", len(program), ctypes.addressof(insns))
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+        self.sock.bind((iface, ETH_P_ALL))
+        self.count = count
+        self.inbound = inbound
+        self.received = 0
+        self.frames = []
+        self.fields = fields
+        self.mode = mode
+        self.summary = collections.Counter() if mode == "count" else []
+        self.snapshot = []
+        self.error = None
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            while self.running:
+                if not select.select([self.sock], [], [], 0.1)[0]:
+                    continue
+                data, ancdata, _, addr = self.sock.recvmsg(
+                    65535, socket.CMSG_SPACE(TPACKET_AUXDATA.size)
+                )
+                # only received frames like tcpdump -Q in
+                if self.inbound and addr[2] == PACKET_OUTGOING:
+                    continue
+                data = restore_vlan(data, ancdata)
+                self.received += 1
+                if self.fields is None:
+                    self.frames.append((time.time(), data))
+                elif self.mode == "count":
+                    self.summary[frame_fields(data, self.fields)] += 1
+                else:
+                    self.summary.append(frame_fields(data, self.fields))
+                if self.count and self.received >= self.count:
+                    break
+        except Exception as e:
+            # reported by following MARK or STOP request
+            self.error = "capture stopped after %d frames: %s" % (self.received, e)
+        self.running = False
+
+    def check(self):
+        if self.error:
+            raise Exception(self.error)
+        return self.received
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+        return self.check()
+
+    def fetch(self, start):
+        items = []
+        size = 0
+        index = start
+        frames = self.frames
+        while index < len(frames) and size < FETCH_SIZE:
+            ts, data = frames[index]
+            item = "%.6f:%s" % (ts, base64.b64encode(data).decode())
+            items.append(item)
+            size += len(item) + 1
+            index += 1
+        return "FRAMES %d %s" % (index, ",".join(items))
+
+    def summarize(self, start):
+        # copy at first page, capture thread may be still running
+        if start == 0:
+            if self.mode == "count":
+                self.snapshot = [list(k) + [v] for k, v in self.summary.copy().items()]
+            else:
+                self.snapshot = list(self.summary)
+        items = []
+        size = 0
+        index = start
+        while index < len(self.snapshot) and size < FETCH_SIZE:
+            item = json.dumps(self.snapshot[index], separators=(",", ":"))
+            items.append(item)
+            size += len(item) + 1
+            index += 1
+        return "SUMMARY %d [%s]" % (index, ",".join(items))
+
+
+def main():
+    stdin = sys.stdin.buffer
+    saved = None
+    if os.isatty(stdin.fileno()):
+        # raw mode, long request lines are not limited by line discipline
+        saved = termios.tcgetattr(stdin.fileno())
+        tty.setraw(stdin.fileno())
+
+    frames = []
+    port_frames = {}
+    captures = {}
+    streams = {}
+    try:
+        reply("READY")
+        while True:
+            line = stdin.readline()
+            if not line:
+                break
+            request = line.strip().decode()
+            if not request:
+                reply("")
+                continue
+            cmd, _, args = request.partition(" ")
+            try:
+                if cmd == "ADD":
+                    frames.extend(base64.b64decode(f) for f in args.split(","))
+                    reply("OK %d" % len(frames))
+                elif cmd == "SEND":
+                    iface, count, interval = args.split()
+                    sent, start, end = send_frames(
+                        frames, iface, int(count), float(interval)
+                    )
+                    frames = []
+                    reply("TX %d %.6f %.6f" % (sent, start, end))
+                elif cmd == "LOAD":
+                    iface, encoded = args.split()
+                    loaded = port_frames.setdefault(iface, [])
+                    loaded.extend(base64.b64decode(f) for f in encoded.split(","))
+                    reply("OK %d" % len(loaded))
+                elif cmd == "SENDALL":
+                    count, interval = args.split()
+                    results = send_all(port_frames, int(count), float(interval))
+                    port_frames = {}
+                    reply(
+                        "TXALL "
+                        + ",".join("%s:%d:%.6f:%.6f" % result for result in results)
+                    )
+                elif cmd == "STREAM":
+                    key, iface, pps, count = args.split()
+                    if key in streams:
+                        streams.pop(key).stop()
+                    streams[key] = Stream(
+                        port_frames.pop(key), iface, float(pps), int(count)
+                    )
+                    reply("OK %d" % len(streams))
+                elif cmd == "STATS":
+                    reply(
+                        "STATS "
+                        + ",".join(
+                            "%s:%d:%d:%d" % (key, st.sent, st.bytes, st.running)
+                            for key, st in streams.items()
+                        )
+                    )
+                elif cmd == "HALT":
+                    keys = args.split() or list(streams.keys())
+                    errors = []
+                    for key in keys:
+                        streams[key].stop()
+                        if streams[key].error:
+                            errors.append("%s %s" % (key, streams[key].error))
+                    if errors:
+                        raise Exception(", ".join(errors))
+                    reply("OK %d" % len(keys))
+                elif cmd == "COUNTERS":
+                    reply("COUNTERS %d %d %d %d" % tuple(interface_counters(args)))
+                elif cmd == "CLEAR":
+                    frames = []
+                    port_frames = {}
+                    for stream in streams.values():
+                        stream.stop()
+                    streams = {}
+                    reply("OK 0")
+                elif cmd == "CAPTURE":
+                    cap_id, iface, count, direction, expr, *spec = args.split()
+                    expr = "" if expr == "-" else base64.b64decode(expr).decode()
+                    if cap_id in captures:
+                        captures.pop(cap_id).stop()
+                    if spec:
+                        fields, mode = spec[0].split(","), spec[1]
+                    else:
+                        fields, mode = None, "count"
+                    captures[cap_id] = Capture(
+                        iface, int(count), expr, fields, mode, direction == "in"
+                    )
+                    reply("OK 0")
+                elif cmd == "MARK":
+                    reply("OK %d" % captures[args].check())
+                elif cmd == "STOP":
+                    reply("OK %d" % captures[args].stop())
+                elif cmd == "FETCH":
+                    cap_id, start = args.split()
+                    reply(captures[cap_id].fetch(int(start)))
+                elif cmd == "SUMMARY":
+                    cap_id, start = args.split()
+                    reply(captures[cap_id].summarize(int(start)))
+                elif cmd == "DROP":
+                    captures.pop(args).stop()
+                    reply("OK 0")
+                elif cmd == "QUIT":
+                    break
+                else:
+                    reply("ERR unknown request %s" % cmd)
+            except Exception as e:
+                frames = []
+                port_frames = {}
+                reply("ERR %s" % str(e).replace("\n", " "))
+    finally:
+        for capture in captures.values():
+            capture.stop()
+        for stream in streams.values():
+            stream.stop()
+        if saved is not None:
+            termios.tcsetattr(stdin.fileno(), termios.TCSADRAIN, saved)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,8 @@ from .settings import (
     PKTGEN_IXIA,
     PKTGEN_IXIA_NETWORK,
     PKTGEN_TREX,
+    SSH_BACKEND_GRP,
+    SSH_BACKEND_PEXPECT,
     SUITE_SECTION_NAME,
     load_global_setting,
 )
@@ -260,6 +262,8 @@ class CrbsConf(UserConf):
         "bypass core0": True,
         "dut_cores": "",
         "snapshot_load_side": "tester",
+        "ssh backend": SSH_BACKEND_PEXPECT,
+        "scapy pool size": 2,
     }
 
     def __init__(self, crbs_conf=CRBCONF):
@@ -315,6 +319,13 @@ class CrbsConf(UserConf):
                     crb["dut_cores"] = value
                 elif key == "snapshot_load_side":
                     crb["snapshot_load_side"] = value.lower()
+                elif key == "ssh_backend":
+                    if value.lower() in SSH_BACKEND_GRP:
+                        crb["ssh backend"] = value.lower()
+                    elif value:
+                        print("Ssh backend <%s> is not supported!!!" % value)
+                elif key == "scapy_pool_size" and value:
+                    crb["scapy pool size"] = int(value)
 
             self.crbs_cfg.append(crb)
         return self.crbs_cfg
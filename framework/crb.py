@@ -2,13 +2,14 @@
 # Copyright(c) 2010-2014 Intel Corporation
 #
 
+import json
 import os
 import re
-import time
 
 from .config import PORTCONF, PktgenConf, PortConf
 from .logger import getLogger
-from .settings import TIMEOUT
+from .profiler import profiler
+from .settings import FOLDERS, SSH_BACKEND_PEXPECT, TIMEOUT
 from .ssh_connection import SSHConnection
 
 """
@@ -41,6 +42,7 @@ class Crb(object):
         self.trex_prefix = None
         self.default_hugepages_cleared = False
         self.prefix_list = []
+        self.prefetched = {}
 
         self.logger = getLogger(name)
         self.session = SSHConnection(
@@ -49,6 +51,7 @@ class Crb(object):
             self.get_username(),
             self.get_password(),
             dut_id,
+            backend=self.get_ssh_backend(),
         )
         self.session.init_log(self.logger)
         if alt_session:
@@ -58,6 +61,7 @@ class Crb(object):
                 self.get_username(),
                 self.get_password(),
                 dut_id,
+                backend=self.get_ssh_backend(),
             )
             self.alt_session.init_log(self.logger)
         else:
@@ -81,6 +85,12 @@ class Crb(object):
         """
         raise NotImplementedError
 
+    def get_ssh_backend(self):
+        """
+        Get CRB's ssh session backend.
+        """
+        return self.crb.get("ssh backend", SSH_BACKEND_PEXPECT)
+
     def send_expect(
         self,
         cmds,
@@ -108,6 +118,51 @@ class Crb(object):
 
         return self.session.send_expect(cmds, expected, timeout, verify)
 
+    def run(self, cmds, timeout=TIMEOUT, alt_session=True):
+        """
+        Run non-interactive command on crb and return tuple of exit code,
+        output, error output and elapsed seconds. No prompt is matched, so
+        it should not be used for interactive applications like testpmd.
+
+        By default it runs on alt_session, which will not break application
+        running on main session when backend can't open exec channel.
+        """
+        if cmds in self.prefetched:
+            rc, out = self.prefetched[cmds]
+            return rc, out, "", 0
+
+        # sometimes there will be no alt_session like VM dut
+        if alt_session and self.alt_session:
+            return self.alt_session.run(cmds, timeout)
+
+        return self.session.run(cmds, timeout)
+
+    def run_batch(self, cmds, timeout=TIMEOUT, alt_session=True):
+        """
+        Run command list on crb in one round trip and return list of exit
+        code and output(error output merged) for each command.
+        """
+        if alt_session and self.alt_session:
+            return self.alt_session.run_batch(cmds, timeout)
+
+        return self.session.run_batch(cmds, timeout)
+
+    def prefetch(self, cmds, timeout=TIMEOUT):
+        """
+        Run probe commands in one batch and save the results, later run() of
+        the same command will return saved result until clear_prefetch().
+        Only read-only commands should be prefetched.
+        """
+        results = self.run_batch(cmds, timeout)
+        self.prefetched.update(list(zip(cmds, results)))
+        return results
+
+    def clear_prefetch(self):
+        """
+        Drop saved results of prefetched commands.
+        """
+        self.prefetched = {}
+
     def create_session(self, name=""):
         """
         Create new session for additional usage. This session will not enable log.
@@ -119,6 +174,7 @@ class Crb(object):
             self.get_username(),
             self.get_password(),
             dut_id=self.dut_id,
+            backend=self.get_ssh_backend(),
         )
         session.init_log(logger)
         self.sessions.append(session)
@@ -154,6 +210,8 @@ class Crb(object):
                 self.name + "_alt",
                 self.get_username(),
                 self.get_password(),
+                self.dut_id,
+                backend=self.get_ssh_backend(),
             )
             self.alt_session = session
         else:
@@ -162,20 +220,23 @@ class Crb(object):
                 self.name,
                 self.get_username(),
                 self.get_password(),
+                self.dut_id,
+                backend=self.get_ssh_backend(),
             )
             self.session = session
 
         session.init_log(self.logger)
 
-    def send_command(self, cmds, timeout=TIMEOUT, alt_session=False):
+    def send_command(self, cmds, timeout=TIMEOUT, alt_session=False, idle=None):
         """
-        Send commands to crb and return string before timeout.
+        Send commands to crb and return string before timeout, or when no more
+        output in idle seconds if idle specified.
         """
 
         if alt_session and self.alt_session:
-            return self.alt_session.session.send_command(cmds, timeout)
+            return self.alt_session.session.send_command(cmds, timeout, idle)
 
-        return self.session.send_command(cmds, timeout)
+        return self.session.send_command(cmds, timeout, idle)
 
     def get_session_output(self, timeout=TIMEOUT):
         """
@@ -273,6 +334,69 @@ class Crb(object):
         self.read_cache = read_cache
         self.skip_setup = skip_setup
 
+    def get_fingerprint(self):
+        """
+        Return fingerprint of kernel version, pci devices and nic firmware,
+        topology saved in cache is not valid when it changed.
+        """
+        get_fingerprint = getattr(self, "get_fingerprint_%s" % self.get_os_type())
+        results = self.run_batch(get_fingerprint())
+        fingerprint = [out.strip() for (_, out) in results]
+        if self.get_os_type() == "linux":
+            fingerprint.append(self.get_ports_firmware())
+        return "/".join(fingerprint)
+
+    def get_fingerprint_linux(self):
+        return ["uname -r", "lspci -nn | md5sum"]
+
+    def get_configured_pcis(self):
+        """
+        Return pci addresses of ports in port config, or all ethernet devices
+        if crb has no port config.
+        """
+        portconf = PortConf(PORTCONF)
+        portconf.load_ports_config(self.crb["IP"])
+        configed_pcis = portconf.get_ports_config()
+        if configed_pcis:
+            if "tester" in str(self):
+                return sorted(item["peer"] for item in configed_pcis.values())
+            return sorted(configed_pcis.keys())
+        _, out, _, _ = self.run("lspci -Dnn | grep -i eth")
+        return sorted(re.findall(r"^([\da-f]{4}:[\da-f]{2}:[\da-f]{2}\.\d)", out, re.M))
+
+    def get_ports_firmware(self):
+        """
+        Return firmware version of each port by pci address. Firmware can only
+        be read when port is bound to kernel driver, version read last time is
+        used for port bound to dpdk driver, so that it doesn't depend on which
+        driver ports are bound to.
+        """
+        pcis = self.get_configured_pcis()
+        results = self.run_batch(
+            [
+                "ethtool -i $(ls /sys/bus/pci/devices/%s/net 2>/dev/null | head -1) "
+                "2>/dev/null | grep ^firmware-version" % pci
+                for pci in pcis
+            ]
+        )
+        filename = os.path.join(FOLDERS["Output"], ".%s.firmware" % self.crb["My IP"])
+        firmware = {}
+        if os.path.exists(filename):
+            try:
+                with open(filename) as f:
+                    firmware = json.load(f)
+            except ValueError:
+                firmware = {}
+        for pci, (_, out) in zip(pcis, results):
+            if out.strip():
+                firmware[pci] = out.strip()
+        with open(filename, "w") as f:
+            json.dump(firmware, f, indent=4)
+        return ",".join("%s=%s" % (pci, firmware.get(pci, "")) for pci in pcis)
+
+    def get_fingerprint_freebsd(self):
+        return ["uname -r", "pciconf -l | md5"]
+
     def set_directory(self, base_dir):
         """
         Set DPDK package folder name.
@@ -325,7 +449,7 @@ class Crb(object):
         """
         Look for the NIC's information (PCI Id and card type).
         """
-        out = self.send_expect("lspci -Dnn | grep -i eth", "# ", alt_session=True)
+        _, out, _, _ = self.run("lspci -Dnn | grep -i eth")
         rexp = r"([\da-f]{4}:[\da-f]{2}:[\da-f]{2}.\d{1}) .*Eth.*?ernet .*?([\da-f]{4}:[\da-f]{4})"
         pattern = re.compile(rexp)
         match = pattern.findall(out)
@@ -365,10 +489,8 @@ class Crb(object):
             # check if device is cavium and check its linkspeed, append only if it is 10G
             if "177d:" in match[i][1]:
                 linkspeed = "10000"
-                nic_linkspeed = self.send_expect(
-                    "cat /sys/bus/pci/devices/%s/net/*/speed" % match[i][0],
-                    "# ",
-                    alt_session=True,
+                _, nic_linkspeed, _, _ = self.run(
+                    "cat /sys/bus/pci/devices/%s/net/*/speed" % match[i][0]
                 )
                 if nic_linkspeed.split()[0] == linkspeed:
                     self.pci_devices_info.append((match[i][0], match[i][1]))
@@ -400,13 +522,11 @@ class Crb(object):
         """
         Get the driver of specified pci device on linux.
         """
-        out = self.send_expect(
+        _, out, _, _ = self.run(
             "cat /sys/bus/pci/devices/%s\:%s\:%s/uevent"
-            % (domain_id, bus_id, devfun_id),
-            "# ",
-            alt_session=True,
+            % (domain_id, bus_id, devfun_id)
         )
-        rexp = r"DRIVER=(.+?)\r"
+        rexp = r"DRIVER=(\S+)"
         pattern = re.compile(rexp)
         match = pattern.search(out)
         if not match:
@@ -430,13 +550,11 @@ class Crb(object):
         """
         Get the pci id of specified pci device on linux.
         """
-        out = self.send_expect(
+        _, out, _, _ = self.run(
             "cat /sys/bus/pci/devices/%s\:%s\:%s/uevent"
-            % (domain_id, bus_id, devfun_id),
-            "# ",
-            alt_session=True,
+            % (domain_id, bus_id, devfun_id)
         )
-        rexp = r"PCI_ID=(.+)"
+        rexp = r"PCI_ID=(\S+)"
         pattern = re.compile(rexp)
         match = re.search(pattern, out)
         if not match:
@@ -454,11 +572,9 @@ class Crb(object):
         """
         Get numa number of specified pci device on Linux.
         """
-        numa = self.send_expect(
+        _, numa, _, _ = self.run(
             "cat /sys/bus/pci/devices/%s\:%s\:%s/numa_node"
-            % (domain_id, bus_id, devfun_id),
-            "# ",
-            alt_session=True,
+            % (domain_id, bus_id, devfun_id)
         )
 
         try:
@@ -569,20 +685,16 @@ class Crb(object):
         pid_reg = r"p(\d+)"
         for config_file in file_directorys:
             # Covers case where the process is run as a unprivileged user and does not generate the file
-            isfile = self.send_expect(
-                "ls -l {}".format(config_file), "# ", 20, alt_session
-            )
-            if isfile:
+            rc, _, _, _ = self.run("ls -l {}".format(config_file), 20, alt_session)
+            if rc == 0:
                 cmd = "lsof -Fp %s" % config_file
-                out = self.send_expect(cmd, "# ", 20, alt_session)
-                if len(out):
-                    lines = out.split("\r\n")
-                    for line in lines:
-                        m = re.match(pid_reg, line)
-                        if m:
-                            pids.append(m.group(1))
+                _, out, _, _ = self.run(cmd, 20, alt_session)
+                for line in out.splitlines():
+                    m = re.match(pid_reg, line)
+                    if m:
+                        pids.append(m.group(1))
                 for pid in pids:
-                    self.send_expect("kill -9 %s" % pid, "# ", 20, alt_session)
+                    self.run("kill -9 %s" % pid, 20, alt_session)
                     self.get_session_output(timeout=2)
 
         hugepage_info = [
@@ -591,13 +703,11 @@ class Crb(object):
         ]
         for hugepage in hugepage_info:
             # Covers case where the process is run as a unprivileged user and does not generate the file
-            isfile = self.send_expect(
-                "ls -l {}".format(hugepage), "# ", 20, alt_session
-            )
-            if isfile:
+            rc, _, _, _ = self.run("ls -l {}".format(hugepage), 20, alt_session)
+            if rc == 0:
                 cmd = "lsof -Fp %s" % hugepage
-                out = self.send_expect(cmd, "# ", 20, alt_session)
-                if len(out) and "No such file or directory" not in out:
+                rc, out, _, _ = self.run(cmd, 20, alt_session)
+                if rc == 0 and len(out):
                     self.logger.warning("There are some dpdk process not free hugepage")
                     self.logger.warning("**************************************")
                     self.logger.warning(out)
@@ -607,13 +717,13 @@ class Crb(object):
         directorys = ["/var/run/dpdk/%s" % file_prefix for file_prefix in prefix_list]
         for directory in directorys:
             cmd = "rm -rf %s" % directory
-            self.send_expect(cmd, "# ", 20, alt_session)
+            self.run(cmd, 20, alt_session)
 
         # delete hugepage on mnt path
         if getattr(self, "hugepage_path", None):
             for file_prefix in prefix_list:
                 cmd = "rm -rf %s/%s*" % (self.hugepage_path, file_prefix)
-                self.send_expect(cmd, "# ", 20, alt_session)
+                self.run(cmd, 20, alt_session)
 
     def kill_all(self, alt_session=True):
         """
@@ -630,15 +740,12 @@ class Crb(object):
                 self.prefix_list = []
             else:
                 self.logger.info("kill_all: called by dut and has no prefix list.")
-                out = self.send_command(
-                    "ls -l /var/run/dpdk |awk '/^d/ {print $NF}'",
-                    timeout=0.5,
-                    alt_session=True,
+                _, out, _, _ = self.run(
+                    "ls -l /var/run/dpdk |awk '/^d/ {print $NF}'", alt_session=True
                 )
-                # the last directory is expect string, eg: [PEXPECT]#
-                if out != "":
-                    dir_list = out.split("\r\n")
-                    self.get_dpdk_pids(dir_list[:-1], alt_session)
+                dir_list = out.split()
+                if dir_list:
+                    self.get_dpdk_pids(dir_list, alt_session)
 
     def close(self):
         """
@@ -1015,7 +1122,7 @@ class Crb(object):
             link_status = self.get_interface_link_status(intf)
             if link_status == "Up":
                 return True
-            time.sleep(1)
+            profiler.sleep(1)
         self.logger.error(f"check and wait {intf} link up timeout")
         return False
 
@@ -1027,7 +1134,7 @@ class Crb(object):
             link_status = self.get_interface_link_status(intf)
             if link_status == "Down":
                 return True
-            time.sleep(1)
+            profiler.sleep(1)
         self.logger.error(f"check and wait {intf} link down timeout")
         return False
 
@@ -5,14 +5,18 @@
 import atexit  # register callback when exit
 import configparser  # config parse module
 import copy  # copy module for duplicate variable
+import hashlib  # fingerprint of crbs
 import imp
 import inspect  # load attribute
 import json  # json format
 import logging
+import multiprocessing  # parallel execution workers
 import os  # operation system module
+import queue  # queue of worker results
 import re  # regular expressions module
 import signal  # signal module for debug mode
 import sys  # system module
+import threading  # parallel initialization of crbs
 import time  # time module for unique output folder
 import traceback  # exception traceback
 
@@ -29,6 +33,8 @@ from .excel_reporter import ExcelReporter
 from .exception import ConfigParseException, TimeoutException, VerifyFailure
 from .json_reporter import JSONReporter
 from .logger import getLogger
+from .profiler import profiler
+from .scheduler import SuitePool
 from .serializer import Serializer
 from .stats_reporter import StatsReporter
 from .test_case import TestCase
@@ -48,6 +54,7 @@ result: Result = None
 excel_report = None
 json_report = None
 stats_report = None
+profile_file = None
 log_handler = None
 
 
@@ -301,27 +308,43 @@ def dts_crbs_init(
     """
     Create dts dut/tester instance and initialize them.
     """
-    duts = []
+    crbObjs = {}
 
-    serializer.set_serialized_filename(
-        settings.FOLDERS["Output"] + "/.%s.cache" % crbInsts[0]["IP"]
-    )
-    serializer.load_from_file()
+    def init_crb(name, super_class, crbInst, dut_id):
+        crbObjs[name] = get_project_obj(
+            project, super_class, crbInst, serializer, dut_id=dut_id
+        )
 
+    # login and initialize tester and duts at the same time
     testInst = copy.copy(crbInsts[0])
     testInst["My IP"] = crbInsts[0]["tester IP"]
-    tester = get_project_obj(project, Tester, testInst, serializer, dut_id=0)
-
-    dut_id = 0
-    for crbInst in crbInsts:
+    tasks = [("tester", init_crb, ("tester", Tester, testInst, 0))]
+    for dut_id, crbInst in enumerate(crbInsts):
         dutInst = copy.copy(crbInst)
         dutInst["My IP"] = crbInst["IP"]
-        dutobj = get_project_obj(project, Dut, dutInst, serializer, dut_id=dut_id)
-        duts.append(dutobj)
-        dut_id += 1
+        name = "dut%d" % dut_id
+        tasks.append((name, init_crb, (name, Dut, dutInst, dut_id)))
+
+    errors = dts_run_parallel_tasks(tasks)
+    if errors:
+        for crbObj in list(crbObjs.values()):
+            crbObj.close()
+        raise errors[0][1]
+
+    tester = crbObjs["tester"]
+    duts = [crbObjs["dut%d" % dut_id] for dut_id in range(len(crbInsts))]
 
     dts_log_execution(duts, tester, log_handler)
 
+    # cache is only loaded when hardware and kernel of crbs not changed
+    fingerprint = "|".join(crb.get_fingerprint() for crb in [tester] + duts)
+    serializer.set_serialized_filename(
+        settings.FOLDERS["Output"] + "/.%s.cache" % crbInsts[0]["IP"]
+    )
+    serializer.set_fingerprint(hashlib.md5(fingerprint.encode()).hexdigest())
+    if not serializer.load_from_file() and read_cache:
+        log_handler.info("CACHE: Cache not found or topology changed, rescan it.")
+
     tester.duts = duts
     show_speedup_options_messages(read_cache, skip_setup)
     tester.set_speedup_options(read_cache, skip_setup)
@@ -358,24 +381,38 @@ def dts_crbs_exit(duts, tester):
 
 def dts_run_prerequisties(duts, tester, pkgName, patch, dts_commands, serializer):
     """
-    Run dts prerequisties function.
+    Run dts prerequisties function. Tester prerequisites and package setup
+    of duts are independent, so they are run in parallel. Topology setup of
+    duts depends on tester ports and is run after them.
     """
-    try:
+
+    def tester_prerequisites():
         dts_run_commands(tester, dts_commands)
         tester.prerequisites()
         dts_run_commands(tester, dts_commands)
-    except Exception as ex:
-        log_handler.error(" PREREQ EXCEPTION " + traceback.format_exc())
+
+    def dut_package(dutobj):
+        dts_run_commands(dutobj, dts_commands)
+        dutobj.set_package(pkgName, patch)
+        dutobj.prepare_package()
+
+    tasks = [("tester", tester_prerequisites, ())]
+    for dutobj in duts:
+        tasks.append((dutobj.crb["My IP"], dut_package, (dutobj,)))
+    errors = dts_run_parallel_tasks(tasks)
+
+    if errors and errors[0][0] == "tester":
         log_handler.info("CACHE: Discarding cache.")
         serializer.discard_cache()
         settings.report_error("TESTER_SETUP_ERR")
         return False
 
     try:
+        if errors:
+            raise errors[0][1]
+
         for dutobj in duts:
-            dts_run_commands(dutobj, dts_commands)
-            dutobj.set_package(pkgName, patch)
-            dutobj.prerequisites()
+            dutobj.setup_prerequisites()
             dts_run_commands(dutobj, dts_commands)
 
         serializer.save_to_file()
@@ -390,9 +427,45 @@ def dts_run_prerequisties(duts, tester, pkgName, patch, dts_commands, serializer
         result.remove_failed_dut(duts[0])
 
 
-def dts_run_target(duts, tester, targets, test_suites, subtitle):
+def dts_run_parallel_tasks(tasks):
     """
-    Run each target in execution targets.
+    Run tasks of crbs in threads at the same time, task is tuple of crb name,
+    function and its arguments. Return list of crb name and exception for
+    failed tasks, tester is always the first one if it failed.
+    """
+    errors = []
+
+    def run_task(name, func, args):
+        try:
+            func(*args)
+        except Exception as ex:
+            log_handler.error(" %s EXCEPTION " % name + traceback.format_exc())
+            errors.append((name, ex))
+
+    # signal handler can't be used in thread, mark dts in parallel mode
+    parallel = settings.load_global_setting(settings.DTS_PARALLEL_SETTING)
+    settings.save_global_setting(settings.DTS_PARALLEL_SETTING, "yes")
+    threads = []
+    try:
+        for name, func, args in tasks:
+            thread = threading.Thread(
+                target=run_task, name=name, args=(name, func, args)
+            )
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    finally:
+        settings.save_global_setting(settings.DTS_PARALLEL_SETTING, parallel or "no")
+
+    errors.sort(key=lambda error: error[0] != "tester")
+    return errors
+
+
+def dts_run_target(duts, tester, targets, test_suites, subtitle, suite_pool=None):
+    """
+    Run each target in execution targets. When suite pool specified, suites
+    which can run on this crb are taken from the pool.
     """
     for target in targets:
         log_handler.info("\nTARGET " + target)
@@ -400,12 +473,13 @@ def dts_run_target(duts, tester, targets, test_suites, subtitle):
 
         try:
             drivername = settings.load_global_setting(settings.HOST_DRIVER_SETTING)
-            if drivername == "":
-                for dutobj in duts:
-                    dutobj.set_target(target, bind_dev=False)
-            else:
-                for dutobj in duts:
-                    dutobj.set_target(target)
+            with profiler.scope("", "", "set_target"):
+                if drivername == "":
+                    for dutobj in duts:
+                        dutobj.set_target(target, bind_dev=False)
+                else:
+                    for dutobj in duts:
+                        dutobj.set_target(target)
         except AssertionError as ex:
             log_handler.error(" TARGET ERROR: " + str(ex))
             settings.report_error("DPDK_BUILD_ERR")
@@ -419,6 +493,9 @@ def dts_run_target(duts, tester, targets, test_suites, subtitle):
         else:
             result.remove_failed_target(result.dut, target)
 
+        if suite_pool is not None:
+            resources = {"nic": duts[0].nic.name, "ports": len(duts[0].ports_info)}
+            test_suites = suite_pool.suites(target, resources)
         dts_run_suite(duts, tester, test_suites, target, subtitle)
 
     tester.restore_interfaces()
@@ -513,6 +590,7 @@ def run_all(
     subtitle,
     update_expected,
     asan,
+    parallel=False,
 ):
     """
     Main process of DTS, it will run all test suites in the config file.
@@ -523,6 +601,7 @@ def run_all(
     global excel_report
     global json_report
     global stats_report
+    global profile_file
     global log_handler
     global check_case_inst
 
@@ -594,69 +673,301 @@ def run_all(
     excel_report = ExcelReporter(output_dir + "/test_results.xls")
     json_report = JSONReporter(output_dir + "/test_results.json")
     stats_report = StatsReporter(output_dir + "/statistics.txt")
+    profile_file = output_dir + "/test_profile.json"
     result = Result()
 
     crbs_conf = CrbsConf()
     crbs = crbs_conf.load_crbs_config()
 
+    if parallel:
+        dts_run_parallel(
+            config,
+            crbs,
+            pkgName,
+            patch,
+            skip_setup,
+            read_cache,
+            project,
+            base_dir,
+            output_dir,
+            virttype,
+            re_run,
+            dts_commands,
+            subtitle,
+        )
+        # exit value of workers is reported by main process
+        atexit.register(quit_execution, [], None)
+        return
+
     # for all Execution sections
     for section in config.sections():
-        crbInsts = list()
-        dts_parse_param(config, section, log_handler)
-
-        # verify if the delimiter is good if the lists are vertical
-        duts, targets, test_suites = dts_parse_config(config, section)
-        for dut in duts:
-            log_handler.info("\nDUT " + dut)
-
-        # look up in crbs - to find the matching IP
-        for dut in duts:
-            for crb in crbs:
-                if crb["section"] == dut:
-                    crbInsts.append(crb)
-                    break
-
-        # only run on the dut in known crbs
-        if len(crbInsts) == 0:
-            log_handler.error(" SKIP UNKNOWN CRB")
-            continue
+        dts_run_execution(
+            config,
+            section,
+            crbs,
+            pkgName,
+            patch,
+            skip_setup,
+            read_cache,
+            project,
+            base_dir,
+            serializer,
+            virttype,
+            re_run,
+            dts_commands,
+            subtitle,
+        )
+
+
+def dts_run_execution(
+    config,
+    section,
+    crbs,
+    pkgName,
+    patch,
+    skip_setup,
+    read_cache,
+    project,
+    base_dir,
+    serializer,
+    virttype,
+    re_run,
+    dts_commands,
+    subtitle,
+    suite_pool=None,
+):
+    """
+    Run one execution section, return its duts and tester. When suite pool
+    specified, suites are taken from the pool instead of section.
+    """
+    crbInsts = list()
+    dts_parse_param(config, section, log_handler)
+
+    # verify if the delimiter is good if the lists are vertical
+    duts, targets, test_suites = dts_parse_config(config, section)
+    for dut in duts:
+        log_handler.info("\nDUT " + dut)
+
+    # look up in crbs - to find the matching IP
+    for dut in duts:
+        for crb in crbs:
+            if crb["section"] == dut:
+                crbInsts.append(crb)
+                break
+
+    # only run on the dut in known crbs
+    if len(crbInsts) == 0:
+        log_handler.error(" SKIP UNKNOWN CRB")
+        return None
+
+    result.dut = duts[0]
+
+    # init global lock
+    create_parallel_locks(len(duts))
+
+    # init dut, tester crb
+    duts, tester = dts_crbs_init(
+        crbInsts, skip_setup, read_cache, project, base_dir, serializer, virttype
+    )
+    tester.set_re_run(re_run)
+    # register exit action
+    atexit.register(quit_execution, duts, tester)
+
+    check_case_inst.check_dut(duts[0])
+
+    # Run DUT prerequisites
+    if (
+        dts_run_prerequisties(duts, tester, pkgName, patch, dts_commands, serializer)
+        is False
+    ):
+        dts_crbs_exit(duts, tester)
+        return duts, tester
+    result.kdriver = duts[0].nic.default_driver + "-" + duts[0].nic.driver_version
+    result.firmware = duts[0].nic.firmware
+    result.package = (
+        duts[0].nic.pkg["type"] + " " + duts[0].nic.pkg["version"]
+        if duts[0].nic.pkg
+        else None
+    )
+    result.driver = settings.load_global_setting(settings.HOST_DRIVER_SETTING)
+    result.dpdk_version = duts[0].dpdk_version
+    dts_run_target(duts, tester, targets, test_suites, subtitle, suite_pool)
 
-        result.dut = duts[0]
+    dts_crbs_exit(duts, tester)
+    return duts, tester
 
-        # init global lock
-        create_parallel_locks(len(duts))
 
-        # init dut, tester crb
-        duts, tester = dts_crbs_init(
-            crbInsts, skip_setup, read_cache, project, base_dir, serializer, virttype
+def dts_run_parallel(
+    config,
+    crbs,
+    pkgName,
+    patch,
+    skip_setup,
+    read_cache,
+    project,
+    base_dir,
+    output_dir,
+    virttype,
+    re_run,
+    dts_commands,
+    subtitle,
+):
+    """
+    Run execution sections in parallel, each section is run by one worker
+    process with its own crbs. Suites of sections in the same shard group
+    are shared by those workers. Results of workers are merged into global
+    result and reports.
+    """
+    manager = multiprocessing.Manager()
+    results = multiprocessing.Queue()
+    pools = {}
+    workers = []
+    for section in config.sections():
+        suite_pool = None
+        if config.has_option(section, "shard_group"):
+            group = config.get(section, "shard_group").strip()
+            if group not in pools:
+                pools[group] = SuitePool(manager, group)
+            suite_pool = pools[group]
+            targets, test_suites = dts_parse_config(config, section)[1:]
+            for target in targets:
+                for suite_name in test_suites:
+                    suite_pool.add(target, suite_name)
+
+        worker = multiprocessing.Process(
+            target=dts_run_worker,
+            name=section,
+            args=(
+                results,
+                config,
+                section,
+                crbs,
+                pkgName,
+                patch,
+                skip_setup,
+                read_cache,
+                project,
+                base_dir,
+                output_dir,
+                virttype,
+                re_run,
+                dts_commands,
+                subtitle,
+                suite_pool,
+            ),
         )
-        tester.set_re_run(re_run)
-        # register exit action
-        atexit.register(quit_execution, duts, tester)
+        worker.start()
+        log_handler.info("EXECUTION %s started in worker %d" % (section, worker.pid))
+        workers.append(worker)
 
-        check_case_inst.check_dut(duts[0])
+    # worker may exit abnormally without result
+    finished = 0
+    while finished < len(workers):
+        try:
+            section, worker_result = results.get(timeout=10)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        finished += 1
+        log_handler.info("EXECUTION %s finished" % section)
+        if worker_result is not None:
+            result.merge(worker_result)
+            save_all_results()
+
+    errors = {ret_val: error for error, ret_val in settings.DTS_ERR_TBL.items()}
+    for worker in workers:
+        worker.join()
+        if worker.exitcode != 0:
+            log_handler.error(
+                "EXECUTION %s exited with %s" % (worker.name, worker.exitcode)
+            )
+            settings.report_error(errors.get(worker.exitcode, "GENERIC_ERR"))
 
-        # Run DUT prerequisites
-        if (
-            dts_run_prerequisties(
-                duts, tester, pkgName, patch, dts_commands, serializer
+    for group, suite_pool in list(pools.items()):
+        for target, suite_name in suite_pool.left():
+            log_handler.error(
+                "SUITE %s of target %s in group %s not run, no crb has its resources"
+                % (suite_name, target, group)
             )
-            is False
-        ):
-            dts_crbs_exit(duts, tester)
-            continue
-        result.kdriver = duts[0].nic.default_driver + "-" + duts[0].nic.driver_version
-        result.firmware = duts[0].nic.firmware
-        result.package = (
-            duts[0].nic.pkg["type"] + " " + duts[0].nic.pkg["version"]
-            if duts[0].nic.pkg
-            else None
-        )
-        result.driver = settings.load_global_setting(settings.HOST_DRIVER_SETTING)
-        result.dpdk_version = duts[0].dpdk_version
-        dts_run_target(duts, tester, targets, test_suites, subtitle)
 
-        dts_crbs_exit(duts, tester)
+
+def dts_run_worker(
+    results,
+    config,
+    section,
+    crbs,
+    pkgName,
+    patch,
+    skip_setup,
+    read_cache,
+    project,
+    base_dir,
+    output_dir,
+    virttype,
+    re_run,
+    dts_commands,
+    subtitle,
+    suite_pool,
+):
+    """
+    Worker process of one execution section. Logs and reports of section are
+    saved in sub folder of output folder, result is sent back to main process.
+    """
+    global result
+    global excel_report
+    global json_report
+    global stats_report
+    global profile_file
+    global log_handler
+
+    worker_dir = os.path.join(output_dir, section)
+    if not os.path.exists(worker_dir):
+        os.mkdir(worker_dir)
+    logger.log_dir = worker_dir
+    rst.path2Result = worker_dir
+    log_handler = getLogger("dts")
+    log_handler.config_execution("dts")
+
+    excel_report = ExcelReporter(worker_dir + "/test_results.xls")
+    json_report = JSONReporter(worker_dir + "/test_results.json")
+    stats_report = StatsReporter(worker_dir + "/statistics.txt")
+    profile_file = worker_dir + "/test_profile.json"
+    result = Result()
+    # profile of worker only counts its own execution
+    profiler.reset()
+    # time.sleep of test suites is counted as sleep
+    profiler.patch_sleep()
+
+    execution = None
+    try:
+        execution = dts_run_execution(
+            config,
+            section,
+            crbs,
+            pkgName,
+            patch,
+            skip_setup,
+            read_cache,
+            project,
+            base_dir,
+            Serializer(),
+            virttype,
+            re_run,
+            dts_commands,
+            subtitle,
+            suite_pool,
+        )
+    except Exception:
+        settings.report_error("GENERIC_ERR")
+        log_handler.error(" !!! DEBUG IT: " + traceback.format_exc())
+    finally:
+        results.put((section, result))
+        # exit handlers are not called in worker process, exit value of
+        # worker is set by quit_execution
+        if execution is not None:
+            quit_execution(*execution)
+        settings.exit_error()
 
 
 def show_speedup_options_messages(read_cache, skip_setup):
@@ -678,6 +989,7 @@ def save_all_results():
     excel_report.save(result)
     json_report.save(result)
     stats_report.save(result)
+    profiler.save(profile_file)
 
 
 def quit_execution(duts, tester):
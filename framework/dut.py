@@ -10,11 +10,12 @@ from typing import Dict, List, Optional, Union
 from uuid import uuid4
 
 import framework.settings as settings
-from nics.net_device import GetNicObj
+from nics.net_device import GetNicObj, prefetch_nics
 
 from .config import AppNameConf, PortConf
 from .crb import Crb
 from .exception import ParameterInvalidException
+from .profiler import profiler
 from .settings import LOG_NAME_SEP, NICS
 from .ssh_connection import SSHConnection
 from .test_result import ResultTable
@@ -34,6 +35,8 @@ class Dut(Crb):
     """
 
     PORT_MAP_CACHE_KEY = "dut_port_map"
+    # links may be changed without hardware changed, so remap it daily
+    PORT_MAP_CACHE_TTL = 24 * 60 * 60
     PORT_INFO_CACHE_KEY = "dut_port_info"
     NUMBER_CORES_CACHE_KEY = "dut_number_cores"
     CORE_LIST_CACHE_KEY = "dut_core_list"
@@ -197,6 +200,8 @@ class Dut(Crb):
             vm_name + "_host",
             self.get_username(),
             self.get_password(),
+            self.dut_id,
+            backend=self.get_ssh_backend(),
         )
         self.host_session.init_log(self.logger)
         self.logger.info(
@@ -432,7 +437,7 @@ class Dut(Crb):
                 while pull_retries > 0:
                     itf = port.get_interface_name()
                     if not itf or itf == "N/A":
-                        time.sleep(1)
+                        profiler.sleep(1)
                         pull_retries -= 1
                     else:
                         break
@@ -450,7 +455,7 @@ class Dut(Crb):
                         while pull_retries > 0:
                             itf = port.get_interface_name()
                             if not itf or itf == "N/A":
-                                time.sleep(1)
+                                profiler.sleep(1)
                                 pull_retries -= 1
                             else:
                                 break
@@ -869,7 +874,7 @@ class Dut(Crb):
             out = self.send_expect("ip link show %s" % intf, "# ")
             if "DOWN" in out:
                 self.send_expect("ip link set %s up" % intf, "# ")
-                time.sleep(5)
+                profiler.sleep(5)
             port_info["mac"] = port.get_mac_addr()
             out = self.send_expect(
                 "ip -family inet6 address show dev %s | awk '/inet6/ { print $2 }'"
@@ -901,7 +906,7 @@ class Dut(Crb):
                 self.logger.info("DUT: [%s] %s" % (port_info["pci"], unknow_interface))
                 continue
             self.send_expect("ifconfig %s up" % intf, "# ")
-            time.sleep(5)
+            profiler.sleep(5)
             macaddr = port.get_mac_addr()
             ipv6 = port.get_ipv6_addr()
             # Unconnected ports don't have IPv6
@@ -938,7 +943,12 @@ class Dut(Crb):
             self.scan_ports_cached()
 
         if not self.read_cache or self.ports_info is None:
-            self.scan_ports_uncached()
+            # probe all ports in batches instead of one command per query
+            prefetch_nics(self, [pci_bus for (pci_bus, _) in self.pci_devices_info])
+            try:
+                self.scan_ports_uncached()
+            finally:
+                self.clear_prefetch()
 
     def scan_ports_cached(self):
         """
@@ -1203,7 +1213,9 @@ class Dut(Crb):
 
         if not self.read_cache or self.ports_map is None:
             self.map_available_ports_uncached()
-            self.serializer.save(self.PORT_MAP_CACHE_KEY, self.ports_map)
+            self.serializer.save(
+                self.PORT_MAP_CACHE_KEY, self.ports_map, ttl=self.PORT_MAP_CACHE_TTL
+            )
 
         self.logger.warning("DUT PORT MAP: " + str(self.ports_map))
 
@@ -1220,6 +1232,9 @@ class Dut(Crb):
 
         hits = [False] * len(self.tester.ports_info)
 
+        # ping all possible links at the same time instead of one by one
+        pings = self.ping6_available_ports()
+
         for dutPort in range(nrPorts):
             peer = self.get_peer_pci(dutPort)
             dutpci = self.ports_info[dutPort]["pci"]
@@ -1274,6 +1289,8 @@ class Dut(Crb):
                             self.tester.ports_info[remotePort]["ipv6"],
                             self.get_mac_address(dutPort),
                         )
+                    elif (dutPort, remotePort) in pings:
+                        out = pings[(dutPort, remotePort)]
                     else:
                         out = self.tester.send_ping6(
                             remotePort, ipv6, self.get_mac_address(dutPort)
@@ -1299,6 +1316,37 @@ class Dut(Crb):
         for port in remove:
             self.ports_info.remove(port)
 
+    def ping6_available_ports(self):
+        """
+        Ping ipv6 address of dut ports without configured peer from all
+        tester ports at the same time. Return dictionary of ping output for
+        each dut port and tester port. Ping through packet generator or
+        specific ping6 function is not included.
+        """
+        if getattr(self, "send_ping6", None) or self.tester.is_pktgen:
+            return {}
+
+        probes = []
+        for dutPort in range(len(self.ports_info)):
+            ipv6 = self.get_ipv6_address(dutPort)
+            if self.get_peer_pci(dutPort) is not None or ipv6 == "Not connected":
+                continue
+            dutpci = self.ports_info[dutPort]["pci"]
+            for remotePort in range(len(self.tester.ports_info)):
+                # skip ping self port
+                remotepci = self.tester.ports_info[remotePort]["pci"]
+                if (self.crb["IP"] == self.crb["tester IP"]) and (dutpci == remotepci):
+                    continue
+                probes.append((dutPort, remotePort, ipv6))
+
+        outputs = self.tester.send_ping6_parallel(
+            [(remotePort, ipv6) for (_, remotePort, ipv6) in probes]
+        )
+        return {
+            (dutPort, remotePort): out
+            for (dutPort, remotePort, _), out in zip(probes, outputs)
+        }
+
     def disable_tester_ipv6(self):
         for tester_port in self.ports_map:
             if self.tester.ports_info[tester_port]["type"].lower() not in (
@@ -1357,7 +1405,7 @@ class Dut(Crb):
         # try to kill all hypervisor process
         for pid in self.virt_pids:
             self.send_expect("kill -s SIGTERM %d" % pid, "# ", alt_session=True)
-            time.sleep(3)
+            profiler.sleep(3)
         self.virt_pids = []
 
     def crb_exit(self):
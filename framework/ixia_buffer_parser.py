@@ -24,9 +24,17 @@ will extract the sequential number at the beginning of the packet payload.
     2    1203:07:01.397860040    00 00 00 00 00 00    00 00 00 00 00 00    00 01    00 00 00 01 ...
 
 
+Captured files can also be pcap or pcapng files, the sequential number is
+read from the beginning of frame payload without decoding the frame.
+
 Check the unit tests for more information about how the class works.
 """
 
+from .pcap_stream import PcapStream
+
+# offset of sequential number in frame, it follows the type/length field
+FRAME_NUMBER_OFFSET = 14
+
 
 class IXIABufferFileParser(object):
     def __init__(self, filenames):
@@ -42,10 +50,24 @@ class IXIABufferFileParser(object):
         processed by reading and discarding the first two lines on each file.
         """
         for filename in filenames:
+            if self.__is_pcap(filename):
+                self.frames_files.append(PcapStream(filename))
+                continue
             a_file = open(filename, "r")
             self.__discard_headers(a_file)
             self.frames_files.append(a_file)
 
+    def __is_pcap(self, filename):
+        with open(filename, "rb") as a_file:
+            magic = a_file.read(4)
+        return magic in (
+            b"\xd4\xc3\xb2\xa1",
+            b"\xa1\xb2\xc3\xd4",
+            b"\x4d\x3c\xb2\xa1",
+            b"\xa1\xb2\x3c\x4d",
+            b"\x0a\x0d\x0d\x0a",
+        )
+
     def __discard_headers(self, frame_file):
         """
         Discards the first two lines (header) leaving only the frames
@@ -103,6 +125,15 @@ class IXIABufferFileParser(object):
                 do_something(frame)
         """
         while True:
+            if isinstance(self.current_file, PcapStream):
+                for frame in self.current_file.frames():
+                    yield int.from_bytes(
+                        frame.data[FRAME_NUMBER_OFFSET : FRAME_NUMBER_OFFSET + 4],
+                        "big",
+                    )
+                if not self._next_file():
+                    break
+                continue
             frameinfo = self.current_file.readline().strip()
             if not frameinfo:
                 if not self._next_file():
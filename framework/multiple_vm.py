@@ -6,6 +6,7 @@ import traceback
 import threadpool
 
 from .logger import getLogger
+from .profiler import profiler
 from .settings import DTS_ERR_TBL, DTS_PARALLEL_SETTING, save_global_setting
 from .utils import RED
 
@@ -152,7 +153,7 @@ class MultipleVM(object):
         outputs = []
 
         if "delay" in args:
-            time.sleep(args["delay"])
+            profiler.sleep(args["delay"])
 
         self.logger.debug("Parallel task start for DUT%d %s" % (dut_id, vm_name))
 
@@ -277,7 +278,7 @@ class MultipleVM(object):
 
         while True:
             try:
-                time.sleep(0.5)
+                profiler.sleep(0.5)
                 self.pool.poll()
             except threadpool.NoResultsPending:
                 self.logger.info(
@@ -292,7 +293,7 @@ class MultipleVM(object):
         self.pool._requests_queue.queue.clear()
         self.pool._results_queue.queue.clear()
 
-        time.sleep(2)
+        profiler.sleep(2)
 
         # exit from parallel mode
         save_global_setting(DTS_PARALLEL_SETTING, "no")
@@ -6,6 +6,7 @@
 Generic packet create, transmit and analyze module
 Base on scapy(python program for packet manipulation)
 """
+import hashlib
 import os
 import random
 import re
@@ -13,7 +14,9 @@ import shutil
 import socket
 import struct
 import sys
+import threading
 import time
+from collections import Counter, OrderedDict
 from importlib import import_module
 from socket import AF_INET6
 
@@ -28,7 +31,13 @@ from scapy.layers.vxlan import VXLAN
 from scapy.packet import Raw
 from scapy.sendrecv import sendp
 from scapy.utils import hexstr, rdpcap, wrpcap
+from scapy.volatile import VolatileValue
 
+from dep.pkt_agent import frame_fields
+
+from .packet_bulk import FrameTemplate, generate_frames
+from .pcap_stream import DLT_EN10MB, FrameView, PcapStream, write_pcap
+from .profiler import profiler
 from .utils import convert_int2ip, convert_ip2int, get_module_path
 
 # load extension layers
@@ -102,6 +111,8 @@ LayersTypes = {
 
 # Saved background sniff process id
 SNIFF_PIDS = {}
+# Fields and aggregate flag of sniff process in summary mode
+SNIFF_FIELDS = {}
 
 # Saved packet generator process id
 # used in pktgen or tgen
@@ -110,6 +121,90 @@ PKTGEN_PIDS = {}
 # default filter for LLDP packet
 LLDP_FILTER = {"layer": "ether", "config": {"type": "not lldp"}}
 
+# namespace to evaluate packet string, loaded when first used
+SCAPY_NAMESPACE = None
+
+# number of packet templates kept in cache
+PKT_CACHE_SIZE = 4096
+
+
+class PacketCache(object):
+
+    """
+    Process wide LRU cache of packet templates. Template is keyed by packet
+    string or packet options, every field of template (layers, frames, ...)
+    is built once when it is first looked up.
+    """
+
+    def __init__(self, size=PKT_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, field, build):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and field in entry:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry[field]
+            self.misses += 1
+
+        value = build()
+        with self.lock:
+            entry = self.entries.setdefault(key, {})
+            entry[field] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+PACKET_CACHE = PacketCache()
+
+
+# fields whose default value is resolved by routes and neighbors of the host
+HOST_DEFAULT_FIELDS = {
+    Ether: ("src", "dst"),
+    IP: ("src",),
+    IPv6: ("src",),
+    ARP: ("hwsrc", "psrc"),
+}
+
+
+def has_host_defaults(pkt):
+    """
+    Check whether packet has unset fields whose value depends on the host
+    which builds it, such packet should be built on tester.
+    """
+    for layer in pkt.iterpayloads():
+        for field in HOST_DEFAULT_FIELDS.get(type(layer), ()):
+            if layer.fields.get(field) is None:
+                return True
+    return False
+
+
+def get_scapy_namespace():
+    """
+    Namespace to evaluate packet string, same as scapy session on tester.
+    """
+    global SCAPY_NAMESPACE
+    if SCAPY_NAMESPACE is None:
+        SCAPY_NAMESPACE = dict(vars(import_module("scapy.all")))
+        SCAPY_NAMESPACE.update(globals())
+    return SCAPY_NAMESPACE
+
 
 def write_raw_pkt(pkt_str, file_name):
     tmp = eval(pkt_str)
@@ -474,6 +569,31 @@ class Packet(object):
         :param options: packt configuration, dictionary type
         :return:
         """
+        # packet with random payload can't be reused
+        if "ran_payload" in options:
+            self._build_pkt(options)
+            return
+
+        key = ("options", repr(sorted(options.items())))
+        template = PACKET_CACHE.lookup(
+            key, "template", lambda: self._build_pkt_template(options)
+        )
+        for attr, value in list(template["attrs"].items()):
+            setattr(self, attr, value if attr != "pkt_layers" else list(value))
+        self.pktgen.assign_pkt(template["pkt"].copy())
+
+    def _build_pkt_template(self, options):
+        self._build_pkt(options)
+        attrs = {
+            attr: value
+            for attr, value in list(vars(self).items())
+            if attr.startswith("configured_layer_")
+            or attr in ("pkt_type", "pkt_len", "pkt_layers", "pkt_cfgload")
+        }
+        attrs["pkt_layers"] = list(self.pkt_layers)
+        return {"attrs": attrs, "pkt": self.pktgen.pkt.copy()}
+
+    def _build_pkt(self, options):
         self.pkt_len = 64
         self.pkt_type = "UDP"
         if "pkt_type" in list(options.keys()):
@@ -522,10 +642,18 @@ class Packet(object):
         :param scapy_str: packet str, eg. 'Ether()/IP()/UDP()'
         :return: None
         """
+        self.pkt_type, pkt_layers = PACKET_CACHE.lookup(
+            scapy_str, "layers", lambda: self._parse_pkt_layers(scapy_str)
+        )
+        self.pkt_layers = list(pkt_layers)
+        self.pkt_cfgload = True
+        self.pktgen.assign_pkt(scapy_str)
+
+    def _parse_pkt_layers(self, scapy_str):
         layer_li = [re.sub("\(.*?\)", "", i) for i in scapy_str.split("/")]
         self.pkt_type = "_".join(layer_li)
         self._load_pkt_layers()
-        self.pktgen.assign_pkt(scapy_str)
+        return self.pkt_type, list(self.pkt_layers)
 
     def append_pkt(self, args=None, **kwargs):
         """
@@ -589,6 +717,7 @@ class Packet(object):
         ip_increase=True,
         random_payload=False,
         options=None,
+        bulk=False,
     ):
         """
         # generate random packets
@@ -598,6 +727,7 @@ class Packet(object):
         :param ip_increase: auto increase ip value
         :param random_payload: if True, generate random packets with random payload
         :param options: packet layer configuration
+        :param bulk: if True, generate raw frames in bulk from packet templates
         :return: None
         """
 
@@ -621,42 +751,55 @@ class Packet(object):
         except:
             dst_ip_num = 0
 
+        if bulk:
+            # one template for each packet type, frames are generated from
+            # templates by updating dst ip, lengths and checksums
+            types = [random.choice(random_type) for _ in range(pktnum)]
+            templates = {}
+            try:
+                for pkt_type in set(types):
+                    self._config_random_pkt(
+                        pkt_type, dstmac, options, ip_increase, src_ip_num, dst_ip_num
+                    )
+                    if random_payload and self.def_packet[pkt_type]["cfgload"]:
+                        self._config_payload_flags()
+                    templates[pkt_type] = FrameTemplate(self.pktgen.pkt)
+            except ValueError:
+                # types other than ether/ip/l4 are generated by scapy
+                bulk = False
+
+        if bulk:
+            payload_lens = None
+            if random_payload:
+                payload_lens = [
+                    random.randint(64, 100) if self.def_packet[t]["cfgload"] else 0
+                    for t in types
+                ]
+            self.pktgen.pkts.extend(
+                generate_frames(
+                    templates,
+                    types,
+                    dst_ip_num if ip_increase else None,
+                    payload_lens,
+                )
+            )
+            return
+
         for i in range(pktnum):
             # random the packet type
-            self.pkt_type = random.choice(random_type)
-            self.pkt_layers = self.def_packet[self.pkt_type]["layers"]
-            self.check_layer_config()
-            self.pktgen.add_layers(self.pkt_layers)
-            # hardcode src/dst port for some protocol may cause issue
-            if "TCP" in self.pkt_type:
-                self.config_layer("tcp", {"src": 65535, "dst": 65535})
-            if "UDP" in self.pkt_type:
-                self.config_layer("udp", {"src": 65535, "dst": 65535})
-            if "layers_config" in options:
-                self.config_layers(options["layers_config"])
-            if dstmac:
-                self.config_layer("ether", {"dst": "%s" % dstmac})
-            # generate auto increase dst ip packet
+            self._config_random_pkt(
+                random.choice(random_type),
+                dstmac,
+                options,
+                ip_increase,
+                src_ip_num,
+                dst_ip_num,
+            )
             if ip_increase:
-                if "v6" in self.pkt_type:
-                    dstip = convert_int2ip(dst_ip_num, ip_type=6)
-                    srcip = convert_int2ip(src_ip_num, ip_type=6)
-                    self.config_layer(
-                        "ipv6", config={"dst": "%s" % (dstip), "src": "%s" % srcip}
-                    )
-                else:
-                    dstip = convert_int2ip(dst_ip_num, ip_type=4)
-                    srcip = convert_int2ip(src_ip_num, ip_type=4)
-                    self.config_layer(
-                        "ipv4", config={"dst": "%s" % (dstip), "src": "%s" % srcip}
-                    )
                 dst_ip_num += 1
             # generate random payload of packet
             if random_payload and self.def_packet[self.pkt_type]["cfgload"]:
-                # TCP packet has a default flags S, packet should not load data, so set it to A if has payload
-                if "TCP" in self.pkt_type:
-                    self.config_layer("tcp", {"src": 65535, "dst": 65535, "flags": "A"})
-
+                self._config_payload_flags()
                 payload_len = random.randint(64, 100)
                 payload = []
                 for _ in range(payload_len):
@@ -664,6 +807,42 @@ class Packet(object):
                 self.config_layer("raw", config={"payload": payload})
             self.pktgen.append_pkts()
 
+    def _config_random_pkt(
+        self, pkt_type, dstmac, options, ip_increase, src_ip_num, dst_ip_num
+    ):
+        self.pkt_type = pkt_type
+        self.pkt_layers = self.def_packet[self.pkt_type]["layers"]
+        self.check_layer_config()
+        self.pktgen.add_layers(self.pkt_layers)
+        # hardcode src/dst port for some protocol may cause issue
+        if "TCP" in self.pkt_type:
+            self.config_layer("tcp", {"src": 65535, "dst": 65535})
+        if "UDP" in self.pkt_type:
+            self.config_layer("udp", {"src": 65535, "dst": 65535})
+        if "layers_config" in options:
+            self.config_layers(options["layers_config"])
+        if dstmac:
+            self.config_layer("ether", {"dst": "%s" % dstmac})
+        # generate auto increase dst ip packet
+        if ip_increase:
+            if "v6" in self.pkt_type:
+                dstip = convert_int2ip(dst_ip_num, ip_type=6)
+                srcip = convert_int2ip(src_ip_num, ip_type=6)
+                self.config_layer(
+                    "ipv6", config={"dst": "%s" % (dstip), "src": "%s" % srcip}
+                )
+            else:
+                dstip = convert_int2ip(dst_ip_num, ip_type=4)
+                srcip = convert_int2ip(src_ip_num, ip_type=4)
+                self.config_layer(
+                    "ipv4", config={"dst": "%s" % (dstip), "src": "%s" % srcip}
+                )
+
+    def _config_payload_flags(self):
+        # TCP packet has a default flags S, packet should not load data, so set it to A if has payload
+        if "TCP" in self.pkt_type:
+            self.config_layer("tcp", {"src": 65535, "dst": 65535, "flags": "A"})
+
     def save_pcapfile(self, crb=None, filename="saved_pkts.pcap"):
         """
 
@@ -671,24 +850,93 @@ class Packet(object):
         :param filename: location and name for packets to be saved
         :return: None
         """
-        # save pkts to pcap file to local path, then copy to remote tester tmp directory,
+        # save pkts to local path, which is same as remote path if filename is
+        # absolute, otherwise $dts/ouput/tmp/pcap/. Then save into pcap store
+        # of remote tester and copy to target path
         if crb:
-            trans_path = crb.tmp_file
-            file_name = filename
+            trans_path = crb.tmp_file + filename.split(os.path.sep)[-1]
+            local_file = TMP_PATH + os.path.basename(trans_path)
             if os.path.isabs(filename):  # check if the given filename with a abs path
                 file_dir = os.path.dirname(filename)
                 out = crb.send_expect("ls -d %s" % file_dir, "# ", verify=True)
                 if not isinstance(out, str):
                     raise Exception("%s may not existed on %s" % (file_dir, crb.name))
-                wrpcap(filename, self.pktgen.pkts)
-                trans_path = os.path.abspath(filename)
-                file_name = filename.split(os.path.sep)[-1]
-            # write packets to local tmp path $dts/ouput/tmp/pcap/
-            wrpcap(TMP_PATH + file_name, self.pktgen.pkts)
-            # copy to remote tester tmp path /tmp/tester
-            crb.session.copy_file_to(TMP_PATH + file_name, trans_path)
+                trans_path = filename
+                # local file is read by packet generators like trex and ixia
+                local_file = filename
+                if not os.path.exists(file_dir):
+                    os.makedirs(file_dir)
+            pkts = self._pcap_pkts()
+            self._write_pcapfile(local_file, pkts)
+            remote_file = self._store_pcapfile(crb, pkts, local_file)
+            crb.send_expect("cp -f %s %s" % (remote_file, trans_path), "# ")
+        else:
+            self._write_pcapfile(filename)
+
+    def _store_pcapfile(self, crb, pkts=None, local_file=None):
+        """
+        Save packets into pcap store on crb, which is named by hash of frames,
+        so that same packets are only uploaded once.
+        :param crb: session or crb object
+        :param pkts: packets to be saved
+        :param local_file: local pcap file of packets if it's written
+        :return: pcap file path on crb
+        """
+        if pkts is None:
+            pkts = self._pcap_pkts()
+        digest = hashlib.sha1()
+        for p in pkts:
+            data = bytes(p)
+            digest.update(struct.pack("!I", len(data)))
+            digest.update(data)
+        digest = digest.hexdigest()
+        store_dir = crb.tmp_file + "pcap_store/"
+        remote_file = "%s%s.pcap" % (store_dir, digest)
+
+        # hashes of uploaded pcap files, it's checked on crb first time
+        stored = getattr(crb, "pcap_store", None)
+        if stored is None:
+            stored = set()
+            setattr(crb, "pcap_store", stored)
+        if digest in stored:
+            return remote_file
+        out = crb.send_expect("ls %s" % remote_file, "# ", verify=True)
+        if not isinstance(out, str):
+            if local_file is None:
+                local_file = TMP_PATH + digest + ".pcap"
+                self._write_pcapfile(local_file, pkts)
+            crb.send_expect("mkdir -p %s" % store_dir, "# ")
+            crb.session.copy_file_to(local_file, remote_file)
+        stored.add(digest)
+        return remote_file
+
+    def _write_pcapfile(self, filename, pkts=None):
+        if pkts is None:
+            pkts = self._pcap_pkts()
+        # raw frames are written directly without scapy
+        if all(isinstance(p, bytes) for p in pkts):
+            write_pcap(filename, pkts)
         else:
-            wrpcap(filename, self.pktgen.pkts)
+            wrpcap(filename, pkts)
+
+    def _pcap_pkts(self):
+        """
+        Packets to be saved in pcap file, packet string is replaced by its
+        cached raw frames, which are written as ethernet frames.
+        """
+        pkts = []
+        for p in self.pktgen.pkts:
+            if isinstance(p, FrameView) and p.linktype == DLT_EN10MB:
+                pkts.append(p.data)
+                continue
+            if not isinstance(p, str):
+                pkts.append(p)
+                continue
+            frames = PACKET_CACHE.lookup(p, "frames", lambda: self._build_str_frames(p))
+            if frames is None:
+                raise Exception("packet %s can't be built" % p)
+            pkts.extend(frames)
+        return pkts
 
     def read_pcapfile(self, filename, crb=None):
         """
@@ -714,6 +962,32 @@ class Packet(object):
             self.pktgen.pkts.append(i)
         return p
 
+    def load_pcapfile(self, filename, match=None, lazy=True):
+        """
+        Load packets from pcap file. Packets are loaded as frame views, which
+        are decoded when accessed, or as scapy packets if lazy is False.
+        Only frames which match function returns True are loaded.
+        :param filename: pcap or pcapng file
+        :param match: function to filter frame view
+        :param lazy: load frame views instead of scapy packets
+        :return: list of loaded packets
+        """
+        frames = iter_pcapfile(filename, match)
+        if not lazy:
+            frames = (frame.packet for frame in frames)
+        return self.load_frames(list(frames))
+
+    def load_frames(self, frames):
+        """
+        Append frame views into packets.
+        :param frames: list of frame view
+        :return: list of frame view
+        """
+        if frames:
+            self.pktgen.assign_pkt(frames[-1])
+            self.pktgen.pkts.extend(frames)
+        return frames
+
     def send_pkt_bg_with_pcapfile(self, crb, tx_port="", count=1, loop=0, inter=0):
         """
         send packet background with a pcap file, got an advantage in sending a large number of packets
@@ -726,10 +1000,22 @@ class Packet(object):
         """
         if crb.name != "tester":
             raise Exception("crb should be tester")
-        wrpcap("_", self.pktgen.pkts)
-        file_path = "/tmp/%s.pcap" % tx_port
+        file_path = self._store_pcapfile(crb)
         scapy_session_bg = crb.prepare_scapy_env()
-        scapy_session_bg.copy_file_to("_", file_path)
+        # replay by tcpreplay in scapy session, it's stopped by ^C as sendp
+        if has_tcpreplay(crb):
+            loops = 0 if loop else count
+            rate = "--pps=%s" % (1.0 / inter) if inter else "--topspeed"
+            cmd = "tcpreplay -q -i %s --loop=%d %s %s" % (
+                tx_port,
+                loops,
+                rate,
+                file_path,
+            )
+            scapy_session_bg.send_command(
+                '__import__("subprocess").call("%s", shell=True)' % cmd
+            )
+            return scapy_session_bg
         scapy_session_bg.send_expect('pkts = rdpcap("%s")' % file_path, ">>> ")
         scapy_session_bg.send_command(
             'sendp(pkts, iface="%s",count=%s,loop=%s,inter=%s)'
@@ -760,17 +1046,83 @@ class Packet(object):
     def gernerator_pkt_str(self):
         pkt_str_list = []
         for p in self.pktgen.pkts:
-            if not isinstance(p, str):
-                p_str = p.command()
+            if isinstance(p, bytes):
+                # raw frame generated in bulk
+                p_str = "Ether(%r)" % p
+            elif not isinstance(p, str):
+                p_str = self._transform_pkt_str(p.command())
             else:
-                p_str = p
-            # process the NVGRE
-            if "NVGRE" in p_str:
-                p_str = self.transform_nvgre_layer(p_str)
+                p_str = PACKET_CACHE.lookup(
+                    p, "command", lambda: self._transform_pkt_str(p)
+                )
             pkt_str_list.append(p_str)
         return "[" + ",".join(pkt_str_list) + "]"
 
+    def gernerator_pkt_frames(self):
+        """
+        Build raw frames of packets, return None if packets can't be built
+        locally or have random fields which should be generated on each send.
+        """
+        frames = []
+        for p in self.pktgen.pkts:
+            if isinstance(p, str):
+                # frames of packet string are built once and cached
+                p_frames = PACKET_CACHE.lookup(
+                    p, "frames", lambda: self._build_str_frames(p)
+                )
+                if p_frames is None:
+                    return None
+                frames.extend(p_frames)
+                continue
+            if isinstance(p, bytes):
+                frames.append(p)
+                continue
+            if isinstance(p, FrameView):
+                frames.append(p.data)
+                continue
+            try:
+                if any(
+                    isinstance(value, VolatileValue)
+                    for layer in p.iterpayloads()
+                    for value in layer.fields.values()
+                ) or has_host_defaults(p):
+                    return None
+                # packet with field list or range is expanded as sendp does
+                frames.extend(bytes(frame) for frame in p)
+            except Exception:
+                return None
+        return frames
+
+    def _build_str_frames(self, pkt_str):
+        if "Rand" in pkt_str:
+            return None
+        try:
+            p = eval(
+                self._recompose_pkts_str(self._transform_pkt_str(pkt_str)),
+                get_scapy_namespace(),
+            )
+            if has_host_defaults(p):
+                return None
+            return [bytes(frame) for frame in p]
+        except Exception:
+            return None
+
+    def _transform_pkt_str(self, pkt_str):
+        # process the NVGRE
+        if "NVGRE" in pkt_str:
+            return self.transform_nvgre_layer(pkt_str)
+        return pkt_str
+
     def send_pkt(self, crb, tx_port="", count=1, interval=0, timeout=120):
+        # tester sends raw frames by packet agent, scapy is only used when
+        # frames can't be built here or agent not available
+        if crb.name == "tester":
+            frames = self.gernerator_pkt_frames()
+            if frames is not None:
+                tx_result = crb.send_frames(frames, tx_port, count, interval, timeout)
+                if tx_result is not None:
+                    return tx_result
+
         p_str = self.gernerator_pkt_str()
         pkts_str = self._recompose_pkts_str(pkts_str=p_str)
         cmd = (
@@ -1080,23 +1432,28 @@ def get_filter_cmd(filters=[]):
         return ""
 
 
-def start_tcpdump(crb, intf, count=0, filters=None, lldp_forbid=True):
+def has_tcpreplay(crb):
     """
-    sniff all packets from certain port
+    Return whether tcpreplay can be used on crb, it's probed once for each
+    crb.
     """
-    filters = [] if filters is None else filters
-    out = crb.send_expect("ls -d %s" % crb.tmp_file, "# ", verify=True)
-    if out == 2:
-        crb.send_expect("mkdir -p %s" % crb.tmp_file, "# ")
-    filename = "{}sniff_{}.pcap".format(crb.tmp_file, intf)
-    # delete old pcap file
-    crb.send_expect("rm -rf %s" % filename, "# ")
+    if getattr(crb, "tcpreplay", None) is None:
+        out = crb.send_expect("which tcpreplay", "# ", verify=True)
+        setattr(crb, "tcpreplay", isinstance(out, str) and "tcpreplay" in out)
+    return crb.tcpreplay
+
+
+def get_tcpdump_direction(crb, session):
+    """
+    Return direction parameter supported by tcpdump on crb, it's probed once
+    for each crb.
+    """
+    if getattr(crb, "tcpdump_direction", None) is not None:
+        return crb.tcpdump_direction
 
     param = ""
     direct_param = r"(\s+)\[ (\S+) in\|out\|inout \]"
-    tcpdump_session = crb.create_session("tcpdump_session" + str(time.time()))
-    setattr(tcpdump_session, "tmp_file", crb.tmp_file)
-    tcpdump_help = tcpdump_session.send_command("tcpdump -h")
+    tcpdump_help = session.send_command("tcpdump -h")
 
     for line in tcpdump_help.split("\n"):
         m = re.match(direct_param, line)
@@ -1111,12 +1468,46 @@ def start_tcpdump(crb, intf, count=0, filters=None, lldp_forbid=True):
 
     if len(param) == 0:
         print("tcpdump not support direction choice!!!")
+    setattr(crb, "tcpdump_direction", param)
+    return param
 
+
+def start_tcpdump(
+    crb, intf, count=0, filters=None, lldp_forbid=True, fields=None, aggregate=True
+):
+    """
+    sniff all packets from certain port, only fields of packets are kept when
+    fields specified, see frame_fields for names of fields.
+    """
+    filters = [] if filters is None else filters
     if lldp_forbid and (LLDP_FILTER not in filters):
         filters.append(LLDP_FILTER)
 
     filter_cmd = get_filter_cmd(filters)
 
+    # tester captures by its packet agent, frames are kept in agent and
+    # fetched by same session, tcpdump is only used when agent not available.
+    # Sent frames are captured as tcpdump does when it has no direction option
+    if crb.name == "tester":
+        inbound = bool(get_tcpdump_direction(crb, crb))
+        index = crb.start_capture(intf, count, filter_cmd, fields, aggregate, inbound)
+        if index is not None:
+            SNIFF_PIDS[index] = (crb, intf, None)
+            if fields:
+                SNIFF_FIELDS[index] = (fields, aggregate)
+            return index
+
+    out = crb.send_expect("ls -d %s" % crb.tmp_file, "# ", verify=True)
+    if out == 2:
+        crb.send_expect("mkdir -p %s" % crb.tmp_file, "# ")
+    filename = "{}sniff_{}.pcap".format(crb.tmp_file, intf)
+    # delete old pcap file
+    crb.send_expect("rm -rf %s" % filename, "# ")
+
+    tcpdump_session = crb.create_session("tcpdump_session" + str(time.time()))
+    setattr(tcpdump_session, "tmp_file", crb.tmp_file)
+    param = get_tcpdump_direction(crb, tcpdump_session)
+
     sniff_cmd = "tcpdump -i %(INTF)s %(FILTER)s %(IN_PARAM)s -w %(FILE)s"
     options = {
         "INTF": intf,
@@ -1135,23 +1526,119 @@ def start_tcpdump(crb, intf, count=0, filters=None, lldp_forbid=True):
 
     index = str(time.time())
     SNIFF_PIDS[index] = (tcpdump_session, intf, filename)
-    time.sleep(1)
+    if fields:
+        SNIFF_FIELDS[index] = (fields, aggregate)
+    profiler.sleep(1)
     return index
 
 
-def stop_and_load_tcpdump_packets(index="", timeout=1):
+def mark_tcpdump_packets(index=""):
     """
-    Stop sniffer and return packet object
+    Return number of packets captured until now, None if sniffer is not
+    started by packet agent.
     """
-    if index in list(SNIFF_PIDS.keys()):
-        pipe, intf, filename = SNIFF_PIDS.pop(index)
-        pipe.get_session_before(timeout)
-        pipe.send_command("^C")
-        pipe.copy_file_from(filename, TMP_PATH)
-        p = Packet()
-        p.read_pcapfile(TMP_PATH + filename.split(os.sep)[-1])
-        pipe.close()
-        return p
+    if index in SNIFF_PIDS:
+        crb, _, filename = SNIFF_PIDS[index]
+        if filename is None:
+            return crb.mark_capture(index)
+
+
+def stop_and_count_tcpdump_packets(index="", timeout=1):
+    """
+    Stop sniffer and return number of captured packets without loading them.
+    """
+    if index in SNIFF_PIDS:
+        crb, _, filename = SNIFF_PIDS[index]
+        if filename is None:
+            SNIFF_PIDS.pop(index)
+            # wait for packets in flight like tcpdump session
+            profiler.sleep(timeout)
+            count = crb.stop_capture(index)
+            crb.agent_request("DROP %s" % index)
+            return count
+    frames = iter_tcpdump_packets(index, timeout)
+    if frames is not None:
+        return sum(1 for _ in frames)
+
+
+def stop_and_summarize_tcpdump_packets(index="", timeout=1):
+    """
+    Stop sniffer started with fields, return Counter of field tuples if
+    sniffer is aggregated, otherwise list of field tuples of each packet.
+    Fields are extracted on tester when it's captured by packet agent.
+    """
+    if index not in SNIFF_PIDS or index not in SNIFF_FIELDS:
+        return None
+    fields, aggregate = SNIFF_FIELDS.pop(index)
+    crb, _, filename = SNIFF_PIDS[index]
+    if filename is None:
+        SNIFF_PIDS.pop(index)
+        profiler.sleep(timeout)
+        crb.stop_capture(index)
+        summary = crb.fetch_capture_summary(index)
+        if summary is None:
+            return None
+        if aggregate:
+            return Counter({tuple(item[:-1]): item[-1] for item in summary})
+        return [tuple(item) for item in summary]
+
+    frames = iter_tcpdump_packets(index, timeout)
+    values = [frame_fields(frame.data, fields) for frame in frames]
+    return Counter(values) if aggregate else values
+
+
+def iter_pcapfile(filename, match=None):
+    """
+    Yield frame views of pcap file one by one, only frames which match
+    function returns True are yielded. Frames are not kept by iterator.
+    """
+    with PcapStream(filename) as stream:
+        for frame in stream.frames(match):
+            yield frame
+
+
+def iter_tcpdump_packets(index="", timeout=1, match=None, start=0):
+    """
+    Stop sniffer and return iterator of captured frame views, None if sniffer
+    not found. Only frames which match function returns True are yielded.
+    Packets captured by packet agent are yielded from start, which can be got
+    by mark.
+    """
+    if index not in SNIFF_PIDS:
+        return None
+    SNIFF_FIELDS.pop(index, None)
+    pipe, intf, filename = SNIFF_PIDS.pop(index)
+    # captured by packet agent of tester
+    if filename is None:
+        profiler.sleep(timeout)
+        pipe.stop_capture(index)
+        frames = (
+            FrameView(data, ts, len(data))
+            for ts, data in pipe.fetch_capture(index, start)
+        )
+        return (f for f in frames if match is None or match(f))
+    pipe.get_session_before(timeout)
+    pipe.send_command("^C")
+    pipe.copy_file_from(filename, TMP_PATH)
+    pipe.close()
+    return iter_pcapfile(TMP_PATH + filename.split(os.sep)[-1], match)
+
+
+def stop_and_load_tcpdump_packets(index="", timeout=1, match=None, start=0, lazy=False):
+    """
+    Stop sniffer and return packet object, only packets which match function
+    returns True are loaded. Packets are scapy packets as before, or frame
+    views decoded when accessed if lazy is True. Packets captured by packet
+    agent are loaded from start, which can be got by mark.
+    """
+    frames = iter_tcpdump_packets(index, timeout, match, start)
+    if frames is None:
+        return None
+    if not lazy:
+        frames = (frame.packet for frame in frames)
+    p = Packet()
+    p.load_frames(list(frames))
+    return p
 
 
 def compare_pktload(pkt1=None, pkt2=None, layer="L2"):
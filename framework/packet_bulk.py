@@ -0,0 +1,249 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Generate large number of frames from a few header templates. Frames with
+same template and length are generated together in one buffer, destination
+address, lengths and checksums are updated in bulk. Numpy is used when it is
+available, otherwise frames are generated one by one from bytearray.
+"""
+
+import random
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_8021Q = 0x8100
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+
+def checksum(data):
+    """
+    Internet checksum of bytes.
+    """
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+class FrameTemplate(object):
+
+    """
+    Header of one packet type and offsets of fields updated for each frame.
+    Template packet is a scapy packet of ether/ip/l4 layers with empty
+    payload, fields configured in template are not updated. ValueError is
+    raised for packet of other layers.
+    """
+
+    def __init__(self, pkt):
+        l3 = pkt.getlayer(1)
+        l4 = pkt.getlayer(2)
+        if (
+            pkt.name != "Ethernet"
+            or l3 is None
+            or l3.name not in ("IP", "IPv6")
+            or l4 is None
+            or l4.name not in ("TCP", "UDP")
+        ):
+            raise ValueError("unsupported template packet %s" % pkt.summary())
+        self.header = bytes(pkt)
+        self.l3_offset = len(self.header) - len(bytes(l3))
+        self.l4_offset = len(self.header) - len(bytes(l4))
+        self.ipv6 = l3.name == "IPv6"
+        self.proto = IPPROTO_TCP if l4.name == "TCP" else IPPROTO_UDP
+
+        self.l3_len = l3.plen is None if self.ipv6 else l3.len is None
+        self.l3_chksum = not self.ipv6 and l3.chksum is None
+        self.l4_len = self.proto == IPPROTO_UDP and l4.len is None
+        self.l4_chksum = l4.chksum is None
+        if self.ipv6:
+            self.dst_offset = self.l3_offset + 24
+            self.dst_size = 16
+            self.src_offset = self.l3_offset + 8
+        else:
+            self.dst_offset = self.l3_offset + 16
+            self.dst_size = 4
+            self.src_offset = self.l3_offset + 12
+        self.chksum_offset = self.l4_offset + (16 if self.proto == IPPROTO_TCP else 6)
+
+    def build(self, dst, payload):
+        """
+        Build one frame, dst is integer of destination address or None to
+        keep address of template.
+        """
+        frame = bytearray(self.header)
+        frame += payload
+        l4_len = len(frame) - self.l4_offset
+        if dst is not None:
+            frame[self.dst_offset : self.dst_offset + self.dst_size] = dst.to_bytes(
+                self.dst_size, "big"
+            )
+        if self.ipv6:
+            if self.l3_len:
+                struct.pack_into("!H", frame, self.l3_offset + 4, l4_len)
+        else:
+            if self.l3_len:
+                struct.pack_into(
+                    "!H", frame, self.l3_offset + 2, len(frame) - self.l3_offset
+                )
+            if self.l3_chksum:
+                ihl = (frame[self.l3_offset] & 0xF) * 4
+                struct.pack_into("!H", frame, self.l3_offset + 10, 0)
+                struct.pack_into(
+                    "!H",
+                    frame,
+                    self.l3_offset + 10,
+                    checksum(bytes(frame[self.l3_offset : self.l3_offset + ihl])),
+                )
+        if self.l4_len:
+            struct.pack_into("!H", frame, self.l4_offset + 4, l4_len)
+        if self.l4_chksum:
+            struct.pack_into("!H", frame, self.chksum_offset, 0)
+            pseudo = bytes(
+                frame[self.src_offset : self.dst_offset + self.dst_size]
+            ) + struct.pack("!IHBB", l4_len, 0, 0, self.proto)
+            chksum = checksum(pseudo + bytes(frame[self.l4_offset :]))
+            if chksum == 0 and self.proto == IPPROTO_UDP:
+                chksum = 0xFFFF
+            struct.pack_into("!H", frame, self.chksum_offset, chksum)
+        return bytes(frame)
+
+    def build_bulk(self, dsts, payloads):
+        """
+        Build frames with same length by numpy, dsts is array of destination
+        address or None, payloads is 2D array of payloads.
+        """
+        count, payload_len = payloads.shape
+        frames = np.empty((count, len(self.header) + payload_len), dtype=np.uint8)
+        frames[:, : len(self.header)] = np.frombuffer(self.header, dtype=np.uint8)
+        frames[:, len(self.header) :] = payloads
+        l4_len = frames.shape[1] - self.l4_offset
+        if dsts is not None:
+            for index in range(self.dst_size):
+                shift = 8 * (self.dst_size - 1 - index)
+                # address of generated frames is less than 64 bits
+                column = (dsts >> shift) & 0xFF if shift < 64 else 0
+                frames[:, self.dst_offset + index] = column
+        if self.ipv6:
+            if self.l3_len:
+                self.__set_word(frames, self.l3_offset + 4, l4_len)
+        else:
+            if self.l3_len:
+                self.__set_word(
+                    frames, self.l3_offset + 2, frames.shape[1] - self.l3_offset
+                )
+            if self.l3_chksum:
+                ihl = (self.header[self.l3_offset] & 0xF) * 4
+                self.__set_word(frames, self.l3_offset + 10, 0)
+                total = self.__sum_words(frames, self.l3_offset, self.l3_offset + ihl)
+                self.__set_word(frames, self.l3_offset + 10, self.__fold(total))
+        if self.l4_len:
+            self.__set_word(frames, self.l4_offset + 4, l4_len)
+        if self.l4_chksum:
+            self.__set_word(frames, self.chksum_offset, 0)
+            total = self.__sum_words(
+                frames, self.src_offset, self.dst_offset + self.dst_size
+            )
+            total += self.__sum_words(frames, self.l4_offset, frames.shape[1])
+            total += (l4_len >> 16) + (l4_len & 0xFFFF) + self.proto
+            chksum = self.__fold(total)
+            if self.proto == IPPROTO_UDP:
+                chksum[chksum == 0] = 0xFFFF
+            self.__set_word(frames, self.chksum_offset, chksum)
+        return frames
+
+    @staticmethod
+    def __set_word(frames, offset, value):
+        frames[:, offset] = (value >> 8) & 0xFF
+        frames[:, offset + 1] = value & 0xFF
+
+    @staticmethod
+    def __sum_words(frames, start, end):
+        data = frames[:, start:end].astype(np.uint64)
+        if (end - start) % 2:
+            data = np.hstack([data, np.zeros((data.shape[0], 1), dtype=np.uint64)])
+        return ((data[:, 0::2] << 8) + data[:, 1::2]).sum(axis=1)
+
+    @staticmethod
+    def __fold(total):
+        while (total >> 16).any():
+            total = (total & 0xFFFF) + (total >> 16)
+        return ~total & 0xFFFF
+
+
+def generate_frames(templates, types, dst=None, payload_lens=None):
+    """
+    Generate one frame for each item of types, which is key of templates.
+    Destination address is increased from dst for each frame when dst is
+    not None. Payload lengths are in payload_lens, random payload is
+    generated when it's not None, otherwise payload is empty.
+    """
+    count = len(types)
+    if payload_lens is None:
+        payload_lens = [0] * count
+    if np is None:
+        frames = []
+        for index, pkt_type in enumerate(types):
+            payload = bytes(
+                random.randrange(0, 255) for _ in range(payload_lens[index])
+            )
+            frames.append(
+                templates[pkt_type].build(
+                    dst + index if dst is not None else None, payload
+                )
+            )
+        return frames
+
+    # frames of same template and length are built in one buffer
+    groups = {}
+    for index, pkt_type in enumerate(types):
+        groups.setdefault((pkt_type, payload_lens[index]), []).append(index)
+    frames = [None] * count
+    for (pkt_type, payload_len), indexes in list(groups.items()):
+        indexes = np.array(indexes, dtype=np.uint64)
+        payloads = np.random.randint(
+            0, 255, size=(len(indexes), payload_len), dtype=np.uint8
+        )
+        dsts = dst + indexes if dst is not None else None
+        buf = templates[pkt_type].build_bulk(dsts, payloads)
+        for row, index in enumerate(indexes.tolist()):
+            frames[index] = buf[row].tobytes()
+    return frames
+
+
+def frame_l4_load(frame):
+    """
+    Return ether type, integer of destination address and bytes from layer 4
+    header to end of ip packet, padding is not included. Return None if
+    frame is not ip packet.
+    """
+    offset = 12
+    (eth_type,) = struct.unpack_from("!H", frame, offset)
+    while eth_type == ETH_P_8021Q:
+        offset += 4
+        (eth_type,) = struct.unpack_from("!H", frame, offset)
+    l3_offset = offset + 2
+    if eth_type == ETH_P_IP:
+        ihl = (frame[l3_offset] & 0xF) * 4
+        (total_len,) = struct.unpack_from("!H", frame, l3_offset + 2)
+        dst = int.from_bytes(frame[l3_offset + 16 : l3_offset + 20], "big")
+        return eth_type, dst, bytes(frame[l3_offset + ihl : l3_offset + total_len])
+    if eth_type == ETH_P_IPV6:
+        (payload_len,) = struct.unpack_from("!H", frame, l3_offset + 4)
+        dst = int.from_bytes(frame[l3_offset + 24 : l3_offset + 40], "big")
+        return (
+            eth_type,
+            dst,
+            bytes(frame[l3_offset + 40 : l3_offset + 40 + payload_len]),
+        )
+    return None
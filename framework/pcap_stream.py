@@ -0,0 +1,245 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Read and write pcap file without decoding packets by scapy. Reader maps
+pcap or pcapng file into memory and yields frame views, scapy packet of the
+frame is only decoded when it's accessed.
+"""
+
+import mmap
+import struct
+import time
+
+PCAP_MAGIC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+PCAPNG_IDB = 1
+PCAPNG_PB = 2
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+PCAP_SNAPLEN = 65535
+# link type of ethernet frame
+DLT_EN10MB = 1
+
+
+def write_pcap(filename, frames, linktype=DLT_EN10MB):
+    """
+    Write raw frames into pcap file, all frames have same timestamp.
+    """
+    now = time.time()
+    sec = int(now)
+    usec = int((now - sec) * 1000000)
+    with open(filename, "wb") as f:
+        f.write(struct.pack("<IHHiIII", PCAP_MAGIC, 2, 4, 0, 0, PCAP_SNAPLEN, linktype))
+        for frame in frames:
+            f.write(struct.pack("<IIII", sec, usec, len(frame), len(frame)))
+            f.write(frame)
+
+
+class FrameView(object):
+
+    """
+    One captured frame. Raw data, timestamp and length can be used without
+    decoding, other attributes are taken from scapy packet decoded on first
+    access, so that frame view can be used as scapy packet.
+    """
+
+    __slots__ = ("data", "time", "wirelen", "linktype", "_packet")
+
+    def __init__(self, data, timestamp, wirelen, linktype=DLT_EN10MB):
+        self.data = data
+        self.time = timestamp
+        self.wirelen = wirelen
+        self.linktype = linktype
+        self._packet = None
+
+    @property
+    def packet(self):
+        if self._packet is None:
+            from scapy.config import conf
+            from scapy.packet import Raw
+
+            cls = conf.l2types.get(self.linktype, Raw)
+            self._packet = cls(self.data)
+            self._packet.time = self.time
+        return self._packet
+
+    def __getattr__(self, name):
+        # slots not set yet, e.g. when view is copied
+        if name in self.__slots__ or name == "packet" or name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.packet, name)
+
+    def __getitem__(self, item):
+        return self.packet[item]
+
+    def __contains__(self, item):
+        return item in self.packet
+
+    def __iter__(self):
+        return iter(self.packet)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __bytes__(self):
+        return bytes(self.data)
+
+    def __str__(self):
+        return str(self.packet)
+
+    def __repr__(self):
+        return repr(self.packet)
+
+    def __truediv__(self, other):
+        return self.packet / other
+
+    def __eq__(self, other):
+        if isinstance(other, FrameView):
+            return self.data == other.data
+        return self.packet == other
+
+    def __hash__(self):
+        return hash(self.data)
+
+
+class PcapStream(object):
+
+    """
+    Streaming reader of pcap and pcapng file based on mmap.
+    Usage:
+        with PcapStream(filename) as stream:
+            for frame in stream.frames(match=lambda f: len(f) > 64):
+                ...
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, "rb")
+        self.map = None
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file can't be mapped, no frame in it
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def frames(self, match=None):
+        """
+        Yield frame views in file, only frames which match function returns
+        True are yielded when match specified.
+        """
+        if self.map is None or len(self.map) < 4:
+            return
+        (magic,) = struct.unpack_from("<I", self.map, 0)
+        if magic == PCAPNG_SHB:
+            reader = self.__read_pcapng()
+        else:
+            reader = self.__read_pcap()
+        for frame in reader:
+            if match is None or match(frame):
+                yield frame
+
+    def __read_pcap(self):
+        buf = self.map
+        for endian in ("<", ">"):
+            (magic,) = struct.unpack_from(endian + "I", buf, 0)
+            if magic in (PCAP_MAGIC, PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise ValueError("%s is not pcap file" % self.filename)
+        resolution = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+        (linktype,) = struct.unpack_from(endian + "I", buf, 20)
+        record = struct.Struct(endian + "IIII")
+
+        offset = 24
+        while offset + record.size <= len(buf):
+            sec, frac, caplen, wirelen = record.unpack_from(buf, offset)
+            offset += record.size
+            # file may be truncated by tcpdump being stopped
+            if offset + caplen > len(buf):
+                break
+            yield FrameView(
+                buf[offset : offset + caplen],
+                sec + frac * resolution,
+                wirelen,
+                linktype,
+            )
+            offset += caplen
+
+    def __read_pcapng(self):
+        buf = self.map
+        endian = "<"
+        interfaces = []
+        offset = 0
+        while offset + 12 <= len(buf):
+            block_type, block_len = struct.unpack_from(endian + "II", buf, offset)
+            if block_type == PCAPNG_SHB:
+                (byte_order,) = struct.unpack_from("<I", buf, offset + 8)
+                endian = "<" if byte_order == PCAPNG_BYTE_ORDER else ">"
+                block_type, block_len = struct.unpack_from(endian + "II", buf, offset)
+                # interfaces are numbered in each section
+                interfaces = []
+            if block_len < 12 or offset + block_len > len(buf):
+                break
+            body = offset + 8
+            if block_type == PCAPNG_IDB:
+                (linktype,) = struct.unpack_from(endian + "H", buf, body)
+                resolution = self.__if_tsresol(
+                    buf, body + 8, offset + block_len - 4, endian
+                )
+                interfaces.append((linktype, resolution))
+            elif block_type in (PCAPNG_EPB, PCAPNG_PB):
+                if block_type == PCAPNG_EPB:
+                    (if_id,) = struct.unpack_from(endian + "I", buf, body)
+                else:
+                    (if_id,) = struct.unpack_from(endian + "H", buf, body)
+                ts_high, ts_low, caplen, wirelen = struct.unpack_from(
+                    endian + "IIII", buf, body + 4
+                )
+                linktype, resolution = interfaces[if_id]
+                yield FrameView(
+                    buf[body + 20 : body + 20 + caplen],
+                    ((ts_high << 32) | ts_low) * resolution,
+                    wirelen,
+                    linktype,
+                )
+            elif block_type == PCAPNG_SPB:
+                (wirelen,) = struct.unpack_from(endian + "I", buf, body)
+                caplen = min(wirelen, block_len - 16)
+                linktype, _ = interfaces[0]
+                yield FrameView(buf[body + 4 : body + 4 + caplen], 0, wirelen, linktype)
+            offset += block_len
+
+    @staticmethod
+    def __if_tsresol(buf, offset, end, endian):
+        """
+        Timestamp resolution in options of interface description block.
+        """
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", buf, offset)
+            if code == 0:
+                break
+            if code == 9:
+                value = buf[offset + 4]
+                if value & 0x80:
+                    return 2.0 ** -(value & 0x7F)
+                return 10.0**-value
+            offset += 4 + (length + 3) // 4 * 4
+        return 1e-6
@@ -15,6 +15,7 @@ from .pktgen_base import (
     PKTGEN_DPDK,
     PKTGEN_IXIA,
     PKTGEN_IXIA_NETWORK,
+    PKTGEN_SOFTWARE,
     PKTGEN_TREX,
     STAT_TYPE,
     TRANSMIT_CONT,
@@ -24,6 +25,7 @@ from .pktgen_base import (
 )
 from .pktgen_ixia import IxiaPacketGenerator
 from .pktgen_ixia_network import IxNetworkPacketGenerator
+from .pktgen_software import SoftwarePacketGenerator
 from .pktgen_trex import TrexPacketGenerator
 
 # dts libs
@@ -197,6 +199,7 @@ def getPacketGenerator(tester, pktgen_type=PKTGEN_IXIA):
         PKTGEN_IXIA: IxiaPacketGenerator,
         PKTGEN_IXIA_NETWORK: IxNetworkPacketGenerator,
         PKTGEN_TREX: TrexPacketGenerator,
+        PKTGEN_SOFTWARE: SoftwarePacketGenerator,
     }
 
     if pktgen_type in list(pktgen_cls.keys()):
@@ -2,7 +2,10 @@
 # Copyright(c) 2010-2021 Intel Corporation
 #
 
+import json
 import logging
+import os
+import threading
 import time
 from abc import abstractmethod
 from copy import deepcopy
@@ -11,9 +14,19 @@ from pprint import pformat
 
 from .config import PktgenConf
 from .logger import getLogger
+from .pktgen_stats import StatsCollector, stats_filename
+from .profiler import profiler
 
 # packet generator name
-from .settings import PKTGEN, PKTGEN_DPDK, PKTGEN_IXIA, PKTGEN_IXIA_NETWORK, PKTGEN_TREX
+from .settings import (
+    FOLDERS,
+    PKTGEN,
+    PKTGEN_DPDK,
+    PKTGEN_IXIA,
+    PKTGEN_IXIA_NETWORK,
+    PKTGEN_SOFTWARE,
+    PKTGEN_TREX,
+)
 
 # macro definition
 TRANSMIT_CONT = "continuous"
@@ -27,18 +40,225 @@ class STAT_TYPE(Enum):
     TXRX = "txrx"
 
 
+# rfc2544 search strategies
+RFC2544_DICHOTOMY = "dichotomy"
+RFC2544_CONFIRM = "confirm"
+RFC2544_SEEDED = "seeded"
+# last hit rate of each seed key, shared by executions of the same output
+RFC2544_SEED_FILE = os.path.join(FOLDERS["Output"], "rfc2544_seed.json")
+
+
+class Rfc2544Search(object):
+
+    """
+    Search the highest rate percent whose loss rate is permitted. Trial
+    function runs traffic with rate percent and duration, then returns
+    status, result and whether traffic was aborted. Strategy decides the
+    rate and duration of each trial, every trial is recorded in trace.
+    Only passed trials with full duration are taken as hit result.
+    """
+
+    def __init__(self, trial, options={}):
+        self.trial = trial
+        self.max_rate = float(options.get("max_rate") or 100.0)
+        self.min_rate = float(options.get("min_rate") or 0.0)
+        self.accuracy = float(options.get("accuracy") or 0.001)
+        self.duration = options.get("duration") or 10.0
+        self.options = options
+        self.trace = []
+        self.hit_rate = 0
+        self.hit_result = None
+        self.result = None
+
+    def run_trial(self, rate, duration):
+        begin = time.time()
+        status, result, aborted = self.trial(rate, duration)
+        self.trace.append(
+            {
+                "rate": rate,
+                "duration": duration,
+                "status": status,
+                "aborted": aborted,
+                "elapsed": round(time.time() - begin, 3),
+                "result": result,
+            }
+        )
+        self.result = result
+        if status and duration >= self.duration and rate >= self.hit_rate:
+            self.hit_rate = rate
+            self.hit_result = result
+        return status
+
+    def bisect(self, low, high, duration):
+        """
+        Bisect between low rate which is permitted and high rate which is
+        not, return the highest permitted rate found.
+        """
+        while high - low >= self.accuracy:
+            rate = (high - low) / 2 + low
+            if self.run_trial(rate, duration):
+                low = rate
+            else:
+                high = rate
+        return low
+
+    def search(self):
+        raise NotImplementedError
+
+
+class DichotomySearch(Rfc2544Search):
+
+    """
+    Bisect between min rate and max rate, all trials last full duration.
+    """
+
+    def search(self):
+        if self.run_trial(self.max_rate, self.duration):
+            return
+        self.bisect(self.min_rate, self.max_rate, self.duration)
+
+
+class ConfirmSearch(Rfc2544Search):
+
+    """
+    Bisect with short exploratory trials, then confirm the rate found by one
+    trial of full duration. If confirmation fails, bisect below it with full
+    duration trials.
+
+    options usage:
+        trial_duration:
+            duration of exploratory trials, default is 1/5 of duration.
+    """
+
+    def __init__(self, trial, options={}):
+        super(ConfirmSearch, self).__init__(trial, options)
+        self.trial_duration = options.get("trial_duration") or max(
+            self.duration / 5.0, 1
+        )
+
+    def explore(self):
+        """
+        Return the highest rate permitted by exploratory trials, None if no
+        rate is permitted.
+        """
+        if self.run_trial(self.max_rate, self.trial_duration):
+            return self.max_rate
+        rate = self.bisect(self.min_rate, self.max_rate, self.trial_duration)
+        return rate if rate > self.min_rate else None
+
+    def search(self):
+        rate = self.explore()
+        if rate is None or self.run_trial(rate, self.duration):
+            return
+        self.bisect(self.min_rate, rate, self.duration)
+
+
+class SeededSearch(ConfirmSearch):
+
+    """
+    Start from last hit rate of seed key instead of max rate. Window around
+    the seed is doubled until the permitted rate is bracketed, then it's
+    bisected and confirmed as confirm search. It works as confirm search
+    if there is no seed.
+
+    options usage:
+        seed_key:
+            key of last hit rate, e.g. nic/case/config/frame size.
+
+        seed_window:
+            rate percent of first window around the seed, default is 5.
+    """
+
+    _seeds = None
+
+    def __init__(self, trial, options={}):
+        super(SeededSearch, self).__init__(trial, options)
+        self.seed_window = float(options.get("seed_window") or 5.0)
+        self.seed = self.get_seed(options.get("seed_key"))
+
+    @classmethod
+    def __load_seeds(cls):
+        if cls._seeds is None:
+            cls._seeds = {}
+            if os.path.exists(RFC2544_SEED_FILE):
+                try:
+                    with open(RFC2544_SEED_FILE) as f:
+                        cls._seeds = json.load(f)
+                except ValueError:
+                    pass
+        return cls._seeds
+
+    @classmethod
+    def get_seed(cls, key):
+        if not key:
+            return None
+        return cls.__load_seeds().get(key)
+
+    @classmethod
+    def save_seed(cls, key, rate):
+        seeds = cls.__load_seeds()
+        seeds[key] = rate
+        if os.path.isdir(os.path.dirname(RFC2544_SEED_FILE)):
+            with open(RFC2544_SEED_FILE, "w") as f:
+                json.dump(seeds, f, indent=4, sort_keys=True)
+
+    def explore(self):
+        if self.seed is None or not self.min_rate < self.seed < self.max_rate:
+            return super(SeededSearch, self).explore()
+        window = self.seed_window
+        if self.run_trial(self.seed, self.trial_duration):
+            low = high = self.seed
+            while high < self.max_rate:
+                high = min(low + window, self.max_rate)
+                if not self.run_trial(high, self.trial_duration):
+                    break
+                low = high
+                window *= 2
+            else:
+                return self.max_rate
+        else:
+            high = self.seed
+            while True:
+                # min rate is taken as permitted as dichotomy search does
+                low = max(high - window, self.min_rate)
+                if low == self.min_rate or self.run_trial(low, self.trial_duration):
+                    break
+                high = low
+                window *= 2
+        rate = self.bisect(low, high, self.trial_duration)
+        return rate if rate > self.min_rate else None
+
+
+RFC2544_SEARCH = {
+    RFC2544_DICHOTOMY: DichotomySearch,
+    RFC2544_CONFIRM: ConfirmSearch,
+    RFC2544_SEEDED: SeededSearch,
+}
+
+
 class PacketGenerator(object):
     """
     Basic class for packet generator, define basic function for each kinds of
     generators
     """
 
+    # loss statistic can be retrieved while traffic is running
+    live_loss_stats = False
+
     def __init__(self, tester):
         self.logger = getLogger(PKTGEN)
         self.tester = tester
         self.__streams = []
         self._ports_map = []
         self.pktgen_type = None
+        # trials of last rfc2544 search
+        self.rfc2544_trace = []
+        # interval(second) of statistic collected during traffic, 0 disables it
+        self.stats_interval = 1
+        # statistic series of last measurement
+        self.stats_series = None
+        self._stats_collector = None
+        self._stats_lock = threading.RLock()
 
     def _prepare_generator(self):
         raise NotImplementedError
@@ -162,9 +382,42 @@ class PacketGenerator(object):
         )
         self.logger.info(msg)
         self._start_transmission(stream_ids, options)
-        time.sleep(delay)
+        profiler.sleep(delay)
         self._stop_transmission(stream_ids)
 
+    def __start_stats_collector(self, options):
+        """
+        Start collecting statistic in background while traffic is running
+        """
+        interval = options.get("stats_interval", self.stats_interval)
+        self.stats_series = None
+        if not interval:
+            return
+        with self._stats_lock:
+            sample = self._sample_statistic()
+        if sample is None:
+            return
+        self._stats_collector = StatsCollector(
+            self._sample_statistic, interval, self._stats_lock
+        )
+        self._stats_collector.start()
+
+    def __stop_stats_collector(self):
+        """
+        Stop collector before traffic is stopped and save statistic series
+        """
+        collector = self._stats_collector
+        if collector is None:
+            return
+        self._stats_collector = None
+        self.stats_series = collector.stop()
+        if collector.error:
+            msg = "statistic collector stopped: {0}".format(collector.error)
+            self.logger.warning(msg)
+        if self.stats_series.size:
+            filename = self.stats_series.save(stats_filename(self.pktgen_type))
+            self.logger.debug("statistic series saved in %s" % filename)
+
     def __get_single_throughput_statistic(self, stream_ids, stat_type=None):
         bps_rx = []
         pps_rx = []
@@ -175,9 +428,10 @@ class PacketGenerator(object):
         self.logger.info(msg)
         for stream_id in stream_ids:
             if self.__streams[stream_id]["rx_port"] not in used_rx_port:
-                bps_rate, pps_rate = self._retrieve_port_statistic(
-                    stream_id, "throughput"
-                )
+                with self._stats_lock:
+                    bps_rate, pps_rate = self._retrieve_port_statistic(
+                        stream_id, "throughput"
+                    )
                 used_rx_port.append(self.__streams[stream_id]["rx_port"])
                 if stat_type and stat_type is STAT_TYPE.TXRX:
                     bps_tx.append(bps_rate[0])
@@ -225,13 +479,14 @@ class PacketGenerator(object):
         time_elapsed = 0
         stats = []
         while time_elapsed < duration:
-            time.sleep(interval)
+            profiler.sleep(interval)
             stats.append(self.__get_single_throughput_statistic(stream_ids, stat_type))
             if callback and callable(callback):
                 callback()
             time_elapsed += interval
         return stats
 
+    @profiler.timed("traffic")
     def measure_throughput(self, stream_ids=[], options={}):
         """
         Measure throughput on each tx ports
@@ -262,7 +517,7 @@ class PacketGenerator(object):
             duration:
                 traffic lasting time(second). Default value is 10 second.
 
-            stat_type(for trex only):
+            stat_type(for trex and software generator only):
                 STAT_TYPE.RX  return (rx bps, rx_pps)
                 STAT_TYPE.TXRX return ((tx bps, rx_bps), (tx pps, rx_pps))
         """
@@ -270,12 +525,12 @@ class PacketGenerator(object):
         callback = options.get("callback")
         duration = options.get("duration") or 10
         delay = options.get("delay")
-        if self.pktgen_type == PKTGEN_TREX:
+        if self.pktgen_type in (PKTGEN_TREX, PKTGEN_SOFTWARE):
             stat_type = options.get("stat_type") or STAT_TYPE.RX
         else:
             if options.get("stat_type") is not None:
                 msg = (
-                    "'stat_type' option is only for trex, "
+                    "'stat_type' option is only for trex and software generator, "
                     "should not set when use other pktgen tools"
                 )
                 raise Exception(msg)
@@ -285,17 +540,47 @@ class PacketGenerator(object):
         self.__warm_up_pktgen(stream_ids, options, delay)
         # main traffic
         self._start_transmission(stream_ids, options)
+        self.__start_stats_collector(options)
         # keep traffic within a duration time and get throughput statistic
         if interval and duration:
             stats = self.__get_multi_throughput_statistic(
                 stream_ids, duration, interval, callback, stat_type
             )
         else:
-            time.sleep(duration)
+            profiler.sleep(duration)
             stats = self.__get_single_throughput_statistic(stream_ids, stat_type)
+        self.__stop_stats_collector()
         self._stop_transmission(stream_ids)
         return stats
 
+    def __keep_loss_traffic(self, stream_ids, duration, options):
+        """
+        Keep traffic within duration, return True if traffic is aborted
+        because loss rate exceeds option abort_loss_rate.
+        """
+        abort_loss_rate = options.get("abort_loss_rate")
+        if abort_loss_rate is None or not self.live_loss_stats:
+            profiler.sleep(duration)
+            return False
+        interval = options.get("abort_interval") or 1
+        end = time.time() + duration
+        while time.time() + interval < end:
+            profiler.sleep(interval)
+            for stream_id in stream_ids:
+                with self._stats_lock:
+                    tx_pkts, rx_pkts = self._retrieve_port_statistic(stream_id, "loss")
+                if tx_pkts <= 0:
+                    continue
+                loss_rate = float(tx_pkts - rx_pkts) / float(tx_pkts)
+                if loss_rate > abort_loss_rate:
+                    msg = "abort traffic, loss rate {0} exceeds {1}".format(
+                        loss_rate, abort_loss_rate
+                    )
+                    self.logger.info(msg)
+                    return True
+        profiler.sleep(max(end - time.time(), 0))
+        return False
+
     def _measure_loss(self, stream_ids=[], options={}):
         """
         Measure lost rate on each tx/rx ports
@@ -308,10 +593,12 @@ class PacketGenerator(object):
         self.__warm_up_pktgen(stream_ids, options, delay)
         # main traffic
         self._start_transmission(stream_ids, options)
+        self.__start_stats_collector(options)
         # keep traffic within a duration time
-        time.sleep(duration)
+        self._loss_aborted = self.__keep_loss_traffic(stream_ids, duration, options)
         if throughput_stat_flag:
             _throughput_stats = self.__get_single_throughput_statistic(stream_ids)
+        self.__stop_stats_collector()
         self._stop_transmission(None)
         result = {}
         used_rx_port = []
@@ -334,6 +621,7 @@ class PacketGenerator(object):
         else:
             return result
 
+    @profiler.timed("traffic")
     def measure_loss(self, stream_ids=[], options={}):
         """
         options usage:
@@ -374,6 +662,7 @@ class PacketGenerator(object):
         result = (loss_rate, tx_pkts, rx_pkts, pps)
         return result
 
+    @profiler.timed("traffic")
     def measure_latency(self, stream_ids=[], options={}):
         """
         Measure latency on each tx/rx ports
@@ -397,8 +686,10 @@ class PacketGenerator(object):
         self.__warm_up_pktgen(stream_ids, options, delay)
         # main traffic
         self._start_transmission(stream_ids, options)
+        self.__start_stats_collector(options)
         # keep traffic within a duration time
-        time.sleep(duration)
+        profiler.sleep(duration)
+        self.__stop_stats_collector()
         self._stop_transmission(None)
 
         result = {}
@@ -425,6 +716,7 @@ class PacketGenerator(object):
         else:
             return True
 
+    @profiler.timed("traffic")
     def measure_rfc2544(self, stream_ids=[], options={}):
         """check loss rate with rate percent dropping
 
@@ -490,6 +782,7 @@ class PacketGenerator(object):
         tx_num, rx_num = list(last_result[1].values())[0][1:]
         return rate_percent, tx_num, rx_num
 
+    @profiler.timed("traffic")
     def measure_rfc2544_with_pps(self, stream_ids=[], options={}):
         """
         check loss rate with pps bisecting.(not implemented)
@@ -528,6 +821,7 @@ class PacketGenerator(object):
         # here only pick one
         return list(loss_pps_table[-1][1].values())[0]
 
+    @profiler.timed("traffic")
     def measure_rfc2544_dichotomy(self, stream_ids=[], options={}):
         """check loss rate using dichotomy algorithm
 
@@ -551,16 +845,30 @@ class PacketGenerator(object):
 
             accuracy :
                 dichotomy algorithm accuracy, default 0.001.
+
+            search:
+                search strategy, dichotomy/confirm/seeded, default is
+                dichotomy. Options of strategy are in its class.
+
+            seed_key:
+                key to save hit rate as seed of seeded search.
+
+            abort_margin:
+                abort a trial when its loss rate exceeds pdr by margin during
+                traffic, only for generators with live loss statistic.
+                Trials are not aborted by default.
         """
         if self.pktgen_type == PKTGEN_IXIA_NETWORK:
             return self._measure_rfc2544_ixnet(stream_ids, options)
 
         max_rate = options.get("max_rate") or 100.0
         min_rate = options.get("min_rate") or 0.0
-        accuracy = options.get("accuracy") or 0.001
         permit_loss_rate = options.get("pdr") or 0.0
         duration = options.get("duration") or 10.0
         throughput_stat_flag = options.get("throughput_stat_flag") or False
+        search = options.get("search") or RFC2544_DICHOTOMY
+        if search not in RFC2544_SEARCH:
+            raise Exception("rfc2544 search <{0}> is not supported".format(search))
         # start warm up traffic
         delay = options.get("delay")
         _options = {"duration": duration}
@@ -568,43 +876,43 @@ class PacketGenerator(object):
             self._prepare_transmission(stream_ids=stream_ids)
             self.__warm_up_pktgen(stream_ids, _options, delay)
             self._clear_streams()
-        # traffic parameters for dichotomy algorithm
-        loss_rate_table = []
-        hit_result = None
-        hit_rate = 0
-        rate = traffic_rate_max = max_rate
-        traffic_rate_min = min_rate
-        while True:
-            # run loss rate testing
-            _options = {
-                "throughput_stat_flag": throughput_stat_flag,
-                "duration": duration,
-            }
+        trial_options = {"throughput_stat_flag": throughput_stat_flag}
+        if options.get("abort_margin") is not None:
+            trial_options["abort_loss_rate"] = permit_loss_rate + float(
+                options.get("abort_margin")
+            )
+
+        def trial(rate, trial_duration):
+            # first trial at max rate uses rate configured in streams
+            if engine.trace or rate != max_rate:
+                self._clear_streams()
+                # set stream rate percent to custom value
+                self._set_stream_rate_percent(rate)
+            _options = dict(trial_options, duration=trial_duration)
             result = self._measure_loss(stream_ids, _options)
-            loss_rate_table.append([rate, result])
-            status = self._check_loss_rate(
+            status = not self._loss_aborted and self._check_loss_rate(
                 result[0] if throughput_stat_flag else result, permit_loss_rate
             )
-            # if upper bound rate percent hit, quit the left flow
-            if rate == max_rate and status:
-                hit_result = result
-                hit_rate = rate
-                break
-            # if lower bound rate percent not hit, quit the left flow
-            if rate == min_rate and not status:
-                break
-            if status:
-                traffic_rate_min = rate
-                hit_result = result
-                hit_rate = rate
-            else:
-                traffic_rate_max = rate
-            if traffic_rate_max - traffic_rate_min < accuracy:
-                break
-            rate = (traffic_rate_max - traffic_rate_min) / 2 + traffic_rate_min
-            self._clear_streams()
-            # set stream rate percent to custom value
-            self._set_stream_rate_percent(rate)
+            return status, result, self._loss_aborted
+
+        engine = RFC2544_SEARCH[search](trial, options)
+        engine.search()
+        self.rfc2544_trace = engine.trace
+        loss_rate_table = [
+            [item["rate"], item["duration"], item["result"]] for item in engine.trace
+        ]
+        self.logger.info(
+            "rfc2544 {0} search: {1} trials in {2:.1f} seconds".format(
+                search,
+                len(engine.trace),
+                sum(item["elapsed"] for item in engine.trace),
+            )
+        )
+        hit_result = engine.hit_result
+        hit_rate = engine.hit_rate
+        result = engine.result
+        if hit_result and options.get("seed_key"):
+            SeededSearch.save_seed(options.get("seed_key"), hit_rate)
 
         if throughput_stat_flag:
             if not hit_result or not hit_result[0]:
@@ -639,6 +947,7 @@ class PacketGenerator(object):
 
         return ret_value
 
+    @profiler.timed("traffic")
     def measure(self, stream_ids, traffic_opt):
         """
         use as an unify interface method for packet generator
@@ -700,6 +1009,13 @@ class PacketGenerator(object):
     def _retrieve_port_statistic(self, stream_id, mode):
         pass
 
+    def _sample_statistic(self):
+        """
+        Return dict of port and stream counters sampled during traffic, None
+        if generator doesn't support it.
+        """
+        return None
+
     @abstractmethod
     def _check_options(self, opts={}):
         pass
@@ -5,7 +5,6 @@
 import os
 import re
 import string
-import time
 from pprint import pformat
 
 from scapy.packet import Packet
@@ -18,6 +17,7 @@ from .pktgen_base import (
     TRANSMIT_S_BURST,
     PacketGenerator,
 )
+from .profiler import profiler
 from .settings import SCAPY2IXIA
 from .ssh_connection import SSHConnection
 from .utils import convert_int2ip, convert_ip2int, convert_mac2long, convert_mac2str
@@ -810,15 +810,15 @@ class Ixia(SSHConnection):
         """
         Get RX/TX packet statistics and calculate loss rate.
         """
-        time.sleep(delay)
+        profiler.sleep(delay)
 
         self.send_expect("ixStopTransmit portList", "%", 10)
-        time.sleep(2)
+        profiler.sleep(2)
         sendNumber = 0
         for port in txPortlist:
             self.stat_get_stat_all_stats(port)
             sendNumber += self.get_frames_sent()
-            time.sleep(0.5)
+            profiler.sleep(0.5)
 
         self.logger.debug("send :%f" % sendNumber)
 
@@ -844,7 +844,7 @@ class Ixia(SSHConnection):
         Stop IXIA transmit and return latency statistics.
         """
         latencyList = []
-        time.sleep(10)
+        profiler.sleep(10)
         self.send_expect("ixStopTransmit portList", "%", 10)
         for rx_port in rxPortlist:
             self.pktGroup_get_stat_all_stats(rx_port)
@@ -999,7 +999,7 @@ class Ixia(SSHConnection):
         Override this method if you want to change the way of getting results
         back from IXIA.
         """
-        time.sleep(delay)
+        profiler.sleep(delay)
         bpsRate = 0
         rate = 0
         oversize = 0
@@ -1307,14 +1307,14 @@ class Ixia(SSHConnection):
         self.send_expect("ixWritePortsToHardware portList", "%", 5)
         self.send_expect("ixClearStats portList", "%", 5)
         self.send_expect("ixStartTransmit portList", "%", 5)
-        time.sleep(10)
+        profiler.sleep(10)
 
         rxPackets = 0
         for port in txPortlist:
             self.stat_get_stat_all_stats(port)
             txPackets = self.get_frames_sent()
             while txPackets != packetNum:
-                time.sleep(10)
+                profiler.sleep(10)
                 self.stat_get_stat_all_stats(port)
                 txPackets = self.get_frames_sent()
             rxPackets += self.get_frames_received()
@@ -1359,7 +1359,7 @@ class Ixia(SSHConnection):
         """
         Stop IXIA transmit
         """
-        time.sleep(2)
+        profiler.sleep(2)
         self.send_expect("ixStopTransmit portList", "%", 40)
 
     def get_latency_stat(self, port_list):
@@ -1395,7 +1395,7 @@ class Ixia(SSHConnection):
                 "tx_bps": 0,
                 "tx_pps": 0,
             }
-            time.sleep(0.5)
+            profiler.sleep(0.5)
         return stats
 
     def get_throughput_stat(self, port_list):
@@ -1784,6 +1784,15 @@ class IxiaPacketGenerator(PacketGenerator):
             self._conn.stop_transmit()
             self.logger.info("traffic completed. ")
 
+    def _sample_statistic(self):
+        """rx rates of ixia ports"""
+        stats = self._conn.get_stats(self._rx_ports, "throughput")
+        sample = {}
+        for port_id, port_stats in stats.items():
+            for key in ("rx_pps", "rx_bps"):
+                sample["port%d.%s" % (port_id, key)] = port_stats[key]
+        return sample
+
     def _retrieve_port_statistic(self, stream_id, mode):
         """ixia traffic statistics"""
         stats = self._conn.get_stats(self._traffic_ports, mode)
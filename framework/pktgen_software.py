@@ -0,0 +1,245 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Software packet generator, streams are sent from tester ports by packet agent
+through PACKET_MMAP tx ring. Throughput is calculated by counters of tester
+interfaces, so it's only for smoke level checks without hardware generator.
+"""
+
+import re
+import time
+
+from .pcap_stream import PcapStream
+from .pktgen_base import (
+    PKTGEN_SOFTWARE,
+    TRANSMIT_CONT,
+    TRANSMIT_S_BURST,
+    PacketGenerator,
+)
+from .profiler import profiler
+
+
+class SoftwarePacketGenerator(PacketGenerator):
+
+    """
+    Packet generator based on tester's packet agent, tester ports are used as
+    generator ports with same index.
+    """
+
+    # preamble, start of frame delimiter and inter frame gap
+    FRAME_OVERHEAD = 20
+    live_loss_stats = True
+
+    def __init__(self, tester):
+        super(SoftwarePacketGenerator, self).__init__(tester)
+        self.pktgen_type = PKTGEN_SOFTWARE
+        self._traffic_ports = []
+        self._rx_ports = []
+        self._port_speed = {}
+        self._start_counters = {}
+        self._last_counters = {}
+
+    def _prepare_generator(self):
+        if not self.tester.has_pkt_agent():
+            raise Exception("packet agent is not available on tester")
+
+    def _get_port_pci(self, port_id):
+        return self.tester.ports_info[port_id]["pci"]
+
+    def _get_gen_port(self, tester_pci):
+        for port_id, info in enumerate(self.tester.ports_info):
+            if info.get("pci") == tester_pci:
+                return port_id
+        return -1
+
+    def get_ports(self):
+        """
+        Return self ports information, which are tester ports
+        """
+        ports = []
+        for info in self.tester.ports_info:
+            ports.append(
+                {
+                    "intf": info["intf"],
+                    "mac": info["mac"],
+                    "pci": info["pci"],
+                    "type": info["type"],
+                }
+            )
+        return ports
+
+    def _check_options(self, opts={}):
+        if opts.get("fields_config"):
+            self.logger.warning(
+                "fields config is not supported by software packet generator, "
+                "packets in pcap file are sent as they are"
+            )
+        return True
+
+    def _clear_streams(self):
+        self.tester.agent_request("CLEAR")
+
+    def _intf(self, port_id):
+        return self.tester.ports_info[port_id]["intf"]
+
+    def _get_port_speed(self, port_id):
+        """
+        Link speed of port in Mbps, 0 if unknown.
+        """
+        if port_id not in self._port_speed:
+            out = self.tester.send_expect(
+                "cat /sys/class/net/%s/speed" % self._intf(port_id), "# "
+            )
+            speed = int(out) if re.match(r"^\d+$", out.strip()) else 0
+            self._port_speed[port_id] = speed
+        return self._port_speed[port_id]
+
+    def _get_counters(self, port_id):
+        out = self.tester.pkt_agent.session.send_expect(
+            "COUNTERS %s" % self._intf(port_id), self.tester.PKT_AGENT_PROMPT
+        )
+        m = re.match(r"COUNTERS (\d+) (\d+) (\d+) (\d+)", out)
+        if m is None:
+            raise Exception("failed to get counters of port %d: %s" % (port_id, out))
+        return time.time(), [int(v) for v in m.groups()]
+
+    def _get_stream_stats(self):
+        """
+        Return sent packets and bytes of each stream.
+        """
+        out = self.tester.pkt_agent.session.send_expect(
+            "STATS", self.tester.PKT_AGENT_PROMPT
+        )
+        stats = {}
+        for item in re.findall(r"stream(\d+):(\d+):(\d+):\d", out):
+            stats[int(item[0])] = (int(item[1]), int(item[2]))
+        return stats
+
+    def _stream_pps(self, stream, frames, options):
+        """
+        Rate of stream in pps, 0 is as fast as possible.
+        """
+        stream_config = stream["options"].get("stream_config") or {}
+        if stream_config.get("pps"):
+            return stream_config["pps"]
+        rate = options.get("rate") or stream_config.get("rate") or 100
+        speed = self._get_port_speed(stream["tx_port"])
+        if rate >= 100 or not speed:
+            return 0
+        avg_len = sum(len(f) for f in frames) / len(frames) + self.FRAME_OVERHEAD
+        return speed * 1000000.0 * rate / 100 / (avg_len * 8)
+
+    def _prepare_transmission(self, stream_ids=[], latency=False):
+        self._traffic_ports = []
+        self._rx_ports = []
+        self._frames = {}
+        if latency:
+            self.logger.warning("latency is not supported by software generator")
+        for stream_id in stream_ids:
+            stream = self._get_stream(stream_id)
+            if stream["tx_port"] not in self._traffic_ports:
+                self._traffic_ports.append(stream["tx_port"])
+            if stream["rx_port"] not in self._rx_ports:
+                self._rx_ports.append(stream["rx_port"])
+            with PcapStream(stream["pcap_file"]) as pcap:
+                frames = [bytes(frame.data) for frame in pcap.frames()]
+            if not frames:
+                raise Exception("no packet in %s" % stream["pcap_file"])
+            self._frames[stream_id] = frames
+
+    def _start_transmission(self, stream_ids, options={}):
+        ports = set(self._traffic_ports + self._rx_ports)
+        self._start_counters = dict((port, self._get_counters(port)) for port in ports)
+        self._last_counters = dict(self._start_counters)
+        for stream_id in stream_ids:
+            stream = self._get_stream(stream_id)
+            frames = self._frames[stream_id]
+            key = "stream%d" % stream_id
+            if not self.tester.load_agent_frames("LOAD %s" % key, frames):
+                raise Exception("failed to load frames of stream %d" % stream_id)
+            stream_config = stream["options"].get("stream_config") or {}
+            count = 0
+            if stream_config.get("transmit_mode", TRANSMIT_CONT) == TRANSMIT_S_BURST:
+                txmode = stream_config.get("txmode") or {}
+                count = txmode.get("total_pkts") or len(frames)
+            pps = self._stream_pps(stream, frames, options)
+            request = "STREAM %s %s %f %d" % (
+                key,
+                self._intf(stream["tx_port"]),
+                pps,
+                count,
+            )
+            if self.tester.agent_request(request) is None:
+                raise Exception("failed to start stream %d" % stream_id)
+        self.logger.info("begin traffic ......")
+
+    def _stop_transmission(self, stream_id):
+        self.tester.agent_request("HALT")
+        # wait for packets in flight
+        profiler.sleep(0.5)
+        self.logger.info("traffic completed. ")
+
+    def _throughput_stats(self, stream):
+        """
+        Rates of tx port and rx port since last query.
+        """
+        current = {}
+        for port_id in (stream["tx_port"], stream["rx_port"]):
+            current[port_id] = self._get_counters(port_id)
+        rates = []
+        for port_id, index in ((stream["tx_port"], 2), (stream["rx_port"], 0)):
+            now, counters = current[port_id]
+            last, last_counters = self._last_counters[port_id]
+            elapsed = now - last or 1
+            pps = (counters[index] - last_counters[index]) / elapsed
+            byte_rate = (counters[index + 1] - last_counters[index + 1]) / elapsed
+            rates.append((byte_rate * 8 + pps * self.FRAME_OVERHEAD * 8, pps))
+        self._last_counters.update(current)
+        (tx_bps, tx_pps), (rx_bps, rx_pps) = rates
+        return (tx_bps, rx_bps), (tx_pps, rx_pps)
+
+    def _loss_rate_stats(self, stream):
+        """
+        Packets sent by streams of tx port and received on rx port, streams
+        keep their counters after they are halted.
+        """
+        opackets = 0
+        for stream_id, (sent, _) in self._get_stream_stats().items():
+            if self._get_stream(stream_id)["tx_port"] == stream["tx_port"]:
+                opackets += sent
+        _, counters = self._get_counters(stream["rx_port"])
+        _, start_counters = self._start_counters[stream["rx_port"]]
+        ipackets = counters[0] - start_counters[0]
+        return opackets, ipackets
+
+    def _retrieve_port_statistic(self, stream_id, mode):
+        stream = self._get_stream(stream_id)
+        if mode == "throughput":
+            return self._throughput_stats(stream)
+        elif mode == "loss":
+            return self._loss_rate_stats(stream)
+        else:
+            self.logger.warning("%s is not supported by software generator" % mode)
+            return None
+
+    def _sample_statistic(self):
+        """
+        Counters of traffic ports and packets sent by each stream.
+        """
+        sample = {}
+        for port_id in set(self._traffic_ports + self._rx_ports):
+            _, counters = self._get_counters(port_id)
+            for key, value in zip(
+                ("ipackets", "ibytes", "opackets", "obytes"), counters
+            ):
+                sample["port%d.%s" % (port_id, key)] = value
+        for stream_id, (sent, sent_bytes) in self._get_stream_stats().items():
+            sample["stream%d.opackets" % stream_id] = sent
+            sample["stream%d.obytes" % stream_id] = sent_bytes
+        return sample
+
+    def quit_generator(self):
+        if self.tester.pkt_agent:
+            self.tester.agent_request("CLEAR")
@@ -0,0 +1,235 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Time series statistic of packet generator. Collector samples counters of
+ports and streams in background at fixed interval while traffic is running.
+Samples are kept in columns, which are numpy arrays when numpy is available,
+and saved in output folder, so throughput, loss and stability summaries can
+be computed from saved series without running traffic again.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import logger
+from .profiler import profiler
+from .settings import FOLDERS
+
+NAN = float("nan")
+
+
+class StatsSeries(object):
+
+    """
+    Columnar buffer of samples. Column "time" is seconds since first sample,
+    other columns are named by sampler, e.g. "port0.rx_pps". Value of column
+    which is not in a sample is nan.
+    """
+
+    def __init__(self, capacity=1024):
+        self.columns = {}
+        self.size = 0
+        self.capacity = capacity
+        self.start = None
+
+    def __new_column(self, capacity):
+        if np is not None:
+            return np.full(capacity, np.nan)
+        return array("d", [NAN] * capacity)
+
+    def __grow(self):
+        for name, column in list(self.columns.items()):
+            if np is not None:
+                column = np.concatenate([column, self.__new_column(self.capacity)])
+            else:
+                column.extend(self.__new_column(self.capacity))
+            self.columns[name] = column
+        self.capacity *= 2
+
+    def append(self, timestamp, values):
+        if self.start is None:
+            self.start = timestamp
+        if self.size == self.capacity:
+            self.__grow()
+        values = dict(values)
+        values["time"] = timestamp - self.start
+        for name, value in values.items():
+            if name not in self.columns:
+                self.columns[name] = self.__new_column(self.capacity)
+            self.columns[name][self.size] = value
+        self.size += 1
+
+    def names(self):
+        return sorted(self.columns.keys())
+
+    def column(self, name):
+        return self.columns[name][: self.size]
+
+    def delta(self, name):
+        """
+        Rate of a cumulative counter between samples, e.g. pps of ipackets.
+        """
+        times = list(self.column("time"))
+        values = list(self.column(name))
+        rates = []
+        for index in range(1, len(values)):
+            elapsed = times[index] - times[index - 1]
+            if elapsed > 0:
+                rates.append((values[index] - values[index - 1]) / elapsed)
+            else:
+                rates.append(NAN)
+        return rates
+
+    def summary(self, name, percentiles=(1, 5, 50, 95, 99)):
+        """
+        Min, max, mean and percentiles of a column, nan is ignored.
+        """
+        return summarize(self.column(name), percentiles)
+
+    def settle_time(self, name, tolerance=0.02, cumulative=False):
+        """
+        Seconds from first sample until column stays within tolerance of the
+        median of its second half, None if it doesn't settle. Rate of column
+        is checked if it's a cumulative counter.
+        """
+        times = list(self.column("time"))
+        if cumulative:
+            values = self.delta(name)
+            times = times[1:]
+        else:
+            values = list(self.column(name))
+        stable = summarize(values[len(values) // 2 :], (50,)).get("p50")
+        if stable is None:
+            return None
+        settled = 0
+        for index, value in enumerate(values):
+            if math.isnan(value) or abs(value - stable) > abs(stable) * tolerance:
+                settled = index + 1
+        if settled >= len(values):
+            return None
+        return times[settled]
+
+    def save(self, filename):
+        """
+        Save columns into npz file, or json file without numpy. Return name
+        of saved file.
+        """
+        columns = dict((name, self.column(name)) for name in self.columns)
+        if np is not None:
+            filename += ".npz"
+            np.savez_compressed(filename, **columns)
+        else:
+            filename += ".json"
+            with open(filename, "w") as f:
+                json.dump(
+                    dict((name, list(column)) for name, column in columns.items()), f
+                )
+        return filename
+
+    @classmethod
+    def load(cls, filename):
+        series = cls()
+        if filename.endswith(".npz"):
+            with np.load(filename) as data:
+                columns = dict((name, data[name]) for name in data.files)
+        else:
+            with open(filename) as f:
+                columns = json.load(f)
+        series.size = series.capacity = len(columns.get("time", []))
+        for name, values in columns.items():
+            column = series.__new_column(series.size)
+            column[:] = np.asarray(values) if np is not None else array("d", values)
+            series.columns[name] = column
+        return series
+
+
+def summarize(values, percentiles=(1, 5, 50, 95, 99)):
+    values = sorted(float(value) for value in values if not math.isnan(value))
+    if not values:
+        return {}
+    summary = {
+        "min": values[0],
+        "max": values[-1],
+        "mean": sum(values) / len(values),
+    }
+    for percent in percentiles:
+        # linear interpolation as default method of numpy percentile
+        position = (len(values) - 1) * percent / 100.0
+        low = int(math.floor(position))
+        high = min(low + 1, len(values) - 1)
+        summary["p%g" % percent] = values[low] + (values[high] - values[low]) * (
+            position - low
+        )
+    return summary
+
+
+def stats_filename(name="pktgen"):
+    """
+    File name without extension for series of current case in output folder,
+    a sequence number is added for each measurement of the case.
+    """
+    if logger.log_dir is None:
+        log_path = os.getcwd() + "/" + FOLDERS["Output"]
+    else:
+        log_path = logger.log_dir
+    suite, case, phase = profiler.current
+    folder = os.path.join(log_path, "stats", suite or "dts")
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    prefix = "%s_%s" % (case or phase, name)
+    index = 1
+    while any(
+        os.path.exists(os.path.join(folder, "%s.%d%s" % (prefix, index, ext)))
+        for ext in (".npz", ".json")
+    ):
+        index += 1
+    return os.path.join(folder, "%s.%d" % (prefix, index))
+
+
+class StatsCollector(threading.Thread):
+
+    """
+    Call sampler at fixed interval until stopped, sampler returns dict of
+    counters. Lock is held while sampling, so that statistic retrieved by
+    other threads is not mixed with sampler.
+    """
+
+    def __init__(self, sampler, interval, lock):
+        super(StatsCollector, self).__init__()
+        self.daemon = True
+        self.sampler = sampler
+        self.interval = interval
+        self.lock = lock
+        self.series = StatsSeries()
+        self.error = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        next_time = time.time()
+        while not self._stopped.is_set():
+            try:
+                with self.lock:
+                    values = self.sampler()
+            except Exception as e:
+                self.error = e
+                break
+            if values:
+                self.series.append(time.time(), values)
+            next_time += self.interval
+            self._stopped.wait(max(next_time - time.time(), 0))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.series
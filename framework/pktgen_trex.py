@@ -19,6 +19,7 @@ from .pktgen_base import (
     TRANSMIT_S_BURST,
     PacketGenerator,
 )
+from .profiler import profiler
 
 
 class TrexConfigVm(object):
@@ -403,6 +404,22 @@ class TrexPacketGenerator(PacketGenerator):
     https://trex-tgn.cisco.com/trex/doc/trex_manual.html
     """
 
+    live_loss_stats = True
+    # max time to wait for packets in flight after traffic is stopped
+    RX_DRAIN_MS = 5000
+    RX_SETTLE_INTERVAL = 0.1
+    RX_SETTLED_MS = 10
+    SAMPLE_PORT_KEYS = [
+        "opackets",
+        "ipackets",
+        "obytes",
+        "ibytes",
+        "tx_pps",
+        "rx_pps",
+        "tx_bps",
+        "rx_bps",
+    ]
+
     def __init__(self, tester):
         super(TrexPacketGenerator, self).__init__(tester)
         self.pktgen_type = PKTGEN_TREX
@@ -414,6 +431,8 @@ class TrexPacketGenerator(PacketGenerator):
         self._ports = []
         self._traffic_ports = []
         self._rx_ports = []
+        # key of streams deployed in trex server
+        self._stream_session = None
 
         conf_inst = self._get_generator_conf_instance()
         self.conf = conf_inst.load_pktgen_config()
@@ -473,6 +492,10 @@ class TrexPacketGenerator(PacketGenerator):
                 )
         else:
             self.core_mask = None
+        # keep streams in trex server between measurements unless disabled
+        self.resident_streams = (
+            self.conf.get("resident_streams") or "yes"
+        ).lower() != "no"
 
     def _connect(self):
         self._conn = self.STLClient(server=self.conf["server"])
@@ -537,6 +560,10 @@ class TrexPacketGenerator(PacketGenerator):
 
     def _clear_streams(self):
         """clear streams in trex and `PacketGenerator`"""
+        # resident streams are kept, they are replaced when streams of next
+        # transmission are different.
+        if self.resident_streams and self._stream_session:
+            return
         # if streams has been attached, remove them from trex server.
         self._remove_all_streams()
 
@@ -550,6 +577,7 @@ class TrexPacketGenerator(PacketGenerator):
 
     def _disconnect(self):
         """disconnect with trex server"""
+        self._stream_session = None
         try:
             self._remove_all_streams()
             self._conn.disconnect()
@@ -794,6 +822,11 @@ class TrexPacketGenerator(PacketGenerator):
             msg = "no stream options for trex packet generator"
             raise Exception(msg)
 
+        session = self._get_stream_session(port_config, latency)
+        if self.resident_streams and session == self._stream_session:
+            self.logger.debug("streams are resident in trex server")
+            return
+        self._stream_session = None
         self._conn.connect()
         self._conn.reset(ports=self._ports)
         config_inst = TrexConfigStream()
@@ -804,6 +837,26 @@ class TrexPacketGenerator(PacketGenerator):
             )
         # preset port status before running traffic
         self._preset_trex_port()
+        self._stream_session = session
+
+    def _get_stream_session(self, port_config, latency):
+        """
+        Key of streams deployed in trex server. Rate is not part of it, as
+        it's set by multiplier when traffic is started.
+        """
+        session = []
+        for port_id in sorted(port_config.keys()):
+            for config in port_config[port_id]:
+                config = dict(config)
+                stream_config = dict(config.get("stream_config") or {})
+                stream_config.pop("rate", None)
+                config["stream_config"] = stream_config
+                pcap = config.get("pcap")
+                if pcap and os.path.exists(pcap):
+                    stat = os.stat(pcap)
+                    config["pcap_stat"] = (stat.st_size, stat.st_mtime)
+                session.append((port_id, config))
+        return pformat((session, latency, self._traffic_opt.get("flow_control")))
 
     def _start_transmission(self, stream_ids, options={}):
         test_mode = options.get("method")
@@ -819,7 +872,7 @@ class TrexPacketGenerator(PacketGenerator):
             while try_times < 5:
                 self.logger.info(pformat(port_attr))
                 if "link" in port_attr.keys() and port_attr["link"].lower() == "down":
-                    time.sleep(2)
+                    profiler.sleep(2)
                     try_times = try_times + 1
                     port_attr = self._conn.get_port_attr(port)
                 else:
@@ -851,9 +904,33 @@ class TrexPacketGenerator(PacketGenerator):
 
     def _stop_transmission(self, stream_id):
         if self._traffic_ports:
-            self._conn.stop(ports=self._traffic_ports, rx_delay_ms=5000)
+            rx_delay_ms = self.RX_DRAIN_MS
+            try:
+                # continuous traffic is paused to wait until rx counters
+                # settle, rx filters are kept until traffic is stopped
+                self._conn.pause(ports=self._traffic_ports)
+                self._wait_rx_settled()
+                rx_delay_ms = self.RX_SETTLED_MS
+            except Exception as e:
+                self.logger.debug("wait for fixed rx delay: %s" % e)
+            self._conn.stop(ports=self._traffic_ports, rx_delay_ms=rx_delay_ms)
             self.logger.info("traffic completed. ")
 
+    def _wait_rx_settled(self):
+        """
+        Wait until rx packets of all rx ports don't change in an interval,
+        at most max rx delay.
+        """
+        end = time.time() + self.RX_DRAIN_MS / 1000.0
+        last = None
+        while time.time() < end:
+            stats = self._conn.get_stats()
+            ipackets = [stats[port]["ipackets"] for port in self._rx_ports]
+            if ipackets == last:
+                return
+            last = ipackets
+            profiler.sleep(self.RX_SETTLE_INTERVAL)
+
     def _retrieve_port_statistic(self, stream_id, mode):
         """
         trex traffic statistics
@@ -871,11 +948,39 @@ class TrexPacketGenerator(PacketGenerator):
         else:
             return None
 
+    def _sample_statistic(self):
+        """
+        Counters and rates of traffic ports, flow and latency statistic of
+        streams with packet group id.
+        """
+        stats = self._conn.get_stats()
+        sample = {}
+        for port_id in set(self._traffic_ports + self._rx_ports):
+            port_stats = stats.get(port_id) or {}
+            for key in self.SAMPLE_PORT_KEYS:
+                if key in port_stats:
+                    sample["port%d.%s" % (port_id, key)] = port_stats[key]
+        for pg_id, flow_stats in (stats.get("flow_stats") or {}).items():
+            if not isinstance(flow_stats, dict):
+                continue
+            for key in ("tx_pkts", "rx_pkts"):
+                value = (flow_stats.get(key) or {}).get("total")
+                if value is not None:
+                    sample["pg%s.%s" % (pg_id, key)] = value
+        for pg_id, latency_stats in (stats.get("latency") or {}).items():
+            if not isinstance(latency_stats, dict):
+                continue
+            latency = latency_stats.get("latency") or {}
+            for key in ("average", "total_max"):
+                if key in latency:
+                    sample["pg%s.latency_%s" % (pg_id, key)] = latency[key]
+        return sample
+
     def quit_generator(self):
         if self._conn is not None:
             self._disconnect()
         if self.control_session is not None:
             self.tester.alt_session.send_expect("pkill -f _t-rex-64", "# ")
-            time.sleep(5)
+            profiler.sleep(5)
             self.tester.destroy_session(self.control_session)
             self.control_session = None
@@ -4,8 +4,8 @@
 
 import os
 import re
-from time import sleep
 
+from .profiler import profiler
 from .settings import PROTOCOL_PACKET_SIZE, TIMEOUT, get_nic_driver
 from .utils import create_mask
 
@@ -147,7 +147,7 @@ class PmdOutput:
         out = self.session.send_expect(command, expected, timeout)
         self.command = command
         # wait 10s to ensure links getting up before test start.
-        sleep(10)
+        profiler.sleep(10)
         return out
 
     def execute_cmd(
@@ -300,7 +300,7 @@ class PmdOutput:
             status = self.get_all_value_from_string("Link status: ", "\S+", out)
             if "down" not in status:
                 break
-            sleep(1)
+            profiler.sleep(1)
         return "down" not in status
 
     def get_max_rule_number(self, obj, out):
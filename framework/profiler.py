@@ -0,0 +1,243 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Profiler records where wall clock time of execution goes. Time is attributed
+to the running scope of current thread, which is suite, case and phase(init,
+set_up_all, set_up, case, tear_down or tear_down_all). Threads other than main
+thread are in "background" phase unless they enter a scope. In each scope it
+counts ssh round trips, bytes and time blocked in them, time in profiler.sleep
+and time.sleep of test suites, traffic time of packet generator and build time.
+Traffic and build time include the ssh and sleep time spent by them.
+"""
+
+import heapq
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# sleep of time module before it is patched
+_sleep = time.sleep
+
+COUNTERS = ["wall", "ssh_calls", "ssh_time", "ssh_bytes", "sleep", "traffic", "build"]
+
+
+class Profiler(object):
+
+    """
+    Collect counters of each scope and the slowest commands.
+    """
+
+    # number of slowest commands in report
+    TOP_COMMANDS = 20
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scopes = {}
+        self.commands = []
+        self.sequence = 0
+        self.local = threading.local()
+        self.depth = {}
+
+    def reset(self):
+        with self.lock:
+            self.scopes = {}
+            self.commands = []
+            self.local.__dict__.clear()
+
+    def __local(self):
+        # scope of each thread is entered and left by itself
+        if not hasattr(self.local, "current"):
+            if threading.current_thread() is threading.main_thread():
+                self.local.current = ("", "", "init")
+            else:
+                self.local.current = ("", "", "background")
+            self.local.started = time.time()
+        return self.local
+
+    @property
+    def current(self):
+        return self.__local().current
+
+    def __counters(self, scope):
+        if scope not in self.scopes:
+            self.scopes[scope] = dict.fromkeys(COUNTERS, 0)
+        return self.scopes[scope]
+
+    def __close_scope(self):
+        # wall time of scope is accumulated when it is left
+        local = self.__local()
+        now = time.time()
+        self.__counters(local.current)["wall"] += now - local.started
+        local.started = now
+
+    @contextmanager
+    def scope(self, suite, case, phase):
+        """
+        Attribute time spent in context to suite, case and phase.
+        """
+        with self.lock:
+            self.__close_scope()
+            previous = self.current
+            self.local.current = (suite, case, phase)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.__close_scope()
+                self.local.current = previous
+
+    def add(self, counter, elapsed):
+        with self.lock:
+            self.__counters(self.current)[counter] += elapsed
+
+    def add_command(self, session, command, elapsed, size):
+        """
+        Record one ssh round trip.
+        """
+        with self.lock:
+            counters = self.__counters(self.current)
+            counters["ssh_calls"] += 1
+            counters["ssh_time"] += elapsed
+            counters["ssh_bytes"] += size
+
+            suite, case, phase = self.current
+            record = {
+                "session": session,
+                "command": command,
+                "elapsed": round(elapsed, 3),
+                "suite": suite,
+                "case": case,
+                "phase": phase,
+            }
+            self.sequence += 1
+            entry = (elapsed, self.sequence, record)
+            if len(self.commands) < self.TOP_COMMANDS:
+                heapq.heappush(self.commands, entry)
+            elif elapsed > self.commands[0][0]:
+                heapq.heapreplace(self.commands, entry)
+
+    def timed(self, counter):
+        """
+        Decorator to add time spent in function into counter, nested calls
+        are only counted once.
+        """
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                thread = threading.current_thread().ident
+                key = (thread, counter)
+                self.depth[key] = self.depth.get(key, 0) + 1
+                start = time.time()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.depth[key] -= 1
+                    if self.depth[key] == 0:
+                        del self.depth[key]
+                        self.add(counter, time.time() - start)
+
+            return wrapper
+
+        return decorator
+
+    def sleep(self, secs):
+        """
+        Sleep and count it in current scope, used instead of time.sleep.
+        """
+        start = time.time()
+        try:
+            _sleep(secs)
+        finally:
+            self.add("sleep", time.time() - start)
+
+    def __suite_sleep(self, secs):
+        # only modules of test suites are counted, sleeps of framework and
+        # libraries like pexpect are part of the time they are waiting for
+        if sys._getframe(1).f_globals.get("__name__", "").startswith("tests."):
+            self.sleep(secs)
+        else:
+            _sleep(secs)
+
+    def patch_sleep(self):
+        """
+        Replace time.sleep, so that time.sleep called by test suites is
+        counted as profiler.sleep.
+        """
+        time.sleep = self.__suite_sleep
+
+    def slowest_commands(self):
+        return [entry[2] for entry in sorted(self.commands, reverse=True)]
+
+    def summary(self):
+        """
+        Return counters of each scope and counters summed by suite.
+        """
+        with self.lock:
+            self.__close_scope()
+            scopes = []
+            suites = {}
+            for (suite, case, phase), counters in sorted(self.scopes.items()):
+                record = {"suite": suite, "case": case, "phase": phase}
+                record.update(counters)
+                scopes.append(record)
+                total = suites.setdefault(suite, dict.fromkeys(COUNTERS, 0))
+                for counter in COUNTERS:
+                    total[counter] += counters[counter]
+        return scopes, suites
+
+    def save(self, filename):
+        """
+        Save profile as json file and a text report beside it.
+        """
+        scopes, suites = self.summary()
+        commands = self.slowest_commands()
+        with open(filename, "w") as outfile:
+            json.dump(
+                {"scopes": scopes, "suites": suites, "slowest_commands": commands},
+                outfile,
+                indent=4,
+                separators=(",", ": "),
+                sort_keys=True,
+            )
+
+        header = "%-40s" % "suite" + "".join("%12s" % c for c in COUNTERS)
+        lines = ["Time breakdown by suite", header]
+        for suite, counters in sorted(suites.items()):
+            lines.append(
+                "%-40s" % (suite or "(init)")
+                + "".join(
+                    "%12d" % counters[c]
+                    if c.endswith(("calls", "bytes"))
+                    else "%12.1f" % counters[c]
+                    for c in COUNTERS
+                )
+            )
+        lines += ["", "Top %d slowest commands" % self.TOP_COMMANDS]
+        for record in commands:
+            lines.append(
+                "%10.3f  %-30s %-20s %s"
+                % (
+                    record["elapsed"],
+                    "/".join(
+                        item
+                        for item in (record["suite"], record["case"], record["phase"])
+                        if item
+                    ),
+                    record["session"],
+                    record["command"].replace("\n", "; ")[:200],
+                )
+            )
+        with open(filename.rsplit(".", 1)[0] + ".txt", "w") as outfile:
+            outfile.write("\n".join(lines) + "\n")
+
+
+"""
+Global profiler of this process
+"""
+profiler = Profiler()
@@ -2,12 +2,14 @@
 # Copyright(c) 2010-2014 Intel Corporation
 #
 
+import hashlib
 import os
 import re
 
 from .crb import Crb
 from .dut import Dut
 from .logger import getLogger
+from .profiler import profiler
 from .settings import (
     CONFIG_ROOT_PATH,
     DPDK_RXMODE_SETTING,
@@ -33,9 +35,17 @@ class DPDKdut(Dut):
     build, memory and kernel module.
     """
 
+    # folder of cached build directories, relative to dpdk source folder
+    BUILD_CACHE_DIR = ".dts_build"
+    # number of cached build directories kept for each target
+    BUILD_CACHE_SIZE = 2
+
     def __init__(self, crb, serializer, dut_id=0, name=None, alt_session=True):
         super(DPDKdut, self).__init__(crb, serializer, dut_id, name, alt_session)
         self.testpmd = None
+        self.build_dir = None
+        # examples configured in each build directory
+        self.build_examples = {}
 
     def set_target(self, target, bind_dev=True):
         """
@@ -217,6 +227,7 @@ class DPDKdut(Dut):
             self.send_expect("sed -i '/%s/d' %s" % (key, config_file), "# ")
             self.send_expect("sed -i '$a\%s' %s" % (def_str, config_file), "# ")
 
+    @profiler.timed("build")
     def build_install_dpdk(self, target, extra_options=""):
         """
         Build DPDK source code with specified target.
@@ -262,15 +273,37 @@ class DPDKdut(Dut):
             self.send_expect("export CFLAGS=-m32", "# ")
             self.send_expect("export PKG_CONFIG_LIBDIR=%s" % pkg_path, "# ")
 
-        self.send_expect("rm -rf " + target, "#")
-        out = self.send_expect(
-            "CC=%s meson -Denable_kmods=True -Dlibdir=lib %s --default-library=%s %s"
-            % (toolchain, extra_options, default_library, target),
-            "[~|~\]]# ",
-            build_time,
+        # build directory is reused when package and meson options not changed,
+        # target is only a link to it
+        build_key = self.get_build_key(target, extra_options, default_library)
+        build_dir = "%s/%s-%s" % (self.BUILD_CACHE_DIR, target, build_key)
+        out = self.send_expect("ls %s/build.ninja" % build_dir, "# ", verify=True)
+        if isinstance(out, int):
+            self.send_expect("rm -rf %s" % build_dir, "#", 60)
+            self.send_expect("mkdir -p %s" % self.BUILD_CACHE_DIR, "#")
+            out = self.send_expect(
+                "CC=%s meson -Denable_kmods=True -Dlibdir=lib %s --default-library=%s %s"
+                % (toolchain, extra_options, default_library, build_dir),
+                "[~|~\]]# ",
+                build_time,
+            )
+            assert "FAILED" not in out, "meson setup failed ..."
+            self.build_examples[build_dir] = set()
+        else:
+            self.logger.info("Reuse build directory %s" % build_dir)
+        self.build_dir = build_dir
+
+        self.send_expect("rm -rf %s" % target, "#", 60)
+        self.send_expect("ln -s %s %s" % (build_dir, target), "#")
+        self.send_expect("touch %s" % build_dir, "#")
+        self.send_expect(
+            "ls -dt %s/%s-* | tail -n +%d | xargs rm -rf"
+            % (self.BUILD_CACHE_DIR, target, self.BUILD_CACHE_SIZE + 1),
+            "#",
+            60,
         )
-        assert "FAILED" not in out, "meson setup failed ..."
 
+        # ninja only rebuilds objects depend on changed sources and headers
         out = self.send_expect("ninja -C %s" % target, "[~|~\]]# ", build_time)
         assert "FAILED" not in out, "ninja complie failed ..."
 
@@ -284,6 +317,23 @@ class DPDKdut(Dut):
             for mod in kmod:
                 self.send_expect("cp %s %s/kmod/" % (mod, target), "# ")
 
+    def get_build_key(self, target, extra_options, default_library):
+        """
+        Get key of build directory from package, patches, target and meson
+        options. Options set by set_build_options are saved in source folder,
+        changes of them are handled by incremental ninja build.
+        """
+        key = "|".join(
+            [
+                os.path.basename(getattr(self, "package", "") or ""),
+                ",".join(getattr(self, "patches", None) or []),
+                target,
+                default_library,
+                " ".join(extra_options.split()),
+            ]
+        )
+        return hashlib.md5(key.encode("utf-8")).hexdigest()[:8]
+
     def build_install_dpdk_freebsd_meson(self, target, extra_options):
         # meson build same as linux
         self.build_install_dpdk_linux_meson(target, extra_options)
@@ -388,6 +438,13 @@ class DPDKdut(Dut):
         Copy DPDK package to DUT and apply patch files.
         """
         self.prepare_package()
+        self.setup_prerequisites()
+
+    def setup_prerequisites(self):
+        """
+        Setup DUT after package prepared, port topology of DUT depends on
+        tester ports.
+        """
         self.dut_prerequisites()
         self.stage = "post-init"
 
@@ -433,6 +490,7 @@ class DPDKdut(Dut):
         bind_script_path = self.get_dpdk_bind_script()
         self.send_expect("%s --force %s" % (bind_script_path, binding_list), "# ")
 
+    @profiler.timed("build")
     def build_dpdk_apps(self, folder, extra_options=""):
         """
         Build dpdk sample applications.
@@ -485,10 +543,19 @@ class DPDKdut(Dut):
             example = "all"
         else:
             example = "/".join(folder_info[folder_info.index("examples") + 1 :])
-        out = self.send_expect(
-            "meson configure -Dexamples=%s %s" % (example, self.target), "# "
-        )
-        assert "FAILED" not in out, "Compilation error..."
+        # keep examples configured before, so that build directory will not
+        # be reconfigured and rebuilt when suites switch between examples
+        examples = self.build_examples.setdefault(self.build_dir, set())
+        if "all" not in examples and example not in examples:
+            if example == "all":
+                examples.clear()
+            examples.add(example)
+            out = self.send_expect(
+                "meson configure -Dexamples=%s %s"
+                % (",".join(sorted(examples)), self.target),
+                "# ",
+            )
+            assert "FAILED" not in out, "Compilation error..."
         out = self.send_expect("ninja -C %s" % self.target, "[~|~\]]# ", timeout)
         assert "FAILED" not in out, "Compilation error..."
 
@@ -7,6 +7,7 @@ import re
 import time
 
 from .exception import StartVMFailedException
+from .profiler import profiler
 from .settings import DTS_PARALLEL_SETTING, get_host_ip, load_global_setting
 from .utils import RED, parallel_lock
 from .virt_base import ST_NOTSTART, ST_PAUSE, ST_RUNNING, ST_UNKNOWN, VirtBase
@@ -1381,7 +1382,7 @@ class QEMUKvm(VirtBase):
         self.update_status()
 
         # sleep few seconds for bios/grub
-        time.sleep(10)
+        profiler.sleep(10)
 
         # when vm is waiting for migration, can't ping
         if self.vm_status is not ST_PAUSE:
@@ -1402,7 +1403,7 @@ class QEMUKvm(VirtBase):
         self.start_time = time.time()
 
         # wait for qemu process ready
-        time.sleep(2)
+        profiler.sleep(2)
         if type(ret) is int and ret != 0:
             raise StartVMFailedException("Start VM failed!!!")
 
@@ -1419,7 +1420,7 @@ class QEMUKvm(VirtBase):
         self.update_status()
 
         # sleep few seconds for bios and grub
-        time.sleep(10)
+        profiler.sleep(10)
 
     def __ping_vm(self):
         logged_in = False
@@ -1439,7 +1440,7 @@ class QEMUKvm(VirtBase):
                 "Can't login [%s] on [%s], retry %d times!!!"
                 % (self.vm_name, self.host_dut.crb["My IP"], try_times + 1)
             )
-            time.sleep(self.OPERATION_TIMEOUT)
+            profiler.sleep(self.OPERATION_TIMEOUT)
             try_times += 1
             continue
 
@@ -1468,7 +1469,7 @@ class QEMUKvm(VirtBase):
         migration_port = "tcp:%(IP)s:%(PORT)s" % {"IP": remote_ip, "PORT": remote_port}
 
         self.__monitor_session("migrate", "-d", migration_port)
-        time.sleep(2)
+        profiler.sleep(2)
         out = self.__monitor_session("info", "migrate")
         if "Migration status: active" in out:
             return True
@@ -1490,7 +1491,7 @@ class QEMUKvm(VirtBase):
                 self.vm_status = ST_PAUSE
                 return True
 
-            time.sleep(6)
+            profiler.sleep(6)
             count -= 1
 
         raise StartVMFailedException(
@@ -1569,7 +1570,7 @@ class QEMUKvm(VirtBase):
                 "[%s] on [%s] network not ready, retry %d times!!!"
                 % (self.vm_name, self.host_dut.crb["My IP"], try_times + 1)
             )
-            time.sleep(self.OPERATION_TIMEOUT)
+            profiler.sleep(self.OPERATION_TIMEOUT)
             try_times += 1
             continue
 
@@ -1704,7 +1705,7 @@ class QEMUKvm(VirtBase):
         """
         out = self.control_command("ping")
         if not out:
-            time.sleep(10)
+            profiler.sleep(10)
             out = self.control_command("ifconfig")
             ips = re.findall(r"inet (\d+\.\d+\.\d+\.\d+)", out)
 
@@ -1929,7 +1930,7 @@ class QEMUKvm(VirtBase):
         elif command == "network":
             if self.control_type == "qga":
                 # wait few seconds for network ready
-                time.sleep(5)
+                profiler.sleep(5)
                 out = self.control_session.send_expect(
                     self.qga_cmd_head + "ifconfig", "#", timeout=self.OPERATION_TIMEOUT
                 )
@@ -1978,7 +1979,7 @@ class QEMUKvm(VirtBase):
                 self.control_session.send_command("^]")
                 self.control_session.send_command("quit")
 
-            time.sleep(10)
+            profiler.sleep(10)
             self.kill_alive()
             return "Success"
         else:
@@ -1997,7 +1998,7 @@ class QEMUKvm(VirtBase):
             self.control_command("powerdown")
         else:
             self.__monitor_session("quit")
-        time.sleep(5)
+        profiler.sleep(5)
         # remove temporary file
         self.host_session.send_expect("rm -f %s" % self.__pid_file, "#")
 
@@ -4,7 +4,6 @@
 
 import os
 import re
-import time
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 from xml.etree.ElementTree import ElementTree
@@ -15,6 +14,7 @@ from .config import VIRTCONF, VirtConf
 from .dut import Dut
 from .exception import StartVMFailedException
 from .logger import getLogger
+from .profiler import profiler
 from .ssh_connection import SSHConnection
 from .virt_base import VirtBase
 from .virt_resource import VirtResource
@@ -820,7 +820,7 @@ class LibvirtKvm(VirtBase):
         with open(xml_file, "w") as fp:
             fp.write(vm_content)
         self.host_session.copy_file_to(xml_file)
-        time.sleep(2)
+        profiler.sleep(2)
 
         self.host_session.send_expect("virsh", "virsh #")
         self.host_session.send_expect("create /root/%s.xml" % self.vm_name, "virsh #")
@@ -845,7 +845,7 @@ class LibvirtKvm(VirtBase):
                 ssh_key = "[" + self.vm_ip[:pos] + "]" + self.vm_ip[pos:]
                 os.system("ssh-keygen -R %s" % ssh_key)
                 return True
-            time.sleep(6)
+            profiler.sleep(6)
             count -= 1
 
         raise StartVMFailedException(
@@ -854,4 +854,4 @@ class LibvirtKvm(VirtBase):
 
     def stop(self):
         self.__control_session("shutdown")
-        time.sleep(5)
+        profiler.sleep(5)
@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Schedule test suites among execution workers running in parallel. Each
+execution section is one worker, sections with the same shard group share
+their suites, every suite is run once by the first worker which has the
+resources declared by the suite.
+
+Suite resources are declared in [suite] section of suite configuration
+file, e.g. conf/l3fwd.cfg:
+    [suite]
+    required_nics = ["ICE_100G-E810C_QSFP", "ICE_25G-E810C_SFP"]
+    required_ports = 2
+"""
+
+from .config import SuiteConf
+
+
+def suite_resources(suite_name):
+    """
+    Load resources required by suite, return tuple of nic names (empty for
+    any nic) and minimal number of ports.
+    """
+    suite_cfg = SuiteConf(suite_name.split(":")[0]).suite_cfg
+    nics = suite_cfg.get("required_nics", [])
+    if isinstance(nics, str):
+        nics = [nic.strip() for nic in nics.split(",") if nic.strip()]
+    ports = int(suite_cfg.get("required_ports", 0))
+    return list(nics), ports
+
+
+def resources_satisfied(suite_name, resources):
+    """
+    Check whether resources of one worker satisfy the suite.
+    """
+    nics, ports = suite_resources(suite_name)
+    if nics and resources["nic"] not in nics:
+        return False
+    return resources["ports"] >= ports
+
+
+class SuitePool(object):
+
+    """
+    Suites shared by workers of one shard group, pending list and lock are
+    created by multiprocessing manager so that worker processes can take
+    suites from it.
+    """
+
+    def __init__(self, manager, name):
+        self.name = name
+        self.pending = manager.list()
+        self.lock = manager.Lock()
+
+    def add(self, target, suite_name):
+        if (target, suite_name) not in self.pending:
+            self.pending.append((target, suite_name))
+
+    def take(self, target, resources):
+        """
+        Take the first pending suite of target which can run with resources.
+        """
+        with self.lock:
+            for index, (pending_target, suite_name) in enumerate(self.pending):
+                if pending_target != target:
+                    continue
+                if resources_satisfied(suite_name, resources):
+                    del self.pending[index]
+                    return suite_name
+        return None
+
+    def suites(self, target, resources):
+        """
+        Iterate suites of target until no suite left for resources.
+        """
+        while True:
+            suite_name = self.take(target, resources)
+            if suite_name is None:
+                return
+            yield suite_name
+
+    def left(self):
+        return list(self.pending)
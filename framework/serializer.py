@@ -7,6 +7,7 @@ Wrapper class for serializer module
 """
 import os
 import pickle
+import time
 
 
 class Singleton(type):
@@ -26,23 +27,37 @@ class Serializer(object):
     into a file.
     This class implements the Singleton pattern. Everytime its constructor
     is called it will return a reference to the same instance.
+    Non-volatile cache is bound to fingerprint of hosts, it will be discarded
+    when fingerprint changed. Each object can be saved with time to live.
     """
 
+    # version of cache file format
+    CACHE_VERSION = 1
+
     def __init__(self):
         self.volatile_cache = {}
+        self.expire_time = {}
+        self.fingerprint = None
         self.filename = "serializer.cache"
 
-    def save(self, object_name, object_to_save):
+    def save(self, object_name, object_to_save, ttl=None):
         """
         Saves an object into the volatile dictionary cache - which
-        resides in memory.
+        resides in memory. Object expires after ttl seconds when specified.
         """
         self.volatile_cache[object_name] = object_to_save
+        if ttl is None:
+            self.expire_time.pop(object_name, None)
+        else:
+            self.expire_time[object_name] = time.time() + ttl
 
     def load(self, object_name):
         """
         Loads and returns an object from the volatile cache.
         """
+        if self.expire_time.get(object_name, float("inf")) < time.time():
+            self.volatile_cache.pop(object_name, None)
+            self.expire_time.pop(object_name, None)
         return self.volatile_cache.get(object_name, None)
 
     def set_serialized_filename(self, filename):
@@ -51,32 +66,58 @@ class Serializer(object):
         """
         self.filename = filename
 
+    def set_fingerprint(self, fingerprint):
+        """
+        Sets fingerprint of hosts, cache file saved with other fingerprint
+        will not be loaded.
+        """
+        self.fingerprint = fingerprint
+
     def save_to_file(self):
         """
         Saves the volatile cache to a file (non-volatile) using the pickle
         module. Returns True in case everything went OK, False otherwise.
+        File is replaced atomically, so interrupted saving will not leave
+        broken cache file.
         """
+        content = {
+            "version": self.CACHE_VERSION,
+            "fingerprint": self.fingerprint,
+            "cache": self.volatile_cache,
+            "expire": self.expire_time,
+        }
+        temp_file = "%s.%d.tmp" % (self.filename, os.getpid())
         try:
-            serialized_file = open(self.filename, "w")
-            pickle.dump(self.volatile_cache, serialized_file)
-            serialized_file.close()
+            with open(temp_file, "wb") as serialized_file:
+                pickle.dump(content, serialized_file)
+                serialized_file.flush()
+                os.fsync(serialized_file.fileno())
+            os.replace(temp_file, self.filename)
             return True
         except:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
             return False
 
     def load_from_file(self):
         """
         Reads from a pickle-like file using pickle module and populates the
         volatile cache. Returns True in case everything went OK, False
-        otherwise.
+        otherwise, including the file saved with different fingerprint.
         """
         try:
-            serialized_file = open(self.filename, "r")
-            self.volatile_cache = pickle.load(serialized_file)
-            serialized_file.close()
+            with open(self.filename, "rb") as serialized_file:
+                content = pickle.load(serialized_file)
+            if content["version"] != self.CACHE_VERSION:
+                raise ValueError("cache version mismatched")
+            if content["fingerprint"] != self.fingerprint:
+                raise ValueError("cache fingerprint mismatched")
+            self.volatile_cache = content["cache"]
+            self.expire_time = content["expire"]
             return True
         except:
             self.volatile_cache.clear()
+            self.expire_time.clear()
             return False
 
     def discard_cache(self):
@@ -84,5 +125,6 @@ class Serializer(object):
         Discards both volatile and non-volatile cache.
         """
         self.volatile_cache.clear()
+        self.expire_time.clear()
         if os.path.exists(self.filename):
             os.remove(self.filename)
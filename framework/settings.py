@@ -201,6 +201,20 @@ Default session timeout.
 """
 TIMEOUT = 15
 
+"""
+Ssh session backends, pexpect login for each session or multiplex sessions
+over one login of the host.
+"""
+SSH_BACKEND_PEXPECT = "pexpect"
+SSH_BACKEND_MULTIPLEX = "multiplex"
+SSH_BACKEND_GRP = frozenset([SSH_BACKEND_PEXPECT, SSH_BACKEND_MULTIPLEX])
+
+"""
+Default bytes of session output kept in memory, can be changed by global
+setting DTS_OUTPUT_CAP. Full output is saved in session transcript file.
+"""
+OUTPUT_CAP = 64 * 1024 * 1024
+
 
 """
 Global macro for dts.
@@ -210,7 +224,10 @@ PKTGEN_DPDK = "dpdk"
 PKTGEN_TREX = "trex"
 PKTGEN_IXIA = "ixia"
 PKTGEN_IXIA_NETWORK = "ixia_network"
-PKTGEN_GRP = frozenset([PKTGEN_DPDK, PKTGEN_TREX, PKTGEN_IXIA, PKTGEN_IXIA_NETWORK])
+PKTGEN_SOFTWARE = "software"
+PKTGEN_GRP = frozenset(
+    [PKTGEN_DPDK, PKTGEN_TREX, PKTGEN_IXIA, PKTGEN_IXIA_NETWORK, PKTGEN_SOFTWARE]
+)
 """
 The log name seperater.
 """
@@ -240,6 +257,7 @@ DTS_ERROR_ENV = "DTS_RUNNING_ERROR"
 DTS_CFG_FOLDER = "DTS_CFG_FOLDER"
 DTS_PARALLEL_SETTING = "DTS_PARALLEL_ENABLE"
 UPDATE_EXPECTED = "DTS_UPDATE_EXPECTED_ENABLE"
+OUTPUT_CAP_SETTING = "DTS_OUTPUT_CAP"
 
 
 """
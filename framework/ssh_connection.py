@@ -2,7 +2,11 @@
 # Copyright(c) 2010-2014 Intel Corporation
 #
 
-from .settings import TIMEOUT, USERNAME
+import time
+
+from .profiler import profiler
+from .settings import SSH_BACKEND_MULTIPLEX, SSH_BACKEND_PEXPECT, TIMEOUT, USERNAME
+from .ssh_multiplex import SSHMultiplex
 from .ssh_pexpect import SSHPexpect
 
 """
@@ -10,16 +14,34 @@ Global structure for saving connections
 """
 CONNECTIONS = []
 
+"""
+Supported ssh session backends
+"""
+SSH_BACKENDS = {
+    SSH_BACKEND_PEXPECT: SSHPexpect,
+    SSH_BACKEND_MULTIPLEX: SSHMultiplex,
+}
+
 
 class SSHConnection(object):
 
     """
     Module for create session to host.
     Implement send_expect/copy function upper SSHPexpect module.
+    Session backend can be pexpect(one login per session) or
+    multiplex(sessions share one login of the host).
     """
 
-    def __init__(self, host, session_name, username, password="", dut_id=0):
-        self.session = SSHPexpect(host, username, password, dut_id)
+    def __init__(
+        self,
+        host,
+        session_name,
+        username,
+        password="",
+        dut_id=0,
+        backend=SSH_BACKEND_PEXPECT,
+    ):
+        self.session = SSH_BACKENDS[backend](host, username, password, dut_id)
         self.name = session_name
         connection = {}
         connection[self.name] = self.session
@@ -33,21 +55,120 @@ class SSHConnection(object):
     def set_history(self, history):
         self.history = history
 
+    def add_history(self, cmds, offset, out, length=None):
+        """
+        Save command into history. Output is saved as its offset and length
+        in session transcript file, read it by transcript.read_transcript.
+        Length defaults to all output received since offset.
+        """
+        if type(self.history) is not list:
+            return
+        transcript = self.session.transcript
+        if transcript is None:
+            self.history.append({"command": cmds, "name": self.name, "output": out})
+        else:
+            if length is None:
+                length = transcript.offset - offset
+            self.history.append(
+                {
+                    "command": cmds,
+                    "name": self.name,
+                    "transcript": transcript.path,
+                    "offset": offset,
+                    "length": length,
+                }
+            )
+
+    def add_profile(self, cmds, start, out):
+        size = len(cmds)
+        if isinstance(out, str):
+            size += len(out)
+        profiler.add_command(self.name, cmds, time.time() - start, size)
+
+    def get_transcript_offset(self):
+        if self.session.transcript is None:
+            return 0
+        return self.session.transcript.offset
+
     def send_expect(self, cmds, expected, timeout=15, verify=False):
         self.logger.info(cmds)
+        offset = self.get_transcript_offset()
+        start = time.time()
         out = self.session.send_expect(cmds, expected, timeout, verify)
+        self.add_profile(cmds, start, out)
         if isinstance(out, str):
             self.logger.debug(out.replace(cmds, ""))
-        if type(self.history) is list:
-            self.history.append({"command": cmds, "name": self.name, "output": out})
+        self.add_history(cmds, offset, out)
         return out
 
-    def send_command(self, cmds, timeout=1):
+    def run(self, cmds, timeout=15):
+        """
+        Run command without prompt matching, return tuple of exit code,
+        output, error output and elapsed seconds.
+        """
+        self.logger.info(cmds)
+        offset = self.get_transcript_offset()
+        start = time.time()
+        rc, out, err, elapsed = self.session.run(cmds, timeout)
+        self.add_profile(cmds, start, out + err)
+        self.logger.debug(out)
+        if err:
+            self.logger.debug(err)
+        self.add_history(cmds, offset, out)
+        return rc, out, err, elapsed
+
+    def run_batch(self, cmds, timeout=15):
+        """
+        Run command list in one round trip, return list of exit code and
+        output for each command.
+        """
+        self.logger.info("\n".join(cmds))
+        offset = self.get_transcript_offset()
+        start = time.time()
+        results = self.session.run_batch(cmds, timeout)
+        self.add_profile("\n".join(cmds), start, "".join(out for rc, out in results))
+        spans = self.locate_outputs(offset, [out for rc, out in results])
+        for cmd, (rc, out), (out_offset, length) in zip(cmds, results, spans):
+            self.logger.debug(out)
+            self.add_history(cmd, out_offset, out, length)
+        return results
+
+    def locate_outputs(self, offset, outputs):
+        """
+        Find offset and length of each output in transcript received since
+        offset, outputs are searched in order. Whole received span is used
+        for output which can't be found.
+        """
+        transcript = self.session.transcript
+        if type(self.history) is not list or transcript is None:
+            return [(offset, None)] * len(outputs)
+        transcript.flush()
+        with open(transcript.path, "rb") as f:
+            f.seek(offset)
+            received = f.read(transcript.offset - offset)
+        spans = []
+        cursor = 0
+        for out in outputs:
+            span = (offset, len(received))
+            # interactive shell sends line end as \r\n
+            for data in (out, out.replace("\n", "\r\n")):
+                data = data.encode("utf-8", "replace")
+                position = received.find(data, cursor)
+                if position >= 0:
+                    cursor = position + len(data)
+                    span = (offset + position, len(data))
+                    break
+            spans.append(span)
+        return spans
+
+    def send_command(self, cmds, timeout=1, idle=None):
         self.logger.info(cmds)
-        out = self.session.send_command(cmds, timeout)
+        offset = self.get_transcript_offset()
+        start = time.time()
+        out = self.session.send_command(cmds, timeout, idle)
+        self.add_profile(cmds, start, out)
         self.logger.debug(out.replace(cmds, ""))
-        if type(self.history) is list:
-            self.history.append({"command": cmds, "name": self.name, "output": out})
+        self.add_history(cmds, offset, out)
         return out
 
     def get_session_before(self, timeout=15):
@@ -55,8 +176,16 @@ class SSHConnection(object):
         self.logger.debug(out)
         return out
 
+    def get_stats(self):
+        return self.session.get_stats()
+
     def close(self, force=False):
         if getattr(self, "logger", None):
+            stats = self.session.get_stats()
+            self.logger.debug(
+                "session %s waited %.3fs, transferred %d bytes in %.3fs"
+                % (self.name, stats["wait"], stats["bytes"], stats["transfer"])
+            )
             self.logger.logger_exit()
 
         self.session.close(force)
@@ -72,12 +201,14 @@ class SSHConnection(object):
 
     def check_available(self):
         MAGIC_STR = "DTS_CHECK_SESSION"
-        out = self.session.send_command("echo %s" % MAGIC_STR, timeout=0.1)
+        # send_command returns once shell prompt back, timeout only matters
+        # when session is occupied
+        out = self.session.send_command("echo %s" % MAGIC_STR, timeout=1)
         # if not available, try to send ^C and check again
         if MAGIC_STR not in out:
             self.logger.info("Try to recover session...")
             self.session.send_command("^C", timeout=TIMEOUT)
-            out = self.session.send_command("echo %s" % MAGIC_STR, timeout=0.1)
+            out = self.session.send_command("echo %s" % MAGIC_STR, timeout=1)
             if MAGIC_STR not in out:
                 return False
 
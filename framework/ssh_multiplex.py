@@ -0,0 +1,274 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Module handle multiplexed ssh sessions between tester and DUT.
+Only one authenticated OpenSSH control master is created for each remote
+host, every session is opened as a light-weight channel over this master.
+It keeps the same send_expect/send_command/copy_file_* interfaces as
+SSHPexpect module.
+"""
+
+import atexit
+import hashlib
+import os
+import subprocess
+import threading
+import time
+
+import pexpect
+from pexpect import pxssh
+
+from .exception import SSHConnectionException, TimeoutException
+from .ssh_pexpect import SSHPexpect
+from .utils import GREEN, RED, parallel_lock
+
+
+class SSHMultiplex(SSHPexpect):
+
+    """
+    Sshd limits the channels of one connection by MaxSessions option, default
+    value is 10. When all masters of one host are fully used, another master
+    connection will be created. Number of sessions for each master can be
+    modified along with MaxSessions value.
+    """
+
+    SESSIONS_PER_MASTER = 8
+    # exec channel is not limited by tty line length
+    BATCH_SCRIPT_SIZE = 65536
+    CONTROL_DIR = "/tmp"
+
+    # {(username, ip, port): [{"path": control path, "users": session count}]}
+    _masters = {}
+    _masters_lock = threading.Lock()
+    _host_locks = {}
+    # index of next master for each host, never reused in one DTS process
+    _master_index = {}
+    _exit_registered = False
+
+    def _connect_host(self, dut_id=0):
+        """
+        Open channel on the shared master connection of assigned crb, master
+        connection will be created if not existed.
+        """
+        if ":" in self.host:
+            self.ip = self.host.split(":")[0]
+            self.port = int(self.host.split(":")[1])
+        else:
+            self.ip = self.host
+            self.port = None
+
+        self.control_path = None
+        try:
+            self.control_path = self._acquire_master(dut_id)
+            self.session = pxssh.pxssh(
+                encoding="utf-8",
+                options={"ControlMaster": "no", "ControlPath": self.control_path},
+            )
+            self.session.login(
+                self.ip,
+                self.username,
+                self.password,
+                original_prompt="[$#>]",
+                port=self.port,
+                login_timeout=20,
+                password_regex=r"(?i)(?:password:)|(?:passphrase for key)|(?i)(password for .+:)",
+            )
+            self.send_expect("stty -echo", "#")
+            self.send_expect("stty columns 1000", "#")
+        except Exception as e:
+            print(RED(e))
+            if self.port:
+                suggestion = (
+                    "\nSuggession: Check if the firewall on [ %s ] " % self.ip
+                    + "is stopped\n"
+                )
+                print(GREEN(suggestion))
+            self._release_master()
+            raise SSHConnectionException(self.host)
+
+    def _master_key(self):
+        return (self.username, self.ip, self.port)
+
+    def _acquire_master(self, dut_id=0):
+        """
+        Return control path of one master which still has free channels.
+        """
+        key = self._master_key()
+        with self._masters_lock:
+            host_lock = self._host_locks.setdefault(key, threading.Lock())
+
+        # only serialize master creation of the same host
+        with host_lock:
+            with self._masters_lock:
+                masters = self._masters.setdefault(key, [])
+                for master in list(masters):
+                    if master["users"] >= self.SESSIONS_PER_MASTER:
+                        continue
+                    if not self._check_master(master["path"]):
+                        masters.remove(master)
+                        continue
+                    master["users"] += 1
+                    return master["path"]
+                index = self._master_index.get(key, 0)
+                self._master_index[key] = index + 1
+                if not SSHMultiplex._exit_registered:
+                    atexit.register(SSHMultiplex.exit_masters)
+                    SSHMultiplex._exit_registered = True
+
+            control_path = self._control_path(index)
+            self._start_master(control_path, dut_id=dut_id)
+            with self._masters_lock:
+                self._masters[key].append({"path": control_path, "users": 1})
+            return control_path
+
+    def _release_master(self):
+        """
+        Return the channel back to master. The master connection is kept
+        until DTS exited, so that later sessions need not login again.
+        """
+        if self.control_path is None:
+            return
+
+        with self._masters_lock:
+            for master in self._masters.get(self._master_key(), []):
+                if master["path"] == self.control_path and master["users"] > 0:
+                    master["users"] -= 1
+                    break
+        self.control_path = None
+
+    def _control_path(self, index):
+        """
+        Unix socket path is limited to 108 bytes, so use digest as file name.
+        """
+        digest = hashlib.md5(
+            (
+                "%s@%s:%s#%d-%d"
+                % (self.username, self.ip, self.port, index, os.getpid())
+            ).encode()
+        ).hexdigest()
+        return os.path.join(self.CONTROL_DIR, "dts-ssh-%s" % digest[:16])
+
+    def _ssh_options(self, control_path):
+        options = "-o ControlPath=%s" % control_path
+        if self.port:
+            options += " -p %d -o NoHostAuthenticationForLocalhost=yes" % self.port
+        return options
+
+    @parallel_lock(num=8)
+    def _start_master(self, control_path, dut_id=0):
+        """
+        Create master connection in background. Master connection need full
+        login, so it is still limited by MaxStartups option in SSHD.
+        """
+        if os.path.exists(control_path):
+            os.remove(control_path)
+
+        command = (
+            "ssh -o ControlMaster=yes -o ControlPersist=yes {0} {1}@{2} true".format(
+                self._ssh_options(control_path), self.username, self.ip
+            )
+        )
+        p = pexpect.spawn(command, encoding="utf-8")
+        ssh_newkey = "Are you sure you want to continue connecting"
+        password_regex = (
+            r"(?i)(?:password:)|(?:passphrase for key)|(?:password for .+:)"
+        )
+        try:
+            i = p.expect([ssh_newkey, password_regex, pexpect.EOF], 20)
+            if i == 0:
+                p.sendline("yes")
+                i = p.expect([password_regex, pexpect.EOF], 20) + 1
+            if i == 1:
+                p.sendline(self.password)
+                p.expect(pexpect.EOF, 20)
+        except pexpect.TIMEOUT:
+            raise SSHConnectionException(self.host)
+        finally:
+            p.close(force=True)
+
+        if not self._check_master(control_path):
+            raise SSHConnectionException(self.host)
+
+    def _check_master(self, control_path):
+        ret = subprocess.run(
+            ["ssh", "-O", "check", "-o", "ControlPath=%s" % control_path, self.ip],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return ret.returncode == 0
+
+    @classmethod
+    def exit_masters(cls):
+        """
+        Stop all master connections.
+        """
+        with cls._masters_lock:
+            for (username, ip, port), masters in list(cls._masters.items()):
+                for master in masters:
+                    subprocess.run(
+                        [
+                            "ssh",
+                            "-O",
+                            "exit",
+                            "-o",
+                            "ControlPath=%s" % master["path"],
+                            ip,
+                        ],
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL,
+                    )
+            cls._masters.clear()
+
+    def run(self, command, timeout=15):
+        """
+        Run command over a non-interactive exec channel of master connection,
+        return its exit code, output, error output and elapsed time. It will
+        not touch the interactive shell of this session.
+        """
+        if self.control_path is None:
+            return super(SSHMultiplex, self).run(command, timeout)
+
+        start = time.time()
+        ssh_cmd = "ssh -o ControlMaster=no -o BatchMode=yes {0} {1}@{2}".format(
+            self._ssh_options(self.control_path), self.username, self.ip
+        ).split()
+        try:
+            ret = subprocess.run(
+                ssh_cmd + [command],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired as e:
+            raise TimeoutException(command, e.stdout or "") from None
+
+        # exit code 255 is reserved by ssh error, fall back when master lost
+        if ret.returncode == 255 and not self._check_master(self.control_path):
+            return super(SSHMultiplex, self).run(command, timeout)
+
+        # exec channel output is not read by pexpect session
+        if self.transcript is not None:
+            self.transcript.write(ret.stdout + ret.stderr)
+            self.transcript.flush()
+
+        return ret.returncode, ret.stdout, ret.stderr, time.time() - start
+
+    def close(self, force=False):
+        try:
+            super(SSHMultiplex, self).close(force)
+        finally:
+            self._release_master()
+
+    def _spawn_scp(self, scp_cmd, password, crb_session):
+        """
+        Transfer a file with SCP over the master connection
+        """
+        # file transferred from/to crb env can't use local master connection
+        if crb_session is None and self.control_path is not None:
+            scp_cmd = scp_cmd.replace(
+                "scp ", "scp -o ControlPath=%s " % self.control_path, 1
+            )
+        super(SSHMultiplex, self)._spawn_scp(scp_cmd, password, crb_session)
@@ -1,10 +1,17 @@
+import re
+import selectors
 import time
+from collections import deque
+from uuid import uuid4
 
 import pexpect
 from pexpect import pxssh
 
 from .debugger import aware_keyintr, ignore_keyintr
 from .exception import SSHConnectionException, SSHSessionDeadException, TimeoutException
+from .profiler import profiler
+from .settings import OUTPUT_CAP, OUTPUT_CAP_SETTING, load_global_setting
+from .transcript import Transcript
 from .utils import GREEN, RED, parallel_lock
 
 """
@@ -15,15 +22,34 @@ Also supports transfer files to tester or DUT.
 
 
 class SSHPexpect:
+
+    # interactive tty can't accept too long command line
+    BATCH_SCRIPT_SIZE = 2048
+    # output of pattern may cross reads, so re-search tail of searched data
+    SEARCH_WINDOW = 4096
+
     def __init__(self, host, username, password, dut_id):
         self.magic_prompt = "MAGIC PROMPT"
+        self.rc_marker = "DTS_EXIT_CODE="
         self.logger = None
+        self.selector = None
+        self.transcript = None
+        self.output_cap = int(load_global_setting(OUTPUT_CAP_SETTING) or OUTPUT_CAP)
+        self.stats = {
+            "wait": 0.0,
+            "transfer": 0.0,
+            "bytes": 0,
+            "dropped": 0,
+            "expects": 0,
+        }
 
         self.host = host
         self.username = username
         self.password = password
 
         self._connect_host(dut_id=dut_id)
+        # shell is ready after login, no need to sleep before each send
+        self.session.delaybeforesend = None
 
     @parallel_lock(num=8)
     def _connect_host(self, dut_id=0):
@@ -54,7 +80,7 @@ class SSHPexpect:
                         )
                     except Exception as e:
                         print(e)
-                        time.sleep(2)
+                        profiler.sleep(2)
                         retry_times -= 1
                         print("retry %d times connecting..." % (10 - retry_times))
                     else:
@@ -86,6 +112,9 @@ class SSHPexpect:
     def init_log(self, logger, name):
         self.logger = logger
         self.logger.info("ssh %s@%s" % (self.username, self.host))
+        # all received output streamed into transcript file
+        self.transcript = Transcript(name)
+        self.session.logfile_read = self.transcript
 
     def send_expect_base(self, command, expected, timeout):
         ignore_keyintr()
@@ -121,7 +150,79 @@ class SSHPexpect:
             )
             raise (e)
 
-    def send_command(self, command, timeout=1):
+    def run(self, command, timeout=15):
+        """
+        Run command and return its exit code, output, error output and
+        elapsed time. Interactive shell can't separate error output from
+        output, so error output is always merged into output. Exit code is
+        taken in the same round trip.
+        """
+        start = time.time()
+        out = self.send_expect(
+            "%secho %s$?" % (self.terminate_command(command), self.rc_marker),
+            self.session.UNIQUE_PROMPT,
+            timeout,
+        )
+        m = re.search(r"(.*?)(?:\r\n)?%s(\d+)$" % self.rc_marker, out, re.DOTALL)
+        if m is None:
+            raise TimeoutException(command, out)
+        output = m.group(1).replace("\r\n", "\n")
+        return int(m.group(2)), output, "", time.time() - start
+
+    @staticmethod
+    def terminate_command(command):
+        """
+        Terminate command so that another command can follow it in the same
+        line, command ended with "&" or ";" can't be followed by ";".
+        """
+        command = command.rstrip()
+        if command.endswith(("&", ";")):
+            return command + " "
+        return command + "; "
+
+    def run_batch(self, commands, timeout=15):
+        """
+        Run several commands in one round trip, output of each command is
+        wrapped by sentinel markers and split after received. Return list of
+        exit code and output(error output merged) in the order of commands.
+        Exit code is -1 when result of the command not found.
+        """
+        token = "DTS_BATCH_%s" % uuid4().hex[:8]
+        results = []
+        scripts = []
+        for index, command in enumerate(commands):
+            script = "echo '<%s:%d>'; { %s} 2>&1; echo \"</%s:%d:$?>\"" % (
+                token,
+                index,
+                self.terminate_command(command),
+                token,
+                index,
+            )
+            if scripts and len("; ".join(scripts + [script])) > self.BATCH_SCRIPT_SIZE:
+                results += self._run_batch_script(token, scripts, timeout)
+                scripts = []
+            scripts.append(script)
+        if scripts:
+            results += self._run_batch_script(token, scripts, timeout)
+
+        outputs = dict(results)
+        return [outputs.get(index, (-1, "")) for index in range(len(commands))]
+
+    def _run_batch_script(self, token, scripts, timeout):
+        _, out, _, _ = self.run("; ".join(scripts), timeout)
+        pattern = r"<%s:(\d+)>\n(.*?)\n?</%s:\1:(\d+)>" % (token, token)
+        return [
+            (int(index), (int(rc), output))
+            for index, output, rc in re.findall(pattern, out, re.DOTALL)
+        ]
+
+    def send_command(self, command, timeout=1, idle=None):
+        """
+        Send command and return its output. It returns once output stopped
+        at shell prompt, or no more output in idle seconds after some output
+        received if idle specified, otherwise all output before timeout is
+        returned. Idle helps prompt of application like "testpmd> ".
+        """
         try:
             ignore_keyintr()
             self.clean_session()
@@ -130,32 +231,40 @@ class SSHPexpect:
         except Exception as e:
             raise (e)
 
-        output = self.get_session_before(timeout=timeout)
-        self.session.PROMPT = self.session.UNIQUE_PROMPT
-        self.session.prompt(0.1)
+        ignore_keyintr()
+        self.session.before = self.__read_until(timeout, prompt=True, idle=idle)
+        aware_keyintr()
+        before = self.get_output_all()
+        self.__flush()
 
-        return output
+        return before
 
     def clean_session(self):
-        self.get_session_before(timeout=0.01)
+        """
+        Drop output left in session, it will not wait for new output.
+        """
+        self.get_session_before(timeout=0)
 
     def get_session_before(self, timeout=15):
         """
         Get all output before timeout
         """
         ignore_keyintr()
-        self.session.PROMPT = self.magic_prompt
-        try:
-            self.session.prompt(timeout)
-        except Exception as e:
-            pass
-
+        self.session.before = self.__read_until(timeout)
         aware_keyintr()
         before = self.get_output_all()
         self.__flush()
 
         return before
 
+    def get_stats(self):
+        """
+        Return seconds spent on waiting for output and on receiving output,
+        along with received bytes, bytes dropped from memory by output cap
+        and number of expect calls.
+        """
+        return dict(self.stats)
+
     def __flush(self):
         """
         Clear all session buffer
@@ -163,8 +272,115 @@ class SSHPexpect:
         self.session.buffer = ""
         self.session.before = ""
 
+    def __read(self, timeout):
+        """
+        Wait until session output readable and read all of them, return None
+        when nothing received before timeout.
+        """
+        if self.selector is None or self.selector_fd != self.session.child_fd:
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.session.child_fd, selectors.EVENT_READ)
+            self.selector_fd = self.session.child_fd
+
+        start = time.time()
+        ready = self.selector.select(max(timeout, 0))
+        received = time.time()
+        self.stats["wait"] += received - start
+        if not ready:
+            return None
+
+        data = self.session.read_nonblocking(self.session.maxread, timeout=0)
+        self.stats["transfer"] += time.time() - received
+        self.stats["bytes"] += len(data)
+        return data
+
+    def __read_until(self, timeout, prompt=False, idle=None):
+        """
+        Read all output before timeout, output still arriving at timeout is
+        left in session. When prompt is True, return as soon as output ended
+        with shell prompt. When idle specified, return when no more output in
+        idle seconds after some output received.
+        """
+        output = deque([self.session.buffer])
+        size = len(output[0])
+        self.session.buffer = ""
+        tail = output[0][-self.SEARCH_WINDOW :]
+        deadline = time.time() + timeout
+        while True:
+            if prompt and re.search(self.session.UNIQUE_PROMPT + "$", tail):
+                break
+            wait = deadline - time.time()
+            # don't read output which arrived after timeout
+            if wait <= 0 and len(output) > 1:
+                break
+            if idle is not None and len(output) > 1:
+                wait = min(wait, idle)
+            try:
+                data = self.__read(wait)
+            except pexpect.TIMEOUT:
+                continue
+            except pexpect.EOF:
+                break
+            if data is None:
+                break
+            output.append(data)
+            size += len(data)
+            tail = (tail + data)[-self.SEARCH_WINDOW :]
+            # only keep latest output in memory, the full one is in transcript
+            while size - len(output[0]) >= self.output_cap:
+                dropped = len(output.popleft())
+                size -= dropped
+                self.stats["dropped"] += dropped
+            if size > self.output_cap:
+                self.stats["dropped"] += size - self.output_cap
+                output[0] = output[0][size - self.output_cap :]
+                size = self.output_cap
+
+        return "".join(output)
+
+    def __expect(self, pattern, timeout):
+        """
+        Wait for pattern in session output, return True as soon as matched.
+        Only newly received output is searched, and output after matched
+        part is kept in buffer for next expect.
+        """
+        self.stats["expects"] += 1
+        if not isinstance(pattern, str):
+            return self.session.expect([pattern, pexpect.TIMEOUT], timeout) == 0
+
+        regex = re.compile(pattern, re.DOTALL)
+        buffer = self.session.buffer
+        searched = 0
+        deadline = time.time() + timeout
+        while True:
+            match = regex.search(buffer, max(searched - self.SEARCH_WINDOW, 0))
+            if match is not None:
+                self.session.before = buffer[: match.start()]
+                self.session.after = match.group()
+                self.session.match = match
+                self.session.buffer = buffer[match.end() :]
+                return True
+
+            if len(buffer) > self.output_cap:
+                self.stats["dropped"] += len(buffer) - self.output_cap
+                buffer = buffer[-self.output_cap :]
+            searched = len(buffer)
+            wait = deadline - time.time()
+            try:
+                # output still arriving can't delay timeout
+                data = self.__read(wait) if wait > 0 else None
+            except pexpect.TIMEOUT:
+                continue
+            if data is None:
+                self.session.before = buffer
+                self.session.after = pexpect.TIMEOUT
+                self.session.match = None
+                self.session.buffer = buffer
+                return False
+            buffer += data
+
     def __prompt(self, command, timeout):
-        if not self.session.prompt(timeout):
+        if not self.__expect(self.session.PROMPT, timeout):
             raise TimeoutException(command, self.get_output_all()) from None
 
     def __sendline(self, command):
@@ -190,11 +406,18 @@ class SSHPexpect:
         return output
 
     def close(self, force=False):
-        if force is True:
-            self.session.close()
-        else:
-            if self.isalive():
-                self.session.logout()
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        try:
+            if force is True:
+                self.session.close()
+            else:
+                if self.isalive():
+                    self.session.logout()
+        finally:
+            if self.transcript is not None:
+                self.transcript.close()
 
     def isalive(self):
         return self.session.isalive()
@@ -244,7 +467,7 @@ class SSHPexpect:
             p = crb_session.session.session
         else:
             p = pexpect.spawn(scp_cmd)
-        time.sleep(0.5)
+        profiler.sleep(0.5)
         ssh_newkey = "Are you sure you want to continue connecting"
         i = p.expect(
             [ssh_newkey, "[pP]assword", "# ", pexpect.EOF, pexpect.TIMEOUT], 120
@@ -254,7 +477,7 @@ class SSHPexpect:
             i = p.expect([ssh_newkey, "[pP]assword", pexpect.EOF], 2)
 
         if i == 1:
-            time.sleep(0.5)
+            profiler.sleep(0.5)
             p.sendline(password)
             p.expect("Exit status 0", 60)
         if i == 4:
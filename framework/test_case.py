@@ -7,7 +7,6 @@ A base class for creating DTF test cases.
 """
 import re
 import signal
-import time
 import traceback
 from functools import wraps
 
@@ -16,6 +15,7 @@ import framework.debugger as debugger
 from .config import SuiteConf
 from .exception import TimeoutException, VerifyFailure, VerifySkip
 from .logger import getLogger
+from .profiler import profiler
 from .rst import RstReport
 from .settings import (
     DEBUG_CASE_SETTING,
@@ -246,7 +246,8 @@ class TestCase(object):
         self.enable_history(self.setup_history)
 
         try:
-            self.set_up_all()
+            with profiler.scope(self.suite_name, "", "set_up_all"):
+                self.set_up_all()
             return True
         except VerifySkip as v:
             self.logger.info("set_up_all SKIPPED:\n" + traceback.format_exc())
@@ -320,9 +321,11 @@ class TestCase(object):
                 dutobj.get_session_output(timeout=0.1)
             self.tester.get_session_output(timeout=0.1)
             # run set_up function for each case
-            self.set_up()
+            with profiler.scope(self.suite_name, case_name, "set_up"):
+                self.set_up()
             # run test case
-            case_obj()
+            with profiler.scope(self.suite_name, case_name, "case"):
+                case_obj()
 
             self._suite_result.test_case_passed()
 
@@ -386,7 +389,7 @@ class TestCase(object):
                         for dutobj in self.duts:
                             dutobj.get_session_output(timeout=0.5 * (i + 1))
                         self.tester.get_session_output(timeout=0.5 * (i + 1))
-                        time.sleep(i + 1)
+                        profiler.sleep(i + 1)
                         self.logger.info(
                             " Test case %s failed and re-run %d time"
                             % (case_obj.__name__, i + 1)
@@ -445,7 +448,8 @@ class TestCase(object):
         execute suite tear_down_all function
         """
         try:
-            self.tear_down_all()
+            with profiler.scope(self.suite_name, "", "tear_down_all"):
+                self.tear_down_all()
         except Exception:
             self.logger.error("tear_down_all failed:\n" + traceback.format_exc())
 
@@ -463,7 +467,8 @@ class TestCase(object):
         execute suite tear_down function
         """
         try:
-            self.tear_down()
+            with profiler.scope(self.suite_name, self.running_case, "tear_down"):
+                self.tear_down()
         except Exception:
             self.logger.error("tear_down failed:\n" + traceback.format_exc())
             self.logger.warning(
@@ -473,7 +478,8 @@ class TestCase(object):
 
     def enable_history(self, history):
         """
-        Enable history for all CRB's default session
+        Enable history for all CRB's default session, output of commands is
+        saved as offset in session transcript file.
         """
         for dutobj in self.duts:
             dutobj.session.set_history(history)
@@ -261,6 +261,40 @@ class Result(object):
     def copy_suite(self, suite_result):
         self.__current_suites()[self.__test_suite + 1] = suite_result.__current_cases()
 
+    def merge(self, other):
+        """
+        Merge results of another Result object, which may be collected by
+        other execution worker.
+        """
+        internals = other.internals
+        for dut_idx in range(0, len(internals), 2):
+            dut = internals[dut_idx]
+            if dut not in self.__internals:
+                self.__internals.append(dut)
+                self.__internals.append(internals[dut_idx + 1])
+                continue
+            dut_info = self.__internals[self.__internals.index(dut) + 1]
+            other_info = internals[dut_idx + 1]
+            # versions of dut and nic are kept, targets start from index 5
+            for target_idx in range(5, len(other_info), 3):
+                target = other_info[target_idx]
+                if target not in dut_info[5:]:
+                    dut_info.extend(other_info[target_idx : target_idx + 3])
+                    continue
+                idx = dut_info.index(target, 5)
+                dut_info[idx + 1] = other_info[target_idx + 1]
+                suites = dut_info[idx + 2]
+                other_suites = other_info[target_idx + 2]
+                for suite_idx in range(0, len(other_suites), 2):
+                    suite = other_suites[suite_idx]
+                    if suite in suites:
+                        suites[suites.index(suite) + 1] = other_suites[suite_idx + 1]
+                    else:
+                        suites.extend(other_suites[suite_idx : suite_idx + 2])
+
+        self.__failed_duts.update(other.__failed_duts)
+        self.__failed_targets.update(other.__failed_targets)
+
     def test_case_passed(self):
         """
         Set last test case added as PASSED
@@ -6,14 +6,17 @@
 Interface for bulk traffic generators.
 """
 
+import base64
+import json
 import os
 import random
 import re
 import subprocess
+import threading
+import time
 from multiprocessing import Process
-from time import sleep
 
-from nics.net_device import GetNicObj
+from nics.net_device import GetNicObj, prefetch_nics
 
 from .config import PktgenConf
 from .crb import Crb
@@ -22,11 +25,16 @@ from .packet import (
     Packet,
     compare_pktload,
     get_scapy_module_impcmd,
+    mark_tcpdump_packets,
     start_tcpdump,
+    stop_and_count_tcpdump_packets,
     stop_and_load_tcpdump_packets,
+    stop_and_summarize_tcpdump_packets,
     strip_pktload,
 )
+from .packet_bulk import frame_l4_load
 from .pktgen import getPacketGenerator
+from .profiler import profiler
 from .settings import (
     NICS,
     PERF_SETTING,
@@ -35,6 +43,7 @@ from .settings import (
     USERNAME,
     load_global_setting,
 )
+from .ssh_pexpect import SSHPexpect
 from .utils import GREEN, check_crb_python_version, convert_int2ip, convert_ip2int
 
 
@@ -50,6 +59,9 @@ class Tester(Crb):
     CORE_LIST_CACHE_KEY = "tester_core_list"
     NUMBER_CORES_CACHE_KEY = "tester_number_cores"
     PCI_DEV_CACHE_KEY = "tester_pci_dev_info"
+    PKT_AGENT_PROMPT = "agent> "
+    # base64 characters of frames loaded by one agent request
+    PKT_AGENT_BATCH_SIZE = 64 * 1024
 
     def __init__(self, crb, serializer):
         self.NAME = "tester"
@@ -66,21 +78,28 @@ class Tester(Crb):
         self.bgItf = ""
         self.re_run_time = 0
         self.pktgen = None
-        # prepare for scapy env
+        # packet agent session, False when agent can't run on tester
+        self.pkt_agent = None
+        # prepare for scapy env, idle scapy sessions are kept in pool
         self.scapy_sessions_li = list()
+        self.scapy_pool = list()
+        self.scapy_pool_lock = threading.Lock()
+        self.scapy_pool_thread = None
         self.scapy_session = self.prepare_scapy_env()
         self.check_scapy_version()
         self.tmp_file = "/tmp/tester/"
         out = self.send_expect("ls -d %s" % self.tmp_file, "# ", verify=True)
         if out == 2:
             self.send_expect("mkdir -p %s" % self.tmp_file, "# ")
+        self.refill_scapy_pool()
 
-    def prepare_scapy_env(self):
-        session_name = (
-            "tester_scapy"
-            if not self.scapy_sessions_li
-            else f"tester_scapy_{random.random()}"
-        )
+    def get_scapy_pool_size(self):
+        """
+        Get number of idle scapy sessions kept in pool.
+        """
+        return self.crb.get("scapy pool size", 0)
+
+    def create_scapy_session(self, session_name):
         session = self.create_session(session_name)
         self.scapy_sessions_li.append(session)
         session.send_expect("scapy", ">>> ")
@@ -92,6 +111,302 @@ class Tester(Crb):
 
         return session
 
+    def prepare_scapy_env(self):
+        """
+        Return scapy session, the first one is tester's own scapy session.
+        Others are taken from pool if there's healthy one, otherwise created.
+        """
+        if not self.scapy_sessions_li:
+            return self.create_scapy_session("tester_scapy")
+
+        session = None
+        while session is None:
+            with self.scapy_pool_lock:
+                if not self.scapy_pool:
+                    break
+                session = self.scapy_pool.pop(0)
+            if not self.reset_scapy_session(session):
+                self.drop_scapy_session(session)
+                session = None
+        if session is None:
+            session = self.create_scapy_session(f"tester_scapy_{random.random()}")
+        self.refill_scapy_pool()
+        return session
+
+    def reset_scapy_session(self, session):
+        """
+        Stop anything running in scapy session, return whether session is
+        back to scapy prompt.
+        """
+        try:
+            if not session.isalive():
+                return False
+            session.send_expect("^C", ">>> ", timeout=2)
+        except Exception:
+            return False
+        return True
+
+    def drop_scapy_session(self, session):
+        if session in self.scapy_sessions_li:
+            self.scapy_sessions_li.remove(session)
+        self.destroy_session(session)
+
+    def release_scapy_env(self, session):
+        """
+        Return scapy session got by prepare_scapy_env, it's reset and kept in
+        pool for next use, or closed if pool is full.
+        """
+        if session is self.scapy_session or session not in self.scapy_sessions_li:
+            return
+        if self.reset_scapy_session(session):
+            with self.scapy_pool_lock:
+                if len(self.scapy_pool) < self.get_scapy_pool_size():
+                    self.scapy_pool.append(session)
+                    return
+        self.drop_scapy_session(session)
+
+    def refill_scapy_pool(self):
+        """
+        Create scapy sessions in background until pool is full.
+        """
+        if self.scapy_pool_thread is not None and self.scapy_pool_thread.is_alive():
+            return
+
+        def refill():
+            while len(self.scapy_pool) < self.get_scapy_pool_size():
+                try:
+                    session = self.create_scapy_session(
+                        f"tester_scapy_{random.random()}"
+                    )
+                except Exception as e:
+                    self.logger.warning("Failed to create scapy session: %s" % e)
+                    return
+                with self.scapy_pool_lock:
+                    self.scapy_pool.append(session)
+
+        self.scapy_pool_thread = threading.Thread(target=refill, daemon=True)
+        self.scapy_pool_thread.start()
+
+    def start_pkt_agent(self):
+        """
+        Start packet agent on tester in its own session. Return False if agent
+        can't be started, then packets should be sent by scapy.
+        """
+        session = self.create_session("tester_agent")
+        try:
+            session.copy_file_to("dep/pkt_agent.py", self.tmp_file)
+            out = session.send_expect(
+                "python3 %spkt_agent.py" % self.tmp_file, self.PKT_AGENT_PROMPT, 10
+            )
+            if "READY" not in out:
+                raise Exception(out)
+        except Exception as e:
+            self.logger.warning("Packet agent not available, use scapy: %s" % e)
+            self.destroy_session(session)
+            return False
+        return session
+
+    def has_pkt_agent(self):
+        """
+        Start packet agent when it's first used, return whether it's running.
+        """
+        if self.pkt_agent is None:
+            self.pkt_agent = self.start_pkt_agent()
+        return self.pkt_agent is not False
+
+    def load_agent_frames(self, request, frames, timeout=120):
+        """
+        Load frames into packet agent by request, frames are loaded in
+        batches and then sent together with same order as sendp.
+        """
+        agent = self.pkt_agent.session
+        batch = []
+        size = 0
+        for index, frame in enumerate(frames):
+            encoded = base64.b64encode(frame).decode()
+            batch.append(encoded)
+            size += len(encoded) + 1
+            if size < self.PKT_AGENT_BATCH_SIZE and index != len(frames) - 1:
+                continue
+            out = agent.send_expect(
+                "%s %s" % (request, ",".join(batch)), self.PKT_AGENT_PROMPT, timeout
+            )
+            if not out.startswith("OK"):
+                self.logger.error("Packet agent failed to load frames: " + out)
+                agent.send_expect("CLEAR", self.PKT_AGENT_PROMPT)
+                return False
+            batch = []
+            size = 0
+        return True
+
+    def send_frames(self, frames, tx_port, count=1, interval=0, timeout=120):
+        """
+        Send raw frames by packet agent. Return dict of sent frame number and
+        start/end timestamp of transmission, or None if agent failed.
+        """
+        if not self.has_pkt_agent():
+            return None
+        if not self.load_agent_frames("ADD", frames, timeout):
+            return None
+
+        out = self.pkt_agent.send_expect(
+            "SEND %s %d %s" % (tx_port, count, interval),
+            self.PKT_AGENT_PROMPT,
+            timeout,
+        )
+        m = re.search(r"TX (\d+) ([\d.]+) ([\d.]+)", out)
+        if m is None:
+            self.logger.error("Packet agent failed to send frames: " + out)
+            return None
+        return {
+            "port": tx_port,
+            "sent": int(m.group(1)),
+            "start": float(m.group(2)),
+            "end": float(m.group(3)),
+        }
+
+    def send_frames_multi(self, port_frames, count=1, interval=0, timeout=120):
+        """
+        Send raw frames of several ports at same time by packet agent, reply
+        of agent is returned when all ports finished. Return dict of result
+        like send_frames for each port, or None if agent failed.
+        """
+        if not self.has_pkt_agent():
+            return None
+        for tx_port, frames in list(port_frames.items()):
+            if not self.load_agent_frames("LOAD %s" % tx_port, frames, timeout):
+                return None
+
+        out = self.pkt_agent.send_expect(
+            "SENDALL %d %s" % (count, interval), self.PKT_AGENT_PROMPT, timeout
+        )
+        m = re.match(r"TXALL (\S+)", out)
+        if m is None:
+            self.logger.error("Packet agent failed to send frames: " + out)
+            return None
+        results = {}
+        for item in m.group(1).split(","):
+            tx_port, sent, start, end = item.split(":")
+            results[tx_port] = {
+                "port": tx_port,
+                "sent": int(sent),
+                "start": float(start),
+                "end": float(end),
+            }
+        return results
+
+    def agent_request(self, request, timeout=30):
+        """
+        Send request to packet agent, return number in reply or None if
+        request failed.
+        """
+        out = self.pkt_agent.session.send_expect(
+            request, self.PKT_AGENT_PROMPT, timeout
+        )
+        m = re.match(r"OK (\d+)", out)
+        if m is None:
+            self.logger.error("Packet agent request %s failed: %s" % (request, out))
+            return None
+        return int(m.group(1))
+
+    def start_capture(
+        self,
+        intf,
+        count=0,
+        filter_cmd="",
+        fields=None,
+        aggregate=True,
+        inbound=True,
+    ):
+        """
+        Start capture of frames on interface by packet agent, filter is
+        tcpdump expression. Only received frames are captured if inbound is
+        True, otherwise sent frames too. When fields specified, only values
+        of fields are kept in agent, counted by value if aggregate is True or
+        as tuple of each frame. Return capture id, or None if agent can't
+        capture.
+        """
+        if not self.has_pkt_agent():
+            return None
+        index = str(time.time())
+        expr = filter_cmd.strip().strip("'")
+        expr = base64.b64encode(expr.encode()).decode() if expr else "-"
+        request = "CAPTURE %s %s %d %s %s" % (
+            index,
+            intf,
+            count,
+            "in" if inbound else "inout",
+            expr,
+        )
+        if fields:
+            request += " %s %s" % (",".join(fields), "count" if aggregate else "tuple")
+        if self.agent_request(request) is None:
+            return None
+        return index
+
+    def mark_capture(self, index):
+        """
+        Return number of frames captured until now.
+        """
+        return self.agent_request("MARK %s" % index)
+
+    def stop_capture(self, index):
+        """
+        Stop capture, return number of captured frames.
+        """
+        return self.agent_request("STOP %s" % index)
+
+    def fetch_capture(self, index, start=0, drop=True):
+        """
+        Return list of (timestamp, frame) captured from index start, capture
+        is freed in agent when drop is True.
+        """
+        agent = self.pkt_agent.session
+        frames = []
+        while True:
+            out = agent.send_expect(
+                "FETCH %s %d" % (index, start), self.PKT_AGENT_PROMPT, 60
+            )
+            m = re.match(r"FRAMES (\d+) ?(\S*)", out)
+            if m is None:
+                self.logger.error("Packet agent failed to fetch frames: " + out)
+                break
+            if int(m.group(1)) == start:
+                break
+            start = int(m.group(1))
+            for item in m.group(2).split(","):
+                ts, data = item.split(":")
+                frames.append((float(ts), base64.b64decode(data)))
+        if drop:
+            self.agent_request("DROP %s" % index)
+        return frames
+
+    def fetch_capture_summary(self, index, drop=True):
+        """
+        Return values of fields of capture, which is list of field values
+        followed by count if capture is aggregated, otherwise list of field
+        values of each frame. Return None if agent failed.
+        """
+        agent = self.pkt_agent.session
+        summary = []
+        start = 0
+        while True:
+            out = agent.send_expect(
+                "SUMMARY %s %d" % (index, start), self.PKT_AGENT_PROMPT, 60
+            )
+            m = re.match(r"SUMMARY (\d+) (.*)", out, re.DOTALL)
+            if m is None:
+                self.logger.error("Packet agent failed to summarize capture: " + out)
+                summary = None
+                break
+            summary.extend(json.loads(m.group(2)))
+            if int(m.group(1)) == start:
+                break
+            start = int(m.group(1))
+        if drop:
+            self.agent_request("DROP %s" % index)
+        return summary
+
     def check_scapy_version(self):
         require_version = "2.4.4"
         self.scapy_session.get_session_before(timeout=1)
@@ -332,7 +647,7 @@ class Tester(Crb):
         except Exception as e:
             self.logger.error(f"   !!! Restore ITF: {e}")
 
-        sleep(2)
+        profiler.sleep(2)
 
     def restore_trex_interfaces(self):
         """
@@ -356,7 +671,7 @@ class Tester(Crb):
         except Exception as e:
             self.logger.error(f"   !!! Restore ITF: {e}")
 
-        sleep(2)
+        profiler.sleep(2)
 
     def set_promisc(self):
         try:
@@ -441,7 +756,12 @@ class Tester(Crb):
             self.scan_ports_cached()
 
         if not self.read_cache or self.ports_info is None:
-            self.scan_ports_uncached()
+            # probe all ports in batches instead of one command per query
+            prefetch_nics(self, [pci_bus for (pci_bus, _) in self.pci_devices_info])
+            try:
+                self.scan_ports_uncached()
+            finally:
+                self.clear_prefetch()
             if self.it_uses_external_generator():
                 if self.is_pktgen:
                     self._scan_pktgen_ports()
@@ -583,6 +903,38 @@ class Tester(Crb):
                 10,
             )
 
+    def send_ping6_parallel(self, probes):
+        """
+        Send ping6 packets of all probes at the same time, each probe is tuple
+        of local port and destination ipv6 address. Return ping output list.
+        """
+        if not probes:
+            return []
+
+        # parallel dts workers may share the same tester
+        ping_dir = "/tmp/dts_ping6_%s_%d" % (self.name, os.getpid())
+        self.send_expect("rm -rf {0} && mkdir -p {0}".format(ping_dir), "# ")
+        # interactive tty can't accept too long command line
+        line = ""
+        for index, (localPort, ipv6) in enumerate(probes):
+            cmd = "ping6 -w 5 -c 5 -A %s%%%s > %s/%d 2>&1 &" % (
+                ipv6,
+                self.ports_info[localPort]["intf"],
+                ping_dir,
+                index,
+            )
+            if line and len(line) + len(cmd) > SSHPexpect.BATCH_SCRIPT_SIZE:
+                self.send_expect(line, "# ")
+                line = ""
+            line += cmd + " "
+        self.send_expect(line + "wait", "# ", 15)
+
+        results = self.run_batch(
+            ["cat %s/%d" % (ping_dir, index) for index in range(len(probes))]
+        )
+        self.send_expect("rm -rf %s" % ping_dir, "# ")
+        return [out for (_, out) in results]
+
     def get_port_numa(self, port):
         """
         Return tester local port numa.
@@ -632,12 +984,12 @@ class Tester(Crb):
                 'subprocess.call("scapy -c sniff.py &", shell=True)', ">>> "
             )
             self.bgProcIsRunning = False
-        sleep(2)
+        profiler.sleep(2)
 
         for cmd in self.scapyCmds:
             self.send_expect(cmd, ">>> ", timeout)
 
-        sleep(2)
+        profiler.sleep(2)
         self.scapyCmds = []
         self.send_expect("exit()", "# ", timeout)
 
@@ -700,20 +1052,22 @@ class Tester(Crb):
         allow_miss=True,
         seq_check=False,
         params=None,
+        bulk=True,
     ):
         """
-        Send several random packets and check rx packets matched
+        Send several random packets and check rx packets matched. In bulk mode
+        packets are generated as raw frames and matched by their layer 4 load.
         """
         tx_pkts = {}
         rx_inst = {}
         # packet type random between tcp/udp/ipv6
         random_type = ["TCP", "UDP", "IPv6_TCP", "IPv6_UDP"]
-        for txport, rxport in portList:
-            txIntf = self.get_interface(txport)
-            rxIntf = self.get_interface(rxport)
-            self.logger.info(
-                GREEN("Preparing transmit packets, please wait few minutes...")
-            )
+        self.logger.info(
+            GREEN("Preparing transmit packets, please wait few minutes...")
+        )
+        # generation is cpu bound, bulk mode generates frames of all packets
+        # together instead of building scapy packets one by one
+        for txport, _ in portList:
             pkt = Packet()
             pkt.generate_random_pkts(
                 pktnum=pktnum,
@@ -721,9 +1075,12 @@ class Tester(Crb):
                 ip_increase=True,
                 random_payload=True,
                 options={"layers_config": params},
+                bulk=bulk,
             )
-
             tx_pkts[txport] = pkt
+
+        for txport, rxport in portList:
+            rxIntf = self.get_interface(rxport)
             # sniff packets
             inst = start_tcpdump(
                 self,
@@ -735,36 +1092,31 @@ class Tester(Crb):
                 ],
             )
             rx_inst[rxport] = inst
-        bg_sessions = list()
+
+        # all ports start to transmit together by packet agent, which replies
+        # when all of them finished
+        port_frames = {}
         for txport, _ in portList:
-            txIntf = self.get_interface(txport)
-            bg_sessions.append(
-                self.parallel_transmit_ptks(
-                    pkt=tx_pkts[txport], intf=txIntf, send_times=1, interval=interval
-                )
+            frames = tx_pkts[txport].gernerator_pkt_frames()
+            if frames is not None:
+                port_frames[self.get_interface(txport)] = frames
+        tx_results = None
+        if len(port_frames) == len(portList):
+            print(
+                GREEN("Transmitting and sniffing packets, please wait few minutes...")
             )
-        # Verify all packets
-        sleep(interval * pktnum + 1)
-        timeout = 60
-        for i in bg_sessions:
-            while timeout:
-                try:
-                    i.send_expect("", ">>> ", timeout=1)
-                except Exception as e:
-                    print(e)
-                    self.logger.info("wait for the completion of sending pkts...")
-                    timeout -= 1
-                    continue
-                else:
-                    break
-            else:
-                self.logger.info(
-                    "exceeded timeout, force to stop background packet sending to avoid dead loop"
-                )
-                Packet.stop_send_pkt_bg(i)
+            tx_results = self.send_frames_multi(
+                port_frames, interval=interval, timeout=interval * pktnum + 120
+            )
+        if tx_results is None:
+            self.__transmit_random_pkts_bg(portList, tx_pkts, pktnum, interval)
+        else:
+            # wait for packets in flight
+            profiler.sleep(1)
+
         prev_id = -1
         for txport, rxport in portList:
-            p = stop_and_load_tcpdump_packets(rx_inst[rxport])
+            p = stop_and_load_tcpdump_packets(rx_inst[rxport], lazy=bulk)
             recv_pkts = p.pktgen.pkts
             # only report when received number not matched
             if len(tx_pkts[txport].pktgen.pkts) > len(recv_pkts):
@@ -781,6 +1133,13 @@ class Tester(Crb):
             self.logger.info(
                 GREEN("Comparing sniffed packets, please wait few minutes...")
             )
+            if bulk:
+                prev_id = self.__check_random_frames(
+                    tx_pkts[txport].pktgen.pkts, recv_pkts, seq_check, prev_id
+                )
+                if prev_id is False:
+                    return False
+                continue
             for idx in range(len(recv_pkts)):
                 try:
                     l3_type = p.strip_element_layer2("type", p_index=idx)
@@ -822,22 +1181,122 @@ class Tester(Crb):
 
         return True
 
-    def tcpdump_sniff_packets(self, intf, count=0, filters=None, lldp_forbid=True):
+    def __transmit_random_pkts_bg(self, portList, tx_pkts, pktnum, interval):
+        """
+        Transmit packets of all ports by background scapy sessions.
+        """
+        bg_sessions = list()
+        for txport, _ in portList:
+            txIntf = self.get_interface(txport)
+            bg_sessions.append(
+                self.parallel_transmit_ptks(
+                    pkt=tx_pkts[txport], intf=txIntf, send_times=1, interval=interval
+                )
+            )
+        # Verify all packets
+        profiler.sleep(interval * pktnum + 1)
+        timeout = 60
+        for i in bg_sessions:
+            while timeout:
+                try:
+                    i.send_expect("", ">>> ", timeout=1)
+                except Exception as e:
+                    print(e)
+                    self.logger.info("wait for the completion of sending pkts...")
+                    timeout -= 1
+                    continue
+                else:
+                    break
+            else:
+                self.logger.info(
+                    "exceeded timeout, force to stop background packet sending to avoid dead loop"
+                )
+                Packet.stop_send_pkt_bg(i)
+        for i in bg_sessions:
+            self.release_scapy_env(i)
+
+    def __check_random_frames(self, tx_frames, recv_pkts, seq_check, prev_id):
+        """
+        Check received packets by layer 4 load of sent frames, return False
+        if not matched or last sequence id.
+        """
+        tx_loads = set()
+        for frame in tx_frames:
+            load = frame_l4_load(frame)
+            if load is not None:
+                tx_loads.add(load[2])
+
+        for idx, recv_pkt in enumerate(recv_pkts):
+            load = frame_l4_load(bytes(recv_pkt))
+            if load is None:
+                continue
+            _, t_idx, l4_load = load
+            if seq_check:
+                if t_idx <= prev_id:
+                    self.logger.info("Packet %d sequence not correct" % t_idx)
+                    return False
+                prev_id = t_idx
+
+            if l4_load not in tx_loads:
+                self.logger.warning(
+                    "Pkt received index %d not match any sent packet" % idx
+                )
+                self.logger.info("Recv: %s" % l4_load.hex())
+                return False
+        return prev_id
+
+    def tcpdump_sniff_packets(
+        self,
+        intf,
+        count=0,
+        filters=None,
+        lldp_forbid=True,
+        fields=None,
+        aggregate=True,
+    ):
         """
         Wrapper for packet module sniff_packets
         """
         inst = start_tcpdump(
-            self, intf=intf, count=count, filters=filters, lldp_forbid=lldp_forbid
+            self,
+            intf=intf,
+            count=count,
+            filters=filters,
+            lldp_forbid=lldp_forbid,
+            fields=fields,
+            aggregate=aggregate,
         )
         return inst
 
-    def load_tcpdump_sniff_packets(self, index="", timeout=1):
+    def load_tcpdump_sniff_packets(
+        self, index="", timeout=1, match=None, start=0, lazy=False
+    ):
         """
-        Wrapper for packet module load_pcapfile
+        Wrapper for packet module stop_and_load_tcpdump_packets
         """
-        p = stop_and_load_tcpdump_packets(index, timeout=timeout)
+        p = stop_and_load_tcpdump_packets(
+            index, timeout=timeout, match=match, start=start, lazy=lazy
+        )
         return p
 
+    def mark_tcpdump_sniff_packets(self, index=""):
+        """
+        Wrapper for packet module mark_tcpdump_packets
+        """
+        return mark_tcpdump_packets(index)
+
+    def load_tcpdump_sniff_summary(self, index="", timeout=1):
+        """
+        Wrapper for packet module stop_and_summarize_tcpdump_packets
+        """
+        return stop_and_summarize_tcpdump_packets(index, timeout=timeout)
+
+    def count_tcpdump_sniff_packets(self, index="", timeout=1):
+        """
+        Wrapper for packet module stop_and_count_tcpdump_packets
+        """
+        return stop_and_count_tcpdump_packets(index, timeout=timeout)
+
     def kill_all(self, killall=False):
         """
         Kill all scapy process or DPDK application on tester.
@@ -861,6 +1320,15 @@ class Tester(Crb):
                     self.restore_trex_interfaces()
                 self.pktgen = None
 
+        if self.pkt_agent:
+            if self.pkt_agent.isalive():
+                self.pkt_agent.send_expect("QUIT", "# ", timeout=2)
+            self.destroy_session(self.pkt_agent)
+        self.pkt_agent = None
+
+        if self.scapy_pool_thread is not None:
+            self.scapy_pool_thread.join()
+        self.scapy_pool = list()
         if self.scapy_sessions_li:
             for i in self.scapy_sessions_li:
                 if i.session.isalive():
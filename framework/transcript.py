@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: BSD-3-Clause
+# Copyright(c) 2022 Intel Corporation
+#
+
+"""
+Module stream all output of one session into transcript file as soon as it
+is received, command history can only save offset of its output in file.
+"""
+
+import os
+import threading
+
+from . import logger
+from .settings import FOLDERS
+
+
+class Transcript(object):
+
+    """
+    File like object which can be used as logfile_read of pexpect session.
+    Transcript file is located in log folder and named by session name.
+    """
+
+    # transcript names already used by opened sessions
+    _opened = set()
+    _opened_lock = threading.Lock()
+
+    def __init__(self, name):
+        if logger.log_dir is None:
+            log_path = os.getcwd() + "/" + FOLDERS["Output"]
+        else:
+            log_path = logger.log_dir
+
+        with self._opened_lock:
+            self.name = name
+            index = 1
+            while self.name in self._opened:
+                self.name = "%s.%d" % (name, index)
+                index += 1
+            self._opened.add(self.name)
+
+        self.path = os.path.join(log_path, "%s.transcript" % self.name)
+        # name is reused after closed, old output may be still referred by
+        # history, so it's kept and new output is appended
+        self.file = open(self.path, "ab")
+        self.offset = self.file.seek(0, os.SEEK_END)
+
+    def write(self, data):
+        if self.file is None:
+            return
+        if isinstance(data, str):
+            data = data.encode("utf-8", "replace")
+        self.file.write(data)
+        self.offset += len(data)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        with self._opened_lock:
+            self._opened.discard(self.name)
+
+
+def read_transcript(path, offset, length):
+    """
+    Read output saved in transcript file.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length).decode("utf-8", "replace")
@@ -11,6 +11,7 @@ from nics.net_device import GetNicObj, RemoveNicObj
 
 from .config import AppNameConf, PortConf
 from .dut import Dut
+from .profiler import profiler
 from .project_dpdk import DPDKdut
 from .settings import LOG_NAME_SEP, NICS, get_netdev, load_global_setting
 from .utils import RED, parallel_lock
@@ -274,7 +275,7 @@ class VirtDut(DPDKdut):
                 port = GetNicObj(self, domain_id, bus_id, devfun_id)
                 itf = port.get_interface_name()
                 self.send_expect("ifconfig %s up" % itf, "# ")
-                time.sleep(30)
+                profiler.sleep(30)
                 print(self.send_expect("ip link ls %s" % itf, "# "))
             else:
                 self.logger.info(
@@ -173,6 +173,13 @@ parser.add_argument(
     "--asan", action="store_true", help="add function to support ASan test"
 )
 
+parser.add_argument(
+    "--parallel",
+    action="store_true",
+    help="run execution sections in parallel on their crbs, suites of "
+    + "sections with the same shard_group are shared among them",
+)
+
 args = parser.parse_args()
 
 
@@ -206,4 +213,5 @@ dts.run_all(
     args.subtitle,
     args.update_expected,
     args.asan,
+    args.parallel,
 )
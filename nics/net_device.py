@@ -80,6 +80,16 @@ class NetDevice(object):
             cmds, expected, timeout=timeout, alt_session=alt_session
         )
 
+    def __run(self, cmds, timeout=TIMEOUT, alt_session=True):
+        """
+        Wrap the crb`s run as private method, return exit code and stripped
+        output. Error output is returned instead when command failed.
+        """
+        rc, out, err, _ = self.crb.run(cmds, timeout=timeout, alt_session=alt_session)
+        if rc:
+            out = err or out
+        return rc, out.strip()
+
     def __get_os_type(self):
         """
         Get OS type.
@@ -103,7 +113,7 @@ class NetDevice(object):
         Get the NIC pkg.
         """
         self.pkg = {"type": "", "version": ""}
-        out = self.__send_expect('dmesg | grep "DDP package" | tail -1', "# ")
+        _, out = self.__run('dmesg | grep "DDP package" | tail -1')
         if "could not load" in out:
             print(RED(out))
             print(
@@ -138,9 +148,7 @@ class NetDevice(object):
         """
         rexp = "version:\s.+"
         pattern = re.compile(rexp)
-        out = self.__send_expect(
-            "ethtool -i {} | grep version".format(self.intf_name), "# "
-        )
+        _, out = self.__run("ethtool -i {} | grep version".format(self.intf_name))
         driver_firmware = pattern.findall(out)
         if len(driver_firmware) > 1:
             self.driver_version = driver_firmware[0].split(": ")[-1].strip()
@@ -168,7 +176,7 @@ class NetDevice(object):
             devfun_id,
         )
         try:
-            out = self.__send_expect(command, "# ")
+            _, out = self.__run(command)
             socket = int(out)
         except:
             socket = -1
@@ -233,7 +241,7 @@ class NetDevice(object):
             bus_id,
             devfun_id,
         )
-        return self.__send_expect(command, "# ")
+        return self.__run(command)[1]
 
     def get_interface_name_linux_generic(self, domain_id, bus_id, devfun_id):
         """
@@ -244,7 +252,7 @@ class NetDevice(object):
             bus_id,
             devfun_id,
         )
-        return self.__send_expect(command, "# ")
+        return self.__run(command)[1]
 
     def get_interface_name_freebsd(self, domain_id, bus_id, devfun_id, driver):
         """
@@ -352,7 +360,7 @@ class NetDevice(object):
             devfun_id,
             intf,
         )
-        return self.__send_expect(command, "# ")
+        return self.__run(command)[1]
 
     def get_mac_addr_linux_virtio_pci(self, intf, domain_id, bus_id, devfun_id, driver):
         """
@@ -362,7 +370,7 @@ class NetDevice(object):
             "ls /sys/bus/pci/devices/%s\:%s\:%s/ | grep --color=never virtio"
             % (domain_id, bus_id, devfun_id)
         )
-        virtio = self.__send_expect(virtio_cmd, "# ")
+        _, virtio = self.__run(virtio_cmd)
 
         command = "cat /sys/bus/pci/devices/%s\:%s\:%s/%s/net/%s/address" % (
             domain_id,
@@ -371,7 +379,7 @@ class NetDevice(object):
             virtio,
             intf,
         )
-        return self.__send_expect(command, "# ")
+        return self.__run(command)[1]
 
     def get_mac_addr_freebsd(self, intf, domain_id, bus_id, devfun_id, driver):
         """
@@ -423,9 +431,8 @@ class NetDevice(object):
         """
         Get IPv4 address by the default way on linux.
         """
-        out = self.__send_expect(
-            "ip -family inet address show dev %s | awk '/inet/ { print $2 }'" % intf,
-            "# ",
+        _, out = self.__run(
+            "ip -family inet address show dev %s | awk '/inet/ { print $2 }'" % intf
         )
         return out.split("/")[0]
 
@@ -529,9 +536,8 @@ class NetDevice(object):
         """
         Get the IPv6 address by the default way on linux.
         """
-        out = self.__send_expect(
-            "ip -family inet6 address show dev %s | awk '/inet6/ { print $2 }'" % intf,
-            "# ",
+        _, out = self.__run(
+            "ip -family inet6 address show dev %s | awk '/inet6/ { print $2 }'" % intf
         )
         return out.split("/")[0]
 
@@ -588,7 +594,7 @@ class NetDevice(object):
             bus_id,
             devfun_id,
         )
-        nic_speed = self.__send_expect(command, "# ")
+        _, nic_speed = self.__run(command)
         return nic_speed
 
     def get_nic_speed_freebsd(self, domain_id, bus_id, devfun_id):
@@ -631,29 +637,25 @@ class NetDevice(object):
         """
         Get all the VF PCIs of specified PF by the default way on linux.
         """
-        sriov_numvfs = self.__send_expect(
+        rc, sriov_numvfs = self.__run(
             "cat /sys/bus/pci/devices/%s\:%s\:%s/sriov_numvfs"
-            % (domain_id, bus_id, devfun_id),
-            "# ",
+            % (domain_id, bus_id, devfun_id)
         )
         sriov_vfs_pci = []
 
-        if "No such file" in sriov_numvfs:
+        if rc:
             return sriov_vfs_pci
 
         if int(sriov_numvfs) == 0:
             pass
         else:
             try:
-                virtfns = self.__send_expect(
+                _, virtfns = self.__run(
                     "ls --color=never -d /sys/bus/pci/devices/%s\:%s\:%s/virtfn*"
-                    % (domain_id, bus_id, devfun_id),
-                    "# ",
+                    % (domain_id, bus_id, devfun_id)
                 )
                 for virtfn in virtfns.split():
-                    vf_uevent = self.__send_expect(
-                        "cat %s" % os.path.join(virtfn, "uevent"), "# "
-                    )
+                    _, vf_uevent = self.__run("cat %s" % os.path.join(virtfn, "uevent"))
                     vf_pci = re.search(
                         r"PCI_SLOT_NAME=(%s+:[0-9a-f]+:[0-9a-f]+\.[0-9a-f]+)"
                         % domain_id,
@@ -913,18 +915,68 @@ def get_pci_id(crb, domain_id, bus_id, devfun_id):
         bus_id,
         devfun_id,
     )
-    out = crb.send_expect(command, "# ").strip()
-    vendor = out[2:]
+    _, out, _, _ = crb.run(command)
+    vendor = out.strip()[2:]
     command = "cat /sys/bus/pci/devices/%s\:%s\:%s/device" % (
         domain_id,
         bus_id,
         devfun_id,
     )
-    out = crb.send_expect(command, "# ").strip()
-    device = out[2:]
+    _, out, _, _ = crb.run(command)
+    device = out.strip()[2:]
     return "%s:%s" % (vendor, device)
 
 
+def get_pci_probe_cmds(domain_id, bus_id, devfun_id):
+    """
+    Return read-only commands used to probe pci device on linux.
+    """
+    pci_path = "/sys/bus/pci/devices/%s\:%s\:%s" % (domain_id, bus_id, devfun_id)
+    return [
+        "cat %s/vendor" % pci_path,
+        "cat %s/device" % pci_path,
+        "cat %s/uevent" % pci_path,
+        "cat %s/numa_node" % pci_path,
+        "ls --color=never %s/net" % pci_path,
+    ]
+
+
+def get_intf_probe_cmds(domain_id, bus_id, devfun_id, intf):
+    """
+    Return read-only commands used to probe interface of pci device on linux.
+    """
+    pci_path = "/sys/bus/pci/devices/%s\:%s\:%s" % (domain_id, bus_id, devfun_id)
+    return [
+        "cat %s/net/%s/address" % (pci_path, intf),
+        "ip -family inet address show dev %s | awk '/inet/ { print $2 }'" % intf,
+        "ip -family inet6 address show dev %s | awk '/inet6/ { print $2 }'" % intf,
+    ]
+
+
+def prefetch_nics(crb, pcis):
+    """
+    Probe pci devices and their interfaces with two batches, NetDevice
+    will take the results until crb prefetch cleared.
+    """
+    if crb.get_os_type() != "linux" or not pcis:
+        return
+
+    pci_cmds = {}
+    for pci in pcis:
+        pci_cmds[pci] = get_pci_probe_cmds(*pci.split(":"))
+    crb.prefetch([cmd for cmds in pci_cmds.values() for cmd in cmds])
+
+    intf_cmds = []
+    for pci, cmds in pci_cmds.items():
+        rc, out = crb.prefetched[cmds[-1]]
+        if rc:
+            continue
+        for intf in out.split():
+            intf_cmds += get_intf_probe_cmds(*pci.split(":"), intf)
+    if intf_cmds:
+        crb.prefetch(intf_cmds)
+
+
 def add_to_list(host, obj):
     """
     Add network device object to global structure
@@ -21,6 +21,8 @@ from framework.pmd_output import PmdOutput
 from framework.settings import HEADER_SIZE, UPDATE_EXPECTED, load_global_setting
 from framework.test_case import TestCase
 
+from .perf_test_base import PerfMatrix, get_build_signature
+
 
 class TestNicSingleCorePerf(TestCase):
     def set_up_all(self):
@@ -283,79 +285,125 @@ class TestNicSingleCorePerf(TestCase):
                 param += " --burst=64 --mbcache=512"
 
             self.throughput[fwd_config] = dict()
+            # testpmd is restarted only when descriptor number changes
+            matrix = PerfMatrix(
+                os.path.join(
+                    rst.path2Result,
+                    "{0}_{1}_matrix.json".format(
+                        self.nic, fwd_config.replace("/", "_")
+                    ),
+                ),
+                {"nic": self.nic, "duration": self.test_duration},
+                self.logger,
+            )
+            matrix.signature.update(
+                get_build_signature(
+                    self.dut,
+                    os.path.join(self.dut.base_dir, self.dut.apps_name["test-pmd"]),
+                )
+            )
             for frame_size in list(self.test_parameters[fwd_config].keys()):
                 self.throughput[fwd_config][frame_size] = dict()
-                pcaps = self.create_pacap_file(frame_size, port_num)
-                tgenInput = self.prepare_stream(pcaps, port_num)
                 for nb_desc in self.test_parameters[fwd_config][frame_size]:
-                    self.logger.info(
-                        "Test running at parameters: "
-                        + "framesize: {}, rxd/txd: {}".format(frame_size, nb_desc)
-                    )
-                    parameter = param + " --txd=%d --rxd=%d --nb-cores=%d" % (
-                        nb_desc,
+                    matrix.add_run(
+                        "{0}/{1}".format(frame_size, nb_desc),
                         nb_desc,
-                        nb_cores,
+                        [frame_size, nb_desc],
                     )
-                    self.pmdout.start_testpmd(
-                        core_list, parameter, eal_para, socket=self.socket
-                    )
-                    self.dut.send_expect("start", "testpmd> ", 15)
-
+            matrix.signature["runs"] = [run[0] for run in matrix.runs]
+            tgen_inputs = {}
+            # streams of frame size added in packet generator
+            stream_ids = {}
+
+            def start_testpmd(nb_desc, params):
+                parameter = param + " --txd=%d --rxd=%d --nb-cores=%d" % (
+                    nb_desc,
+                    nb_desc,
+                    nb_cores,
+                )
+                self.pmdout.start_testpmd(
+                    core_list, parameter, eal_para, socket=self.socket
+                )
+                self.dut.send_expect("start", "testpmd> ", 15)
+
+            def stop_testpmd(nb_desc):
+                self.dut.send_expect("stop", "testpmd> ")
+                self.dut.send_expect("quit", "# ", 30)
+
+            def measure(params):
+                frame_size, nb_desc = params
+                self.logger.info(
+                    "Test running at parameters: "
+                    + "framesize: {}, rxd/txd: {}".format(frame_size, nb_desc)
+                )
+                if frame_size not in tgen_inputs:
+                    pcaps = self.create_pacap_file(frame_size, port_num)
+                    tgen_inputs[frame_size] = self.prepare_stream(pcaps, port_num)
+                tgenInput = tgen_inputs[frame_size]
+
+                # streams are added again only when frame size changed
+                if frame_size not in stream_ids:
                     vm_config = self.set_fields()
                     # clear streams before add new streams
                     self.tester.pktgen.clear_streams()
-
-                    # run packet generator
+                    stream_ids.clear()
                     streams = self.pktgen_helper.prepare_stream_from_tginput(
                         tgenInput, 100, vm_config, self.tester.pktgen
                     )
-                    # set traffic option
-                    traffic_opt = {
-                        "method": "throughput",
-                        "rate": 100,
-                        "duration": self.test_duration,
-                        "interval": self.throughput_stat_sample_interval,
-                    }
-                    stats = self.tester.pktgen.measure(
-                        stream_ids=streams, traffic_opt=traffic_opt
-                    )
-
-                    #####################################################
-                    # Remove max and min if count >=5, then get average
-                    #####################################################
-                    if isinstance(stats, list):
-                        total_pps_rxs = []
-                        c = len(stats)
-                        for i in range(c):
-                            stats_pps = stats[i][1]
-                            if isinstance(stats_pps, tuple):
-                                total_pps_rxs.append(stats_pps[1])
-                            else:
-                                total_pps_rxs.append(stats_pps)
-                        if c >= 5:
-                            total_pps_rxs.remove(max(total_pps_rxs))
-                            total_pps_rxs.remove(min(total_pps_rxs))
-                        total_pps_rx = mean(total_pps_rxs)
-                    else:
-                        total_pps_rx = stats
-
-                    self.verify(
-                        total_pps_rx > 0,
-                        "No traffic detected, please check your configuration",
-                    )
-                    total_mpps_rx = total_pps_rx / 1000000.0
-                    self.throughput[fwd_config][frame_size][nb_desc] = total_mpps_rx
-
-                    self.dut.send_expect("stop", "testpmd> ")
-                    self.dut.send_expect("quit", "# ", 30)
-
-                    self.logger.info(
-                        "Trouthput of "
-                        + "framesize: {}, rxd/txd: {} is :{} Mpps".format(
-                            frame_size, nb_desc, total_mpps_rx
-                        )
+                    stream_ids[frame_size] = streams
+                streams = stream_ids[frame_size]
+
+                # run packet generator
+                # set traffic option
+                traffic_opt = {
+                    "method": "throughput",
+                    "rate": 100,
+                    "duration": self.test_duration,
+                    "interval": self.throughput_stat_sample_interval,
+                }
+                stats = self.tester.pktgen.measure(
+                    stream_ids=streams, traffic_opt=traffic_opt
+                )
+
+                #####################################################
+                # Remove max and min if count >=5, then get average
+                #####################################################
+                if isinstance(stats, list):
+                    total_pps_rxs = []
+                    c = len(stats)
+                    for i in range(c):
+                        stats_pps = stats[i][1]
+                        if isinstance(stats_pps, tuple):
+                            total_pps_rxs.append(stats_pps[1])
+                        else:
+                            total_pps_rxs.append(stats_pps)
+                    if c >= 5:
+                        total_pps_rxs.remove(max(total_pps_rxs))
+                        total_pps_rxs.remove(min(total_pps_rxs))
+                    total_pps_rx = mean(total_pps_rxs)
+                else:
+                    total_pps_rx = stats
+
+                self.verify(
+                    total_pps_rx > 0,
+                    "No traffic detected, please check your configuration",
+                )
+                total_mpps_rx = total_pps_rx / 1000000.0
+
+                self.logger.info(
+                    "Trouthput of "
+                    + "framesize: {}, rxd/txd: {} is :{} Mpps".format(
+                        frame_size, nb_desc, total_mpps_rx
                     )
+                )
+                return total_mpps_rx
+
+            for _, params, total_mpps_rx in matrix.run(
+                measure, start_testpmd, stop_testpmd
+            ):
+                frame_size, nb_desc = params
+                self.throughput[fwd_config][frame_size][nb_desc] = total_mpps_rx
+            matrix.finish()
 
         return self.throughput
 
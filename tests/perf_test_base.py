@@ -114,6 +114,106 @@ def get_enum_name(value, enum_cls):
         raise Exception(msg)
 
 
+def get_build_signature(dut, bin):
+    """
+    DPDK version and md5 digest of binary on dut, checkpoint of a matrix is
+    not resumed with a different DPDK build.
+    """
+    out = dut.send_expect("md5sum %s" % bin, "# ")
+    m = re.search(r"^[0-9a-f]{32}", out, re.M)
+    return {
+        "dpdk_version": dut.dpdk_version,
+        "bin": m.group() if m else None,
+    }
+
+
+class PerfMatrix(object):
+    """
+    Parameter matrix of performance test. All runs are declared before
+    running with key of the binary process they need, runs of the same
+    process are run together, so that process is only restarted when its key
+    changes. Valid result of each run is saved in checkpoint file as soon as
+    it is measured, an interrupted matrix resumes from checkpoint with the
+    same signature. Runs without result are measured again by next execution.
+    """
+
+    def __init__(self, checkpoint, signature, logger):
+        self.checkpoint = checkpoint
+        self.signature = signature
+        self.logger = logger
+        self.runs = []
+        self.results = {}
+
+    def add_run(self, key, process_key, params):
+        """
+        key is the unique name of run, process_key and result of run should
+        be able to save in json format.
+        """
+        self.runs.append((key, process_key, params))
+
+    def ordered_runs(self):
+        groups = {}
+        for run in self.runs:
+            groups.setdefault(json.dumps(run[1]), []).append(run)
+        return [run for group in groups.values() for run in group]
+
+    def load(self):
+        self.results = {}
+        if not os.path.exists(self.checkpoint):
+            return
+        try:
+            with open(self.checkpoint) as f:
+                data = json.load(f)
+        except ValueError:
+            return
+        if data.get("signature") == self.signature:
+            self.results = data.get("results") or {}
+
+    def save(self):
+        data = {"signature": self.signature, "results": self.results}
+        with open(self.checkpoint + ".tmp", "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(self.checkpoint + ".tmp", self.checkpoint)
+
+    def run(self, measure, start=None, stop=None):
+        """
+        Run runs not in checkpoint, start is called with process key and
+        params of run when process key changes, stop is called with process
+        key after last run of the process. Return list of (key, params,
+        result) in declared order.
+        """
+        self.load()
+        if self.results:
+            done = len([run for run in self.runs if run[0] in self.results])
+            msg = "{0}/{1} runs are resumed from {2}".format(
+                done, len(self.runs), self.checkpoint
+            )
+            self.logger.info(msg)
+        results = dict(self.results)
+        process = None
+        for key, process_key, params in self.ordered_runs():
+            if key in results:
+                continue
+            if process != process_key:
+                if process is not None and stop:
+                    stop(process)
+                process = process_key
+                if start:
+                    start(process_key, params)
+            results[key] = measure(params)
+            if results[key]:
+                self.results[key] = results[key]
+                self.save()
+        if process is not None and stop:
+            stop(process)
+        return [(key, params, results.get(key)) for key, _, params in self.runs]
+
+    def finish(self):
+        """remove checkpoint after results of matrix are handled"""
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+
 class PerfTestBase(object):
     def __init__(self, valports, socket, mode=None, bin_type=None):
         self.__bin_type = bin_type or BIN_TYPE.L3FWD
@@ -566,6 +666,16 @@ class PerfTestBase(object):
                 "duration": duration,
             },
         }
+        # search strategy of rfc2544, see packet generator for its options
+        traffic_opt = option["traffic_opt"]
+        if conf_opt.get("search"):
+            traffic_opt["search"] = conf_opt.get("search")
+            traffic_opt["seed_key"] = "/".join(
+                [self.__nic_name, str(self.__cur_case), config, str(frame_size)]
+            )
+        for key in ["trial_duration", "seed_window", "abort_margin"]:
+            if conf_opt.get(key) is not None:
+                traffic_opt[key] = float(conf_opt.get(key))
         # run traffic
         result = self.__send_packets_by_pktgen(option)
         # statistics result
@@ -1152,34 +1262,91 @@ class PerfTestBase(object):
         _data = {"title": title, "values": values}
         self.__display_suite_result(_data)
 
+    def __perf_matrix(self, method, l3_proto, mode):
+        """
+        Matrix of port configs and frame sizes, runs with the same binary
+        process command line are grouped, frame size only changes the command
+        line of l3fwd when jumbo frame is enabled.
+        """
+        name = "_".join(
+            [str(self.__cur_case or method), l3_proto.value, mode.value, "matrix"]
+        )
+        test_content = self.__test_content.get("port_configs")
+        signature = {
+            "nic": self.__nic_name,
+            "method": method,
+            "duration": self.__test_content.get("test_duration"),
+            "runs": [[config, frame_size] for config, _, _, frame_size in test_content],
+        }
+        if self.__bin_type is BIN_TYPE.L3FWD:
+            bin = self.__l3fwd_bin
+        else:
+            bin = os.path.join(self.__target_dir, self.dut.apps_name["test-pmd"])
+        signature.update(get_build_signature(self.dut, bin))
+        matrix = PerfMatrix(
+            os.path.join(self.__output_path, name + ".json"), signature, self.logger
+        )
+        for config, core_list, port_conf, frame_size in test_content:
+            # max packet length of l3fwd is set by jumbo frame size
+            jumbo = 0
+            if self.__bin_type is BIN_TYPE.L3FWD and frame_size > 1518:
+                jumbo = frame_size
+            matrix.add_run(
+                "{0}/{1}".format(config, frame_size),
+                [config, str(core_list), str(port_conf), jumbo],
+                [config, core_list, port_conf, frame_size],
+            )
+        return matrix
+
+    def __run_perf_matrix(self, method, l3_proto, mode, measure):
+        matrix = self.__perf_matrix(method, l3_proto, mode)
+
+        def start(process_key, params):
+            # Start application binary process, it serves all runs of key
+            config, core_list, port_conf, frame_size = params
+            self.__bin_ps_start(mode, core_list, port_conf, frame_size)
+
+        def stop(process_key):
+            # Stop binary process
+            self.__bin_ps_close()
+
+        def run(params):
+            config, core_list, port_conf, frame_size = params
+            self.logger.info(
+                (
+                    "Executing {4} with {0} mode, {1} ports, " "{2} and {3} frame size"
+                ).format(
+                    self.__display_mode_name(mode),
+                    len(self.__valports),
+                    config,
+                    frame_size,
+                    self.__bin_type.value,
+                )
+            )
+            return measure(config, frame_size)
+
+        results = []
+        for _, params, result in matrix.run(run, start, stop):
+            if result:
+                config, _, _, frame_size = params
+                results.append([config, frame_size, result])
+        return matrix, results
+
     def ms_throughput(self, l3_proto, mode):
         except_content = None
         try:
-            test_content = self.__test_content.get("port_configs")
-            results = []
-            for config, core_list, port_conf, frame_size in test_content:
-                # Start application binary process
-                self.logger.info(
-                    (
-                        "Executing {4} with {0} mode, {1} ports, "
-                        "{2} and {3} frame size"
-                    ).format(
-                        self.__display_mode_name(mode),
-                        len(self.__valports),
-                        config,
-                        frame_size,
-                        self.__bin_type.value,
-                    )
-                )
-                self.__bin_ps_start(mode, core_list, port_conf, frame_size)
-                result = self.__throughput(l3_proto, mode, frame_size)
-                # Stop binary process
-                self.__bin_ps_close()
-                if result:
-                    results.append([config, frame_size, result])
+            matrix, results = self.__run_perf_matrix(
+                "throughput",
+                l3_proto,
+                mode,
+                lambda config, frame_size: self.__throughput(
+                    l3_proto, mode, frame_size
+                ),
+            )
             self.__check_throughput_result(
                 l3_proto, results, self.__display_mode_name(mode)
             )
+            matrix.finish()
         except Exception as e:
             self.logger.error(traceback.format_exc())
             except_content = e
@@ -1194,31 +1361,18 @@ class PerfTestBase(object):
     def qt_rfc2544(self, l3_proto, mode):
         except_content = None
         try:
-            test_content = self.__test_content.get("port_configs")
-            results = []
-            for config, core_list, port_conf, frame_size in test_content:
-                # Start application binary process
-                self.logger.info(
-                    (
-                        "Executing {4} with {0} mode, {1} ports, "
-                        "{2} and {3} frame size"
-                    ).format(
-                        self.__display_mode_name(mode),
-                        len(self.__valports),
-                        config,
-                        frame_size,
-                        self.__bin_type.value,
-                    )
-                )
-                self.__bin_ps_start(mode, core_list, port_conf, frame_size)
-                result = self.__rfc2544(config, l3_proto, mode, frame_size)
-                # Stop binary process
-                self.__bin_ps_close()
-                if result:
-                    results.append([config, frame_size, result])
+            matrix, results = self.__run_perf_matrix(
+                "rfc2544",
+                l3_proto,
+                mode,
+                lambda config, frame_size: self.__rfc2544(
+                    config, l3_proto, mode, frame_size
+                ),
+            )
             self.__check_rfc2544_result(
                 l3_proto, results, self.__display_mode_name(mode)
             )
+            matrix.finish()
         except Exception as e:
             self.logger.error(traceback.format_exc())
             except_content = e